@@ -0,0 +1,227 @@
+"""Контроль допуска обращений: лимиты по источникам и общий предел."""
+
+import math
+import threading
+import time
+from collections import Counter
+from app import config
+
+# Ключ, под которым учитываются источники сверх ADMISSION_MAX_SOURCES
+OTHER_SOURCES = "other"
+
+
+class TokenBucket:
+    """
+    Ведро токенов для ограничения частоты запросов.
+
+    :ivar rate: Скорость пополнения, токенов в секунду.
+    :ivar burst: Ёмкость ведра.
+    :ivar tokens: Текущее количество токенов.
+    """
+
+    def __init__(self, rate: float, burst: float, now: float):
+        """
+        Инициализация TokenBucket.
+
+        :param rate: Скорость пополнения, токенов в секунду.
+        :param burst: Ёмкость ведра.
+        :param now: Текущее монотонное время.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def try_acquire(self, now: float) -> float:
+        """
+        Пытается взять токен.
+
+        :param now: Текущее монотонное время.
+        :return: 0, если токен взят, иначе время ожидания в секундах.
+        """
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Допуск обращений до начала работы с базой данных.
+
+    Каждый источник ограничен своим ведром токенов, а число одновременно
+    обрабатываемых обращений — общим пределом. Нулевые значения снимают
+    соответствующее ограничение. Настройки меняются на лету.
+
+    Допуск проверяется до проверки существования источника, поэтому
+    отдельные ведра и счётчики заводятся не больше чем для max_sources
+    источников без собственного лимита; остальные делят одно ведро и
+    счётчики под ключом OTHER_SOURCES.
+
+    :ivar default_rate: Скорость по умолчанию для источников, в секунду.
+    :ivar default_burst: Ёмкость ведра по умолчанию.
+    :ivar max_in_flight: Общий предел одновременных обращений.
+    :ivar max_sources: Предел отдельно учитываемых источников.
+    """
+
+    def __init__(
+            self,
+            default_rate: float = config.ADMISSION_SOURCE_RATE,
+            default_burst: float = config.ADMISSION_SOURCE_BURST,
+            max_in_flight: int = config.ADMISSION_MAX_IN_FLIGHT,
+            max_sources: int = config.ADMISSION_MAX_SOURCES
+    ):
+        """
+        Инициализация AdmissionController.
+
+        :param default_rate: Скорость по умолчанию для источников.
+        :param default_burst: Ёмкость ведра по умолчанию.
+        :param max_in_flight: Общий предел одновременных обращений.
+        :param max_sources: Предел отдельно учитываемых источников.
+        """
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.max_in_flight = max_in_flight
+        self.max_sources = max_sources
+        self.source_limits = {}
+        self._tracked = set()
+        self.in_flight = 0
+        self.admitted = Counter()
+        self.shed = Counter()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def configure(
+            self,
+            default_rate: float | None = None,
+            default_burst: float | None = None,
+            max_in_flight: int | None = None
+    ) -> None:
+        """
+        Меняет общие настройки; None оставляет значение без изменений.
+
+        :param default_rate: Скорость по умолчанию для источников.
+        :param default_burst: Ёмкость ведра по умолчанию.
+        :param max_in_flight: Общий предел одновременных обращений.
+        """
+        with self._lock:
+            if default_rate is not None:
+                self.default_rate = default_rate
+            if default_burst is not None:
+                self.default_burst = default_burst
+            if max_in_flight is not None:
+                self.max_in_flight = max_in_flight
+            self._buckets.clear()
+
+    def set_source_limit(
+            self,
+            source_id: int,
+            rate: float,
+            burst: float | None = None
+    ) -> None:
+        """
+        Задаёт собственный лимит источника.
+
+        :param source_id: ID источника.
+        :param rate: Скорость, запросов в секунду; 0 — без ограничения.
+        :param burst: Ёмкость ведра; по умолчанию равна max(rate, 1).
+        """
+        with self._lock:
+            self.source_limits[source_id] = (
+                rate, burst if burst is not None else max(rate, 1)
+            )
+            self._buckets.pop(source_id, None)
+
+    def _key(self, source_id: int) -> int | str:
+        """
+        Возвращает ключ ведра и счётчиков источника.
+
+        :param source_id: ID источника.
+        :return: ID источника или OTHER_SOURCES, если предел отдельно
+            учитываемых источников исчерпан.
+        """
+        if source_id in self.source_limits or source_id in self._tracked:
+            return source_id
+        if not self.max_sources or len(self._tracked) < self.max_sources:
+            self._tracked.add(source_id)
+            return source_id
+        return OTHER_SOURCES
+
+    def _bucket(self, source_id: int | str, now: float) -> TokenBucket | None:
+        """
+        Возвращает ведро источника, создавая его при необходимости.
+
+        :param source_id: Ключ источника из _key().
+        :param now: Текущее монотонное время.
+        :return: Объект TokenBucket или None, если лимита нет.
+        """
+        bucket = self._buckets.get(source_id)
+        if bucket is None:
+            rate, burst = self.source_limits.get(
+                source_id, (self.default_rate, self.default_burst)
+            )
+            if rate <= 0:
+                return None
+            bucket = TokenBucket(rate, max(burst, 1), now)
+            self._buckets[source_id] = bucket
+        return bucket
+
+    def admit(self, source_id: int) -> int | None:
+        """
+        Пытается допустить обращение источника.
+
+        При успехе занимает место в общем пределе, которое нужно
+        освободить через release().
+
+        :param source_id: ID источника.
+        :return: None при допуске, иначе рекомендуемая пауза в секундах.
+        """
+        now = time.monotonic()
+        with self._lock:
+            key = self._key(source_id)
+            if 0 < self.max_in_flight <= self.in_flight:
+                self.shed[key] += 1
+                return 1
+            bucket = self._bucket(key, now)
+            if bucket is not None:
+                wait = bucket.try_acquire(now)
+                if wait > 0:
+                    self.shed[key] += 1
+                    return max(1, math.ceil(wait))
+            self.in_flight += 1
+            self.admitted[key] += 1
+            return None
+
+    def release(self) -> None:
+        """Освобождает место в общем пределе одновременных обращений."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """
+        Возвращает настройки и счётчики допуска.
+
+        :return: Словарь с настройками, счётчиками допущенных и отклонённых
+            обращений по источникам.
+        """
+        with self._lock:
+            return {
+                "default_rate": self.default_rate,
+                "default_burst": self.default_burst,
+                "max_in_flight": self.max_in_flight,
+                "max_sources": self.max_sources,
+                "in_flight": self.in_flight,
+                "source_limits": {
+                    source_id: {"rate": rate, "burst": burst}
+                    for source_id, (rate, burst) in self.source_limits.items()
+                },
+                "admitted": dict(self.admitted),
+                "shed": dict(self.shed),
+            }
+
+
+admission = AdmissionController()
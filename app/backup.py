@@ -0,0 +1,210 @@
+"""
+Онлайн-резервное копирование и восстановление базы SQLite.
+
+Копия снимается через backup API SQLite по BACKUP_PAGES страниц за шаг
+с паузой BACKUP_PAUSE_SECONDS между шагами, не останавливая приём
+обращений. На время копии источник держит одну транзакцию чтения, чтобы
+копирование не начиналось заново после каждой чужой записи. В режиме
+WAL, в котором работает приложение, она лишь фиксирует снимок базы и не
+мешает писателям. Без WAL та же транзакция держит блокировку SHARED всю
+копию, и писатели не смогут зафиксировать изменения до её окончания.
+
+Запуск:
+    python -m app.backup backup [--target data/backups/db.sqlite]
+    python -m app.backup restore SNAPSHOT [--target data/db.sqlite]
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from app import config
+
+
+def sync_file(path: str) -> None:
+    """
+    Сбрасывает содержимое файла на диск.
+
+    :param path: Путь к файлу.
+    """
+    with open(path, "rb") as file:
+        os.fsync(file.fileno())
+
+
+def backup_database(
+        source_file: str,
+        target_file: str,
+        pages: int | None = None,
+        pause: float | None = None
+) -> dict:
+    """
+    Снимает согласованную копию работающей базы.
+
+    Копия пишется во временный файл рядом с целевым без журнала и
+    переименовывается после завершения, поэтому по пути target_file
+    никогда не лежит недописанная копия. Каждый шаг сбрасывается на диск
+    сразу, а не одним fsync в конце: сброс всей копии разом занимает
+    диск на сотни миллисекунд и задерживает fsync фиксаций писателей.
+
+    Источник всю копию держит открытую транзакцию чтения. В режиме WAL
+    писатели при этом не ждут, но контрольная точка не может перенести в
+    базу записи новее снимка, и файл -wal растёт до конца копии. Без WAL
+    транзакция держит блокировку SHARED, и писатели ждут всю копию, а не
+    один шаг, поэтому копировать так стоит только базу в режиме WAL.
+
+    :param source_file: Путь к файлу базы.
+    :param target_file: Путь к файлу копии.
+    :param pages: Страниц за шаг; по умолчанию BACKUP_PAGES.
+    :param pause: Пауза между шагами в секундах; по умолчанию
+        BACKUP_PAUSE_SECONDS.
+    :return: Путь копии, число страниц, байт и шагов, время копирования,
+        пропускная способность и самый долгий шаг.
+    """
+    if pages is None:
+        pages = config.BACKUP_PAGES
+    if pause is None:
+        pause = config.BACKUP_PAUSE_SECONDS
+    os.makedirs(os.path.dirname(os.path.abspath(target_file)), exist_ok=True)
+    partial_file = f"{target_file}.part"
+    if os.path.exists(partial_file):
+        os.remove(partial_file)
+    source = sqlite3.connect(
+        f"file:{source_file}?mode=ro",
+        uri=True,
+        isolation_level=None,
+        timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+    )
+    target = sqlite3.connect(partial_file)
+    target.execute("PRAGMA journal_mode=OFF")
+    target.execute("PRAGMA synchronous=OFF")
+    steps = []
+    started = time.perf_counter()
+    last = started
+
+    def progress(status, remaining, total):
+        nonlocal last
+        steps.append((time.perf_counter() - last, total))
+        sync_file(partial_file)
+        if remaining and pause:
+            time.sleep(pause)
+        last = time.perf_counter()
+
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, progress=progress)
+        source.execute("COMMIT")
+    finally:
+        source.close()
+        target.close()
+    elapsed = time.perf_counter() - started
+    os.replace(partial_file, target_file)
+    size = os.path.getsize(target_file)
+    return {
+        "target": target_file,
+        "pages": steps[-1][1] if steps else 0,
+        "bytes": size,
+        "steps": len(steps),
+        "seconds": round(elapsed, 4),
+        "mb_per_second": round(size / elapsed / 2 ** 20, 2),
+        "longest_step_ms": round(
+            max((step for step, _ in steps), default=0) * 1000, 3
+        ),
+    }
+
+
+def restore_database(
+        snapshot_file: str,
+        target_file: str,
+        verify: bool = False
+) -> dict:
+    """
+    Загружает копию в файл базы, например для новой машины или тестов.
+
+    Копия переносится одним шагом backup API во временный файл, который
+    затем заменяет целевой; оставшиеся от прежней базы файлы -wal и -shm
+    удаляются, иначе SQLite применил бы чужой журнал к новой базе.
+    Приложение, работающее с target_file, должно быть остановлено.
+
+    :param snapshot_file: Путь к копии.
+    :param target_file: Путь к файлу базы.
+    :param verify: Проверить восстановленную базу через PRAGMA quick_check.
+    :return: Путь базы, размер и время восстановления.
+    :raises ValueError: Если проверка восстановленной базы не прошла.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(target_file)), exist_ok=True)
+    partial_file = f"{target_file}.part"
+    if os.path.exists(partial_file):
+        os.remove(partial_file)
+    started = time.perf_counter()
+    snapshot = sqlite3.connect(f"file:{snapshot_file}?mode=ro", uri=True)
+    target = sqlite3.connect(partial_file)
+    target.execute("PRAGMA journal_mode=OFF")
+    try:
+        snapshot.backup(target)
+        if verify:
+            result = target.execute("PRAGMA quick_check").fetchone()[0]
+            if result != "ok":
+                raise ValueError(f"Snapshot check failed: {result}")
+    finally:
+        snapshot.close()
+        target.close()
+    sync_file(partial_file)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(target_file + suffix):
+            os.remove(target_file + suffix)
+    os.replace(partial_file, target_file)
+    return {
+        "target": target_file,
+        "bytes": os.path.getsize(target_file),
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+
+def format_report(report: dict) -> str:
+    """
+    Формирует текстовый отчёт о копировании или восстановлении.
+
+    :param report: Результат backup_database или restore_database.
+    :return: Строки «ключ: значение».
+    """
+    return "\n".join(f"{key}: {value}" for key, value in report.items())
+
+
+def main() -> None:
+    """Точка входа резервного копирования."""
+    from app.database import DB_FILE
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup = commands.add_parser("backup", help="снять копию базы")
+    backup.add_argument("--source", default=DB_FILE)
+    backup.add_argument(
+        "--target",
+        default=os.path.join(
+            config.BACKUP_DIR, time.strftime("db-%Y%m%dT%H%M%S.sqlite")
+        ),
+    )
+    backup.add_argument("--pages", type=int, default=config.BACKUP_PAGES)
+    backup.add_argument(
+        "--pause", type=float, default=config.BACKUP_PAUSE_SECONDS
+    )
+    restore = commands.add_parser("restore", help="загрузить копию в базу")
+    restore.add_argument("snapshot")
+    restore.add_argument("--target", default=DB_FILE)
+    restore.add_argument("--verify", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "backup":
+        report = backup_database(
+            args.source, args.target, pages=args.pages, pause=args.pause
+        )
+    else:
+        report = restore_database(
+            args.snapshot, args.target, verify=args.verify
+        )
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Настройки приложения, задаваемые через переменные окружения."""
+
+import os
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Читает булев флаг из переменной окружения.
+
+    :param name: Имя переменной окружения.
+    :param default: Значение, если переменная не задана.
+    :return: Значение флага.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in TRUE_VALUES
+
+
+# Профилирование отдельных запросов
+PROFILING_ENABLED = env_flag("PROFILING_ENABLED")
+PROFILING_DIR = os.getenv(
+    "PROFILING_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "profiles"),
+)
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.001"))
+PROFILING_HEADER = "x-profile"
+
+# Закрепление лида за предыдущим оператором
+AFFINITY_ENABLED = env_flag("AFFINITY_ENABLED")
+
+# Хранение дополнительных данных контактов
+PAYLOAD_COMPRESS_THRESHOLD = int(
+    os.getenv("PAYLOAD_COMPRESS_THRESHOLD", "512")
+)
+
+# Отдельный пул соединений для чтения
+READ_REPLICA_URL = os.getenv("READ_REPLICA_URL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Контроль допуска обращений (0 — без ограничения)
+ADMISSION_SOURCE_RATE = float(os.getenv("ADMISSION_SOURCE_RATE", "0"))
+ADMISSION_SOURCE_BURST = float(os.getenv("ADMISSION_SOURCE_BURST", "10"))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0"))
+ADMISSION_MAX_SOURCES = int(os.getenv("ADMISSION_MAX_SOURCES", "1000"))
+
+# Ключи идемпотентности регистрации обращений
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_PURGE_EVERY = int(os.getenv("IDEMPOTENCY_PURGE_EVERY", "1000"))
+
+# Поток событий /events
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "1000"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# Уведомления внешних систем через outbox
+NOTIFY_URL = os.getenv("NOTIFY_URL")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "1"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+OUTBOX_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_TIMEOUT_SECONDS", "5"))
+
+# Шардирование источников по файлам SQLite (экспериментально: выигрыш
+# не подтверждён, лимит оператора может быть превышен на SHARD_COUNT - 1;
+# 0 или 1 — без шардов)
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_DIR = os.getenv(
+    "SHARD_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "shards"),
+)
+
+# Онлайн-резервное копирование базы
+BACKUP_DIR = os.getenv(
+    "BACKUP_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "data", "backups"),
+)
+BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "256"))
+BACKUP_PAUSE_SECONDS = float(os.getenv("BACKUP_PAUSE_SECONDS", "0.001"))
@@ -1,21 +1,53 @@
 """Бизнес-логика и операции с базой данных."""
 
-from sqlalchemy.orm import Session
+import numpy as np
+from sqlalchemy import and_, func, insert, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from app import config
 from app.models import (
     Operator,
     Source,
     SourceOperator,
     Lead,
     Contact,
-    ContactStatus
+    ContactStatus,
+    ArchivedContact,
+    ConfigVersion,
+    ContactRollup,
+    IdempotencyKey,
+    OutboxMessage,
+    LEAD_EMAIL_KEY,
+    LEAD_DOMAIN_KEY,
+    utcnow,
 )
+from app.database import write_transaction
+from app.events import event_bus
+from app.idempotency import idempotency_cache
+from app.routing import CONFIG_VERSION_ID, routing_cache
+from app.sharding import strided_ids
+from app.simulator import UNLIMITED, DistributionModel, assign_batch
 from app.schemas import (
     OperatorCreate,
     SourceCreate,
     SourceOperatorAssign,
     ContactCreate
 )
+from datetime import datetime, timedelta
+import itertools
+import json
 import random
+import threading
+from collections import Counter
+
+# Количество значений в одном условии IN при массовом поиске лидов
+LOOKUP_CHUNK = 10000
+
+affinity_stats = Counter()
+affinity_lock = threading.Lock()
+idempotent_inserts = itertools.count(1)
 
 
 def get_operator(session: Session, operator_id: int) -> Operator | None:
@@ -37,6 +69,7 @@ def create_operator(session: Session, oper: OperatorCreate) -> Operator:
     :param oper: Схема данных оператора.
     :return: Объект Operator.
     """
+    write_transaction(session)
     db_oper = Operator(name=oper.name, active=oper.active, limit=oper.limit)
     session.add(db_oper)
     session.commit()
@@ -44,6 +77,37 @@ def create_operator(session: Session, oper: OperatorCreate) -> Operator:
     return db_oper
 
 
+def create_operators_bulk(
+        session: Session,
+        opers: list[OperatorCreate]
+) -> list:
+    """
+    Создаёт несколько операторов одной транзакцией.
+
+    :param session: Сессия для работы с базой данных.
+    :param opers: Список схем данных операторов.
+    :return: Список строк с полями операторов в порядке входных данных.
+    """
+    if not opers:
+        return []
+    write_transaction(session)
+    created = session.execute(
+        insert(Operator).returning(
+            Operator.id,
+            Operator.name,
+            Operator.active,
+            Operator.limit,
+            sort_by_parameter_order=True,
+        ),
+        [
+            {"name": oper.name, "active": oper.active, "limit": oper.limit}
+            for oper in opers
+        ],
+    ).all()
+    session.commit()
+    return created
+
+
 def get_opers_list(session: Session) -> list:
     """
     Получает список всех операторов из базы данных.
@@ -54,6 +118,37 @@ def get_opers_list(session: Session) -> list:
     return session.query(Operator).all()
 
 
+def get_opers_rows(session: Session) -> list:
+    """
+    Получает список операторов в виде кортежей колонок.
+
+    :param session: Сессия SQLAlchemy для работы с базой данных.
+    :return: Список кортежей (id, name, active, limit).
+    """
+    return session.execute(
+        select(Operator.id, Operator.name, Operator.active, Operator.limit)
+        .order_by(Operator.id)
+    ).all()
+
+
+def bump_config_version(session: Session) -> None:
+    """
+    Увеличивает версию конфигурации в текущей транзакции.
+
+    Вызывается перед фиксацией любого изменения операторов и весов, чтобы
+    остальные воркеры сбросили свои кэши маршрутизации.
+
+    :param session: Сессия для работы с базой данных.
+    """
+    stmt = sqlite_insert(ConfigVersion).values(id=CONFIG_VERSION_ID, version=1)
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"version": ConfigVersion.version + 1},
+        )
+    )
+
+
 def update_operator(
         session: Session,
         operator_id: int,
@@ -69,6 +164,7 @@ def update_operator(
     :param limit: Новый лимит количества активных обращений.
     :return: Объект Operator, либо None.
     """
+    write_transaction(session)
     oper = get_operator(session, operator_id)
     if not oper:
         return None
@@ -76,8 +172,18 @@ def update_operator(
         oper.active = active
     if limit is not None:
         oper.limit = limit
+    bump_config_version(session)
     session.commit()
     session.refresh(oper)
+    event_bus.publish(
+        "operator_updated",
+        {
+            "operator_id": oper.id,
+            "name": oper.name,
+            "active": oper.active,
+            "limit": oper.limit,
+        },
+    )
     return oper
 
 
@@ -89,6 +195,7 @@ def create_source(session: Session, source_create: SourceCreate) -> Source:
     :param source_create: Схема данных источника.
     :return: Объект Source.
     """
+    write_transaction(session)
     source = Source(name=source_create.name)
     session.add(source)
     session.commit()
@@ -109,6 +216,7 @@ def assign_operator_to_source(
     :param assign: Схема с ID и нагрузкой оператора.
     :return: Объект SourceOperator или None.
     """
+    write_transaction(session)
     oper = get_operator(session, assign.operator_id)
     source = session.query(Source).filter(Source.id == source_id).first()
     if not oper or not source:
@@ -127,23 +235,90 @@ def assign_operator_to_source(
             weight=assign.weight
         )
         session.add(source_oper)
+    bump_config_version(session)
     session.commit()
+    routing_cache.invalidate()
     session.refresh(source_oper)
     return source_oper
 
 
-def find_or_create_lead(
+def replace_source_operators(
+        session: Session,
+        source_id: int,
+        assigns: list[SourceOperatorAssign]
+) -> list[SourceOperator] | None:
+    """
+    Атомарно заменяет таблицу весов операторов источника.
+
+    Операторы, отсутствующие в списке, снимаются с источника, остальные
+    добавляются или обновляются одним upsert. Кэш маршрутизации
+    сбрасывается один раз на всю замену. При повторе operator_id в списке
+    действует последнее значение.
+
+    :param session: Сессия для работы с базой данных.
+    :param source_id: ID источника.
+    :param assigns: Новый набор операторов с их весами.
+    :return: Список объектов SourceOperator или None.
+    """
+    write_transaction(session)
+    source = session.query(Source).filter(Source.id == source_id).first()
+    if not source:
+        return None
+    weights = {assign.operator_id: assign.weight for assign in assigns}
+    found = {
+        oper_id for oper_id, in session.query(Operator.id)
+        .filter(Operator.id.in_(weights))
+    }
+    if found != set(weights):
+        return None
+    (
+        session.query(SourceOperator)
+        .filter(
+            SourceOperator.source_id == source_id,
+            SourceOperator.operator_id.not_in(weights),
+        )
+        .delete(synchronize_session=False)
+    )
+    if weights:
+        stmt = sqlite_insert(SourceOperator).values(
+            [
+                {
+                    "source_id": source_id,
+                    "operator_id": oper_id,
+                    "weight": weight,
+                }
+                for oper_id, weight in weights.items()
+            ]
+        )
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["source_id", "operator_id"],
+                set_={"weight": stmt.excluded.weight},
+            )
+        )
+    bump_config_version(session)
+    session.commit()
+    routing_cache.invalidate()
+    return (
+        session.query(SourceOperator)
+        .filter(SourceOperator.source_id == source_id)
+        .order_by(SourceOperator.operator_id)
+        .all()
+    )
+
+
+def find_lead(
         session: Session,
         external_id: str | None = None,
         e_mail: str | None = None
-) -> Lead:
+) -> Lead | None:
     """
-    Находит существующего лида либо создаёт нового.
+    Находит лида сначала по внешнему ID, затем по e-mail.
 
     :param session: Сессия для работы с базой данных.
     :param external_id: ID лида.
     :param e_mail: E-mail лида.
-    :return: Объект Lead.
+    :return: Объект Lead или None.
     """
     query = session.query(Lead)
     if external_id:
@@ -151,9 +326,34 @@ def find_or_create_lead(
         if lead:
             return lead
     if e_mail:
-        lead = query.filter(Lead.e_mail == e_mail).first()
-        if lead:
-            return lead
+        return query.filter(Lead.e_mail == e_mail).first()
+    return None
+
+
+def find_or_create_lead(
+        session: Session,
+        external_id: str | None = None,
+        e_mail: str | None = None
+) -> Lead:
+    """
+    Находит существующего лида либо создаёт нового.
+
+    Лид сначала ищется читающей транзакцией, и блокировка записи берётся,
+    только если его нет; после неё поиск повторяется, чтобы лид не создали
+    дважды.
+
+    :param session: Сессия для работы с базой данных.
+    :param external_id: ID лида.
+    :param e_mail: E-mail лида.
+    :return: Объект Lead.
+    """
+    lead = find_lead(session, external_id, e_mail)
+    if lead:
+        return lead
+    write_transaction(session)
+    lead = find_lead(session, external_id, e_mail)
+    if lead:
+        return lead
     lead = Lead(external_id=external_id, e_mail=e_mail)
     session.add(lead)
     session.commit()
@@ -161,6 +361,35 @@ def find_or_create_lead(
     return lead
 
 
+def count_open_contacts(session: Session, operator_ids: list) -> dict:
+    """
+    Подсчитывает открытые обращения операторов одним запросом.
+
+    Если сессия принадлежит шарду, к локальным нагрузкам добавляются
+    нагрузки операторов на остальных шардах.
+
+    :param session: Сессия для работы с базой данных.
+    :param operator_ids: Список ID операторов.
+    :return: Словарь {ID оператора: количество открытых обращений}.
+    """
+    if not operator_ids:
+        return {}
+    loads = dict(
+        session.query(Contact.operator_id, func.count(Contact.id))
+        .filter(
+            Contact.operator_id.in_(operator_ids),
+            Contact.status == ContactStatus.open,
+        )
+        .group_by(Contact.operator_id)
+        .all()
+    )
+    remote_loads = session.info.get("remote_loads")
+    if remote_loads is not None:
+        for oper_id, count in remote_loads(operator_ids).items():
+            loads[oper_id] = loads.get(oper_id, 0) + count
+    return loads
+
+
 def count_active_contacts_for_operator(
         session: Session,
         operator_id: int
@@ -172,39 +401,45 @@ def count_active_contacts_for_operator(
     :param operator_id: ID оператора.
     :return: Количество обращений оператора.
     """
-    return (
-        session.query(Contact)
-        .filter(
-            Contact.operator_id == operator_id,
-            Contact.status == ContactStatus.open,
-        )
-        .count()
-    )
+    return count_open_contacts(session, [operator_id]).get(operator_id, 0)
 
 
 def available_operators_for_source(session: Session, source_id: int) -> list:
     """
     Возвращает список доступных для источника операторов с их нагрузками.
 
+    Веса берутся из кэша маршрутизации, а активность, лимиты и текущие
+    нагрузки кандидатов читаются двумя запросами независимо от их числа.
+
     :param session: Сессия для работы с базой данных.
     :param source_id: ID источника.
     :return: Список операторов с их нагрузками.
     """
-    rows = (
-        session.query(SourceOperator)
-        .filter(SourceOperator.source_id == source_id)
-        .all()
+    weights = routing_cache.source_weights(session, source_id)
+    if not weights:
+        return []
+    oper_ids = [oper_id for oper_id, _ in weights]
+    opers = {
+        oper.id: oper
+        for oper in session.query(Operator).filter(
+            Operator.id.in_(oper_ids),
+            Operator.active.is_(True),
+        )
+    }
+    loads = count_open_contacts(
+        session,
+        [oper.id for oper in opers.values() if oper.limit is not None],
     )
-    opers = []
-    for source_oper in rows:
-        oper = source_oper.operator
-        if not oper.active:
+    candidates = []
+    for oper_id, weight in weights:
+        oper = opers.get(oper_id)
+        if oper is None:
             continue
-        current_load = count_active_contacts_for_operator(session, oper.id)
+        current_load = loads.get(oper_id, 0)
         if oper.limit is not None and current_load >= oper.limit:
             continue
-        opers.append((oper, source_oper.weight))
-    return opers
+        candidates.append((oper, weight))
+    return candidates
 
 
 def choose_operator_by_weight(candidates: list) -> Operator | None:
@@ -227,32 +462,778 @@ def choose_operator_by_weight(candidates: list) -> Operator | None:
     return candidates[-1][0]
 
 
-def create_contact(session: Session, contact: ContactCreate) -> Contact:
+def find_affinity_operator(
+        session: Session,
+        lead_id: int,
+        source_id: int
+) -> Operator | None:
+    """
+    Находит оператора, который последним вёл лида по данному источнику.
+
+    Учитываются только обращения лида через этот источник; поиск идёт по
+    индексу contacts.lead_id. Оператор возвращается, только если он всё
+    ещё назначен на источник, активен и не превысил лимит.
+
+    :param session: Сессия для работы с базой данных.
+    :param lead_id: ID лида.
+    :param source_id: ID источника.
+    :return: Объект Operator или None.
+    """
+    oper = (
+        session.query(Operator)
+        .join(Contact, Contact.operator_id == Operator.id)
+        .join(
+            SourceOperator,
+            and_(
+                SourceOperator.operator_id == Operator.id,
+                SourceOperator.source_id == source_id,
+            ),
+        )
+        .filter(Contact.lead_id == lead_id, Contact.source_id == source_id)
+        .order_by(Contact.id.desc())
+        .first()
+    )
+    if not oper or not oper.active:
+        return None
+    if oper.limit is not None:
+        current_load = count_active_contacts_for_operator(session, oper.id)
+        if current_load >= oper.limit:
+            return None
+    return oper
+
+
+def get_affinity_stats() -> dict:
+    """
+    Возвращает статистику попаданий в закреплённого оператора.
+
+    :return: Словарь с количеством попаданий, промахов и долей попаданий.
+    """
+    with affinity_lock:
+        hits = affinity_stats["hits"]
+        misses = affinity_stats["misses"]
+    total = hits + misses
+    return {
+        "enabled": config.AFFINITY_ENABLED,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+    }
+
+
+def contact_event_data(contact: Contact) -> dict:
+    """
+    Формирует данные события о контакте.
+
+    :param contact: Объект Contact.
+    :return: Словарь с ID контакта, лида, источника и оператора.
+    """
+    return {
+        "contact_id": contact.id,
+        "lead_id": contact.lead_id,
+        "source_id": contact.source_id,
+        "operator_id": contact.operator_id,
+        "status": contact.status.value,
+    }
+
+
+def rollup_bucket(moment: datetime) -> datetime:
+    """
+    Возвращает начало часа, к которому относится момент времени.
+
+    :param moment: Время (UTC).
+    :return: Начало часа.
+    """
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_rollup(
+        session: Session,
+        moment: datetime,
+        source_id: int | None,
+        operator_id: int | None,
+        status: ContactStatus,
+        count: int = 1
+) -> None:
+    """
+    Увеличивает почасовой счётчик обращений в текущей транзакции.
+
+    :param session: Сессия для работы с базой данных.
+    :param moment: Время события (UTC).
+    :param source_id: ID источника.
+    :param operator_id: ID оператора; None для нераспределённых.
+    :param status: Событие: открытие или закрытие обращения.
+    :param count: На сколько увеличить счётчик.
+    """
+    stmt = sqlite_insert(ContactRollup).values(
+        bucket=rollup_bucket(moment),
+        source_id=source_id or 0,
+        operator_id=operator_id or 0,
+        status=status,
+        count=count,
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["bucket", "source_id", "operator_id", "status"],
+            set_={"count": ContactRollup.count + stmt.excluded.count},
+        )
+    )
+
+
+def create_contact(
+        session: Session,
+        contact: ContactCreate,
+        affinity: bool | None = None,
+        idempotency_key: str | None = None,
+        lead_session: Session | None = None
+) -> Contact:
     """
     Создаёт новый объект Contact и назначает оператора.
 
+    В режиме закрепления контакт сразу уходит предыдущему оператору лида,
+    если тот доступен, минуя перебор кандидатов источника. При заданном
+    NOTIFY_URL в той же транзакции в outbox пишется уведомление о
+    назначении оператора.
+
     :param session: Сессия для работы с базой данных.
     :param contact: Объект ContactCreate.
+    :param affinity: Режим закрепления; по умолчанию AFFINITY_ENABLED.
+    :param idempotency_key: Ключ идемпотентности, сохраняемый в той же
+        транзакции, что и контакт.
+    :param lead_session: Сессия базы лидов, если она отличается от базы
+        обращений (в режиме шардирования — основная база).
     :return: Объект Contact.
     """
-    lead = find_or_create_lead(
-        session, external_id=contact.external_id, e_mail=contact.e_mail
-    )
-    candidates = available_operators_for_source(session, contact.source_id)
-    chosen = choose_operator_by_weight(candidates)
+    if affinity is None:
+        affinity = config.AFFINITY_ENABLED
+    lead_id = find_or_create_lead(
+        lead_session or session,
+        external_id=contact.external_id,
+        e_mail=contact.e_mail,
+    ).id
+    write_transaction(session)
+    chosen = None
+    if affinity:
+        chosen = find_affinity_operator(session, lead_id, contact.source_id)
+        with affinity_lock:
+            affinity_stats["hits" if chosen else "misses"] += 1
+    if chosen is None:
+        candidates = available_operators_for_source(
+            session, contact.source_id
+        )
+        chosen = choose_operator_by_weight(candidates)
     operator_id = chosen.id if chosen else None
     contact = Contact(
-        lead_id=lead.id,
+        lead_id=lead_id,
         source_id=contact.source_id,
         operator_id=operator_id,
         payload=contact.payload,
+        created_at=utcnow(),
     )
     session.add(contact)
+    record_rollup(
+        session,
+        contact.created_at,
+        contact.source_id,
+        operator_id,
+        ContactStatus.open,
+    )
+    if config.NOTIFY_URL and operator_id is not None:
+        session.add(
+            OutboxMessage(
+                event_type="contact_assigned",
+                contact=contact,
+                payload=json.dumps(
+                    {
+                        "lead_id": lead_id,
+                        "source_id": contact.source_id,
+                        "operator_id": operator_id,
+                    }
+                ),
+            )
+        )
+    if idempotency_key is not None:
+        session.flush()
+        session.add(IdempotencyKey(key=idempotency_key, contact_id=contact.id))
     session.commit()
     session.refresh(contact)
+    if contact.operator_id is not None:
+        event_bus.publish("contact_assigned", contact_event_data(contact))
     return contact
 
 
+def lookup_leads(session: Session, column, values: set) -> dict:
+    """
+    Находит ID лидов по значениям колонки пачками запросов IN.
+
+    :param session: Сессия для работы с базой данных.
+    :param column: Lead.external_id или Lead.e_mail.
+    :param values: Искомые значения.
+    :return: Словарь значение -> наименьший ID лида с этим значением.
+    """
+    values = sorted(values)
+    found = {}
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        found.update(
+            session.execute(
+                select(column, func.min(Lead.id))
+                .where(column.in_(values[start:start + LOOKUP_CHUNK]))
+                .group_by(column)
+            ).all()
+        )
+    return found
+
+
+def resolve_leads_bulk(session: Session, contacts: list) -> list:
+    """
+    Находит или создаёт лидов для пачки обращений.
+
+    Лид ищется так же, как в find_or_create_lead: сначала по внешнему ID,
+    затем по e-mail. Недостающие лиды, в том числе повторяющиеся внутри
+    пачки, создаются одним INSERT в текущей транзакции.
+
+    :param session: Сессия для работы с базой данных.
+    :param contacts: Список объектов ContactCreate.
+    :return: Список ID лидов в порядке обращений.
+    """
+    by_external = lookup_leads(
+        session,
+        Lead.external_id,
+        {contact.external_id for contact in contacts if contact.external_id},
+    )
+    by_e_mail = lookup_leads(
+        session,
+        Lead.e_mail,
+        {contact.e_mail for contact in contacts if contact.e_mail},
+    )
+    pending = []
+    refs = []
+    for contact in contacts:
+        lead_id = None
+        if contact.external_id:
+            lead_id = by_external.get(contact.external_id)
+        if lead_id is None and contact.e_mail:
+            lead_id = by_e_mail.get(contact.e_mail)
+        if lead_id is None:
+            pending.append(
+                {"external_id": contact.external_id, "e_mail": contact.e_mail}
+            )
+            lead_id = -len(pending)
+            if contact.external_id:
+                by_external[contact.external_id] = lead_id
+            if contact.e_mail:
+                by_e_mail.setdefault(contact.e_mail, lead_id)
+        refs.append(lead_id)
+    if not pending:
+        return refs
+    created = session.scalars(
+        insert(Lead).returning(Lead.id, sort_by_parameter_order=True),
+        pending,
+    ).all()
+    return [
+        lead_id if lead_id > 0 else created[-lead_id - 1] for lead_id in refs
+    ]
+
+
+def create_contacts_bulk(
+        session: Session,
+        contacts: list,
+        seed: int | None = None,
+        lead_session: Session | None = None
+) -> dict:
+    """
+    Регистрирует пачку обращений одной транзакцией.
+
+    Состояние операторов собирается в массивы NumPy (DistributionModel):
+    ID, активность, лимиты, текущая нагрузка и веса по источникам.
+    Обращения каждого источника распределяются сразу всей группой
+    мультиномиальным розыгрышем по весам с учётом оставшейся ёмкости
+    (assign_batch), после чего контакты записываются одним INSERT, а
+    почасовые счётчики — одной строкой на пару источник-оператор.
+    Закрепление лидов за операторами и контроль допуска при массовой
+    регистрации не применяются.
+
+    :param session: Сессия для работы с базой данных.
+    :param contacts: Список объектов ContactCreate.
+    :param seed: Зерно генератора случайных чисел.
+    :param lead_session: Сессия базы лидов, если она отличается от базы
+        обращений; новые лиды фиксируются в ней до записи обращений.
+    :return: Количество созданных и нераспределённых обращений и число
+        назначенных каждому оператору.
+    """
+    if not contacts:
+        return {"created": 0, "unassigned": 0, "operators": []}
+    leads = lead_session or session
+    write_transaction(leads)
+    lead_ids = resolve_leads_bulk(leads, contacts)
+    if leads is not session:
+        leads.commit()
+    write_transaction(session)
+    rng = np.random.default_rng(seed)
+    model = DistributionModel.from_db(session)
+    remote_loads = session.info.get("remote_loads")
+    if remote_loads is not None and len(model.operator_ids):
+        operator_ids = model.operator_ids.tolist()
+        remote = remote_loads(operator_ids)
+        model.loads += np.array(
+            [remote.get(oper_id, 0) for oper_id in operator_ids],
+            dtype=np.int64,
+        )
+    free = np.where(
+        model.active, np.maximum(model.limits - model.loads, 0), 0
+    )
+    rows_of_source = {
+        source_id: row
+        for row, source_id in enumerate(model.source_ids.tolist())
+    }
+    positions = {}
+    for position, contact in enumerate(contacts):
+        positions.setdefault(contact.source_id, []).append(position)
+    operator_ids = [None] * len(contacts)
+    for source_id, source_positions in positions.items():
+        row = rows_of_source.get(source_id)
+        if row is None:
+            continue
+        assigned, remaining = assign_batch(
+            rng,
+            len(source_positions),
+            model.weights[row],
+            np.where(model.members[row], free, 0),
+        )
+        free -= assigned
+        chosen = rng.permutation(
+            np.concatenate(
+                [
+                    np.repeat(model.operator_ids, assigned),
+                    np.zeros(remaining, dtype=np.int64),
+                ]
+            )
+        )
+        for position, oper_id in zip(source_positions, chosen.tolist()):
+            operator_ids[position] = oper_id or None
+
+    now = utcnow()
+    rows = [
+        {
+            "lead_id": lead_id,
+            "source_id": contact.source_id,
+            "operator_id": oper_id,
+            "status": ContactStatus.open,
+            "payload": contact.payload,
+            "created_at": now,
+        }
+        for contact, lead_id, oper_id in zip(contacts, lead_ids, operator_ids)
+    ]
+    ids = strided_ids(session, Contact, len(rows))
+    if ids is not None:
+        for row, contact_id in zip(rows, ids):
+            row["id"] = contact_id
+    contact_ids = session.scalars(
+        insert(Contact).returning(Contact.id, sort_by_parameter_order=True),
+        rows,
+    ).all()
+    rollups = Counter((row["source_id"], row["operator_id"]) for row in rows)
+    for (source_id, oper_id), count in rollups.items():
+        record_rollup(
+            session, now, source_id, oper_id, ContactStatus.open, count
+        )
+    if config.NOTIFY_URL:
+        messages = [
+            {
+                "event_type": "contact_assigned",
+                "contact_id": contact_id,
+                "payload": json.dumps(
+                    {
+                        "lead_id": row["lead_id"],
+                        "source_id": row["source_id"],
+                        "operator_id": row["operator_id"],
+                    }
+                ),
+            }
+            for row, contact_id in zip(rows, contact_ids)
+            if row["operator_id"] is not None
+        ]
+        if messages:
+            session.execute(insert(OutboxMessage), messages)
+    session.commit()
+
+    per_operator = Counter(oper_id for oper_id in operator_ids if oper_id)
+    result = {
+        "created": len(rows),
+        "unassigned": len(rows) - sum(per_operator.values()),
+        "operators": [
+            {"operator_id": oper_id, "assigned": per_operator[oper_id]}
+            for oper_id in sorted(per_operator)
+        ],
+    }
+    event_bus.publish(
+        "contacts_imported",
+        {"created": result["created"], "unassigned": result["unassigned"]},
+    )
+    return result
+
+
+def find_idempotent_contact(
+        session: Session,
+        key: str
+) -> Contact | ArchivedContact | None:
+    """
+    Находит контакт, ранее созданный по ключу идемпотентности.
+
+    Сначала проверяется кэш в памяти, затем таблица idempotency_keys.
+    Ключ из таблицы попадает в кэш на оставшееся время жизни, а не на
+    полное. Истёкший ключ удаляется в текущей транзакции, чтобы его можно
+    было использовать заново. Если контакт уже перенесён в архив,
+    возвращается архивная запись: ключ остаётся занятым, пока не истечёт.
+
+    :param session: Сессия для работы с базой данных.
+    :param key: Ключ идемпотентности.
+    :return: Объект Contact, ArchivedContact или None.
+    """
+    contact_id = idempotency_cache.get(key)
+    if contact_id is None:
+        row = session.get(IdempotencyKey, key)
+        if row is None:
+            return None
+        expires_at = row.created_at + timedelta(
+            seconds=config.IDEMPOTENCY_TTL_SECONDS
+        )
+        remaining = (expires_at - utcnow()).total_seconds()
+        if remaining < 0:
+            session.delete(row)
+            return None
+        contact_id = row.contact_id
+        idempotency_cache.put(key, contact_id, ttl=remaining)
+    return (
+        session.get(Contact, contact_id)
+        or session.get(ArchivedContact, contact_id)
+    )
+
+
+def purge_idempotency_keys(session: Session) -> int:
+    """
+    Удаляет истёкшие ключи идемпотентности.
+
+    :param session: Сессия для работы с базой данных.
+    :return: Количество удалённых ключей.
+    """
+    write_transaction(session)
+    cutoff = utcnow() - timedelta(seconds=config.IDEMPOTENCY_TTL_SECONDS)
+    deleted = (
+        session.query(IdempotencyKey)
+        .filter(IdempotencyKey.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    session.commit()
+    return deleted
+
+
+def create_contact_idempotent(
+        session: Session,
+        contact: ContactCreate,
+        key: str,
+        lead_session: Session | None = None
+) -> Contact | ArchivedContact:
+    """
+    Создаёт контакт не более одного раза для каждого ключа идемпотентности.
+
+    Повтор с тем же ключом возвращает исходный контакт (или его архивную
+    запись) без поиска лида и распределения. Ключ ищется в кэше и в
+    читающей транзакции; блокировка записи берётся только при промахе,
+    после чего ключ проверяется ещё раз. Если параллельный запрос успел
+    сохранить ключ первым, транзакция откатывается и возвращается его
+    контакт. Каждые IDEMPOTENCY_PURGE_EVERY новых ключей из таблицы
+    удаляются истёкшие.
+
+    :param session: Сессия для работы с базой данных.
+    :param contact: Объект ContactCreate.
+    :param key: Ключ идемпотентности.
+    :param lead_session: Сессия базы лидов, если она отличается от базы
+        обращений.
+    :return: Объект Contact или ArchivedContact.
+    """
+    existing = find_idempotent_contact(session, key)
+    if existing is not None:
+        return existing
+    # Читающая транзакция завершается без записи, в том числе без
+    # удаления истёкшего ключа: проверка повторяется под блокировкой.
+    session.rollback()
+    write_transaction(session)
+    existing = find_idempotent_contact(session, key)
+    if existing is not None:
+        return existing
+    try:
+        created = create_contact(
+            session, contact, idempotency_key=key, lead_session=lead_session
+        )
+    except IntegrityError:
+        session.rollback()
+        existing = find_idempotent_contact(session, key)
+        if existing is None:
+            raise
+        return existing
+    idempotency_cache.put(key, created.id)
+    if next(idempotent_inserts) % config.IDEMPOTENCY_PURGE_EVERY == 0:
+        purge_idempotency_keys(session)
+    return created
+
+
+def close_contact(session: Session, contact_id: int) -> Contact | None:
+    """
+    Закрывает обращение и фиксирует время закрытия.
+
+    :param session: Сессия для работы с базой данных.
+    :param contact_id: ID контакта.
+    :return: Объект Contact или None.
+    """
+    write_transaction(session)
+    contact = session.query(Contact).filter(Contact.id == contact_id).first()
+    if not contact:
+        return None
+    if contact.status != ContactStatus.closed:
+        contact.status = ContactStatus.closed
+        contact.closed_at = utcnow()
+        record_rollup(
+            session,
+            contact.closed_at,
+            contact.source_id,
+            contact.operator_id,
+            ContactStatus.closed,
+        )
+        session.commit()
+        session.refresh(contact)
+        event_bus.publish("contact_closed", contact_event_data(contact))
+    return contact
+
+
+def archive_closed_contacts(
+        session: Session,
+        cutoff: datetime,
+        batch_size: int = 1000,
+        max_batches: int | None = None
+) -> int:
+    """
+    Переносит закрытые до cutoff контакты в архивную таблицу.
+
+    Перенос идёт пачками по batch_size строк, каждая пачка в своей
+    транзакции, чтобы не держать блокировку записи долго. Закрытые
+    контакты без времени закрытия считаются старше любого cutoff.
+
+    :param session: Сессия для работы с базой данных.
+    :param cutoff: Граница времени закрытия (UTC).
+    :param batch_size: Размер пачки.
+    :param max_batches: Максимум пачек за вызов; None — без ограничения.
+    :return: Количество перенесённых контактов.
+    """
+    columns = (
+        "id", "lead_id", "source_id", "operator_id",
+        "status", "payload", "created_at", "closed_at",
+    )
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        write_transaction(session)
+        ids = [
+            contact_id for contact_id, in session.query(Contact.id)
+            .filter(
+                Contact.status == ContactStatus.closed,
+                (Contact.closed_at < cutoff) | Contact.closed_at.is_(None),
+            )
+            .order_by(Contact.id)
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+        session.execute(
+            insert(ArchivedContact).from_select(
+                columns,
+                select(*(getattr(Contact, name) for name in columns))
+                .where(Contact.id.in_(ids)),
+            )
+        )
+        session.query(Contact).filter(Contact.id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        session.commit()
+        moved += len(ids)
+        batches += 1
+    return moved
+
+
+def operator_excess(session: Session, oper: Operator) -> int:
+    """
+    Считает, сколько открытых обращений оператора превышают его лимит.
+
+    Для неактивного оператора лишними считаются все открытые обращения.
+
+    :param session: Сессия для работы с базой данных.
+    :param oper: Объект Operator.
+    :return: Количество лишних обращений.
+    """
+    if oper.active and oper.limit is None:
+        return 0
+    keep = oper.limit if oper.active else 0
+    load = count_open_contacts(session, [oper.id]).get(oper.id, 0)
+    return max(load - keep, 0)
+
+
+def rebalance_operator(
+        session: Session,
+        operator_id: int,
+        batch_size: int = 1000,
+        max_batches: int | None = None,
+        seed: int | None = None
+) -> dict | None:
+    """
+    Переносит лишние открытые обращения оператора на других операторов.
+
+    Лишними считаются обращения сверх лимита, а у неактивного оператора —
+    все открытые. Начиная с самых новых, обращения пачками по batch_size
+    распределяются между операторами своих источников по весам и
+    оставшейся ёмкости (как в assign_batch симулятора) и переназначаются
+    одним UPDATE на каждого получателя. Каждая пачка идёт в своей
+    транзакции; в ней же для перенесённых обращений пишутся уведомления
+    outbox, а после фиксации публикуются события contact_assigned.
+    Обращения источников без других активных операторов пропускаются и
+    остаются за оператором: следующая пачка читается после последнего
+    просмотренного id, поэтому они не мешают дойти до более старых
+    обращений, которые перенести можно.
+
+    :param session: Сессия для работы с базой данных.
+    :param operator_id: ID оператора.
+    :param batch_size: Размер пачки.
+    :param max_batches: Максимум пачек за вызов; None — без ограничения.
+    :param seed: Зерно генератора случайных чисел.
+    :return: Словарь с количеством перенесённых и оставшихся лишних
+        обращений или None, если оператор не найден.
+    """
+    oper = get_operator(session, operator_id)
+    if not oper:
+        return None
+    rng = np.random.default_rng(seed)
+    moved = 0
+    batches = 0
+    before_id = None
+    while max_batches is None or batches < max_batches:
+        write_transaction(session)
+        excess = operator_excess(session, oper)
+        query = (
+            select(Contact.id, Contact.source_id, Contact.lead_id)
+            .where(
+                Contact.operator_id == oper.id,
+                Contact.status == ContactStatus.open,
+            )
+            .order_by(Contact.id.desc())
+            .limit(batch_size)
+        )
+        if before_id is not None:
+            query = query.where(Contact.id < before_id)
+        rows = session.execute(query).all() if excess else []
+        if not rows:
+            session.rollback()
+            break
+        weights = {
+            source_id: [
+                (oper_id, weight)
+                for oper_id, weight in routing_cache.source_weights(
+                    session, source_id
+                )
+                if oper_id != oper.id
+            ]
+            for source_id in {row.source_id for row in rows}
+        }
+        targets = {
+            target.id: target
+            for target in session.query(Operator).filter(
+                Operator.id.in_(
+                    [oper_id for pairs in weights.values()
+                     for oper_id, _ in pairs]
+                ),
+                Operator.active.is_(True),
+            )
+        }
+        lead_ids = {row.id: row.lead_id for row in rows}
+        by_source = {}
+        for contact_id, source_id, _ in rows:
+            if excess <= 0:
+                break
+            before_id = contact_id
+            if any(oper_id in targets for oper_id, _ in weights[source_id]):
+                by_source.setdefault(source_id, []).append(contact_id)
+                excess -= 1
+        loads = count_open_contacts(session, list(targets))
+        capacity = {
+            oper_id: UNLIMITED if target.limit is None
+            else max(target.limit - loads.get(oper_id, 0), 0)
+            for oper_id, target in targets.items()
+        }
+        reassigned = []
+        for source_id, contact_ids in by_source.items():
+            pairs = [
+                (oper_id, weight) for oper_id, weight in weights[source_id]
+                if oper_id in targets
+            ]
+            if not pairs:
+                continue
+            assigned, _ = assign_batch(
+                rng,
+                len(contact_ids),
+                np.array([weight for _, weight in pairs]),
+                np.array([capacity[oper_id] for oper_id, _ in pairs]),
+            )
+            offset = 0
+            for (oper_id, _), count in zip(pairs, assigned.tolist()):
+                if not count:
+                    continue
+                chunk = contact_ids[offset:offset + count]
+                session.execute(
+                    update(Contact)
+                    .where(Contact.id.in_(chunk))
+                    .values(operator_id=oper_id)
+                )
+                reassigned += [
+                    {
+                        "contact_id": contact_id,
+                        "lead_id": lead_ids[contact_id],
+                        "source_id": source_id,
+                        "operator_id": oper_id,
+                        "status": ContactStatus.open.value,
+                    }
+                    for contact_id in chunk
+                ]
+                capacity[oper_id] -= count
+                offset += count
+        if config.NOTIFY_URL and reassigned:
+            session.execute(
+                insert(OutboxMessage),
+                [
+                    {
+                        "event_type": "contact_assigned",
+                        "contact_id": data["contact_id"],
+                        "payload": json.dumps(
+                            {
+                                "lead_id": data["lead_id"],
+                                "source_id": data["source_id"],
+                                "operator_id": data["operator_id"],
+                            }
+                        ),
+                    }
+                    for data in reassigned
+                ],
+            )
+        session.commit()
+        for data in reassigned:
+            event_bus.publish("contact_assigned", data)
+        batches += 1
+        moved += len(reassigned)
+    remaining = operator_excess(session, oper)
+    session.commit()
+    if moved:
+        event_bus.publish(
+            "operator_rebalanced", {"operator_id": oper.id, "moved": moved}
+        )
+    return {"operator_id": oper.id, "moved": moved, "remaining": remaining}
+
+
 def get_leads_list(session: Session) -> list:
     """
     Получает список всех лидов.
@@ -263,15 +1244,299 @@ def get_leads_list(session: Session) -> list:
     return session.query(Lead).all()
 
 
-def get_stats(session: Session) -> dict:
+def get_leads_rows(session: Session) -> list:
+    """
+    Получает список лидов в виде кортежей колонок.
+
+    :param session: Сессия для работы с базой данных.
+    :return: Список кортежей (id, external_id, e_mail).
+    """
+    return session.execute(
+        select(Lead.id, Lead.external_id, Lead.e_mail).order_by(Lead.id)
+    ).all()
+
+
+def get_archived_contacts(session: Session, lead_ids: list) -> list:
+    """
+    Загружает архивные обращения лидов вместе с источниками и операторами.
+
+    :param session: Сессия для работы с базой данных.
+    :param lead_ids: Список ID лидов.
+    :return: Список объектов ArchivedContact по возрастанию ID.
+    """
+    return session.scalars(
+        select(ArchivedContact)
+        .where(ArchivedContact.lead_id.in_(lead_ids))
+        .options(
+            joinedload(ArchivedContact.source),
+            joinedload(ArchivedContact.operator),
+        )
+        .order_by(ArchivedContact.id)
+    ).all()
+
+
+def attach_lead_contacts(leads: list, contacts: list) -> None:
+    """
+    Подставляет обращения в Lead.contacts в порядке ID.
+
+    Коллекция заменяется через set_committed_value, без отметки об
+    изменении, поэтому сессия не попытается записать её при flush, а в неё
+    можно класть и архивные записи.
+
+    :param leads: Список объектов Lead.
+    :param contacts: Обращения этих лидов, активные и архивные.
+    """
+    by_lead = {}
+    for contact in sorted(contacts, key=lambda row: row.id):
+        by_lead.setdefault(contact.lead_id, []).append(contact)
+    for lead in leads:
+        set_committed_value(lead, "contacts", by_lead.get(lead.id, []))
+
+
+def get_leads_history(
+        session: Session,
+        lead_ids: list,
+        include_archived: bool = False
+) -> list:
+    """
+    Загружает лидов вместе с обращениями, их источниками и операторами.
+
+    Обращения догружаются одним запросом selectinload на каждые 500
+    лидов, а источник и оператор присоединяются к нему через JOIN, так
+    что число запросов не зависит от количества обращений:
+    1 + ceil(len(lead_ids) / 500). Архивные обращения добавляют ещё один
+    запрос к contacts_archive.
+
+    :param session: Сессия для работы с базой данных.
+    :param lead_ids: Список ID лидов.
+    :param include_archived: Добавлять ли обращения из архива.
+    :return: Список найденных объектов Lead по возрастанию ID.
+    """
+    leads = session.scalars(
+        select(Lead)
+        .where(Lead.id.in_(lead_ids))
+        .options(
+            selectinload(Lead.contacts).options(
+                joinedload(Contact.source), joinedload(Contact.operator)
+            )
+        )
+        .order_by(Lead.id)
+    ).all()
+    if include_archived and leads:
+        attach_lead_contacts(
+            leads,
+            [contact for lead in leads for contact in lead.contacts]
+            + get_archived_contacts(session, [lead.id for lead in leads]),
+        )
+    return leads
+
+
+def get_leads_by_ids(session: Session, lead_ids: list) -> list:
+    """
+    Загружает лидов по списку ID без их обращений.
+
+    :param session: Сессия для работы с базой данных.
+    :param lead_ids: Список ID лидов.
+    :return: Список найденных объектов Lead по возрастанию ID.
+    """
+    return session.scalars(
+        select(Lead).where(Lead.id.in_(lead_ids)).order_by(Lead.id)
+    ).all()
+
+
+def get_leads_contacts(
+        session: Session,
+        lead_ids: list,
+        include_archived: bool = False
+) -> list:
+    """
+    Загружает обращения лидов вместе с источниками и операторами.
+
+    Нужна в режиме шардирования, где лиды хранятся в основной базе, а их
+    обращения — на шардах источников.
+
+    :param session: Сессия для работы с базой данных.
+    :param lead_ids: Список ID лидов.
+    :param include_archived: Добавлять ли обращения из архива.
+    :return: Список объектов Contact и ArchivedContact.
+    """
+    contacts = session.scalars(
+        select(Contact)
+        .where(Contact.lead_id.in_(lead_ids))
+        .options(joinedload(Contact.source), joinedload(Contact.operator))
+        .order_by(Contact.id)
+    ).all()
+    if include_archived:
+        contacts += get_archived_contacts(session, lead_ids)
+    return contacts
+
+
+def prefix_end(prefix: str) -> str:
+    """
+    Возвращает наименьшую строку, большую всех строк с данным префиксом.
+
+    :param prefix: Непустой префикс.
+    :return: Верхняя граница диапазона префикса.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_leads(
+        session: Session,
+        e_mail: str | None = None,
+        domain: str | None = None,
+        external_id: str | None = None,
+        limit: int = 50,
+        after: tuple | None = None
+) -> list:
+    """
+    Ищет лидов по префиксу e-mail, домену или префиксу внешнего ID.
+
+    Используется первый заданный критерий. Поиск по e-mail и домену не
+    зависит от регистра. Каждый критерий — диапазон по своему индексу,
+    а страницы отсчитываются от ключа последней строки, поэтому время
+    запроса не зависит ни от размера таблицы, ни от номера страницы.
+    Внутри одного домена ключ постоянен, и строки индекса уже идут по
+    ID: порядок и курсор берутся только по ID, без сортировки всего
+    домена.
+
+    :param session: Сессия для работы с базой данных.
+    :param e_mail: Префикс e-mail.
+    :param domain: Домен e-mail.
+    :param external_id: Префикс внешнего ID.
+    :param limit: Размер страницы.
+    :param after: Пара (ключ, ID) последней строки предыдущей страницы;
+        для домена учитывается только ID.
+    :return: Список кортежей (ключ, id, external_id, e_mail).
+    """
+    by_id = False
+    if e_mail:
+        key = LEAD_EMAIL_KEY
+        prefix = e_mail.lower()
+        condition = and_(key >= prefix, key < prefix_end(prefix))
+    elif domain:
+        key = LEAD_DOMAIN_KEY
+        condition = key == domain.lower().lstrip("@")
+        by_id = True
+    else:
+        key = Lead.external_id
+        condition = and_(key >= external_id, key < prefix_end(external_id))
+    query = select(key, Lead.id, Lead.external_id, Lead.e_mail)
+    query = query.where(condition)
+    if by_id:
+        if after is not None:
+            query = query.where(Lead.id > after[1])
+        return session.execute(query.order_by(Lead.id).limit(limit)).all()
+    if after is not None:
+        query = query.where(tuple_(key, Lead.id) > tuple_(*after))
+    return session.execute(query.order_by(key, Lead.id).limit(limit)).all()
+
+
+def count_archived_contacts(session: Session, column) -> dict:
+    """
+    Подсчитывает архивные контакты с группировкой по колонке.
+
+    :param session: Сессия для работы с базой данных.
+    :param column: Колонка ArchivedContact для группировки.
+    :return: Словарь {значение колонки: количество}.
+    """
+    return dict(
+        session.query(column, func.count(ArchivedContact.id))
+        .group_by(column)
+        .all()
+    )
+
+
+TIMESERIES_STEPS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+
+def get_contact_timeseries(
+        session: Session,
+        start: datetime,
+        end: datetime,
+        step: str = "hour",
+        source_id: int | None = None,
+        operator_id: int | None = None,
+        status: ContactStatus | None = None
+) -> list:
+    """
+    Возвращает количество открытых и закрытых обращений по интервалам.
+
+    Запрос читает только почасовые счётчики contact_rollups, поэтому его
+    стоимость зависит от длины диапазона, а не от числа обращений.
+
+    :param session: Сессия для работы с базой данных.
+    :param start: Начало диапазона (UTC), округляется вниз до часа.
+    :param end: Конец диапазона (UTC), не включается.
+    :param step: Шаг: hour или day.
+    :param source_id: Фильтр по источнику.
+    :param operator_id: Фильтр по оператору; 0 — нераспределённые.
+    :param status: Фильтр по событию: открытие или закрытие.
+    :return: Список словарей с интервалом, источником, оператором,
+        событием и количеством.
+    """
+    bucket = func.strftime(TIMESERIES_STEPS[step], ContactRollup.bucket)
+    query = (
+        select(
+            bucket,
+            ContactRollup.source_id,
+            ContactRollup.operator_id,
+            ContactRollup.status,
+            func.sum(ContactRollup.count),
+        )
+        .where(
+            ContactRollup.bucket >= rollup_bucket(start),
+            ContactRollup.bucket < end,
+        )
+        .group_by(
+            bucket,
+            ContactRollup.source_id,
+            ContactRollup.operator_id,
+            ContactRollup.status,
+        )
+        .order_by(bucket, ContactRollup.source_id, ContactRollup.operator_id)
+    )
+    if source_id is not None:
+        query = query.where(ContactRollup.source_id == source_id)
+    if operator_id is not None:
+        query = query.where(ContactRollup.operator_id == operator_id)
+    if status is not None:
+        query = query.where(ContactRollup.status == status)
+    return [
+        {
+            "bucket": bucket_start,
+            "source_id": row_source,
+            "operator_id": row_operator or None,
+            "status": row_status.value,
+            "count": count,
+        }
+        for bucket_start, row_source, row_operator, row_status, count
+        in session.execute(query)
+    ]
+
+
+def get_stats(session: Session, include_archived: bool = False) -> dict:
     """
     Получает статистику по операторам и источникам.
 
     :param session: Сессия для работы с базой данных.
+    :param include_archived: Учитывать ли архивные контакты в total.
     :return: Словарь с операторами и источниками.
     """
     oper_list = session.query(Operator).all()
     sources = session.query(Source).all()
+    archived_by_oper = {}
+    archived_by_source = {}
+    if include_archived:
+        archived_by_oper = count_archived_contacts(
+            session, ArchivedContact.operator_id
+        )
+        archived_by_source = count_archived_contacts(
+            session, ArchivedContact.source_id
+        )
     oper_stats = []
     for i_oper in oper_list:
         total = (
@@ -291,7 +1556,7 @@ def get_stats(session: Session) -> dict:
             {
                 "operator_id": i_oper.id,
                 "name": i_oper.name,
-                "total": total,
+                "total": total + archived_by_oper.get(i_oper.id, 0),
                 "open": open_cnt,
             }
         )
@@ -303,6 +1568,10 @@ def get_stats(session: Session) -> dict:
             .count()
         )
         source_stats.append(
-            {"source_id": i_source.id, "name": i_source.name, "total": total}
+            {
+                "source_id": i_source.id,
+                "name": i_source.name,
+                "total": total + archived_by_source.get(i_source.id, 0),
+            }
         )
     return {"operators": oper_stats, "sources": source_stats}
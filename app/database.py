@@ -1,8 +1,10 @@
 """Настройка подключения к базе данных."""
 
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from app import config
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -10,7 +12,183 @@ os.makedirs(DATA_DIR, exist_ok=True)
 DB_FILE = os.path.join(DATA_DIR, "db.sqlite")
 SQLITE_URL = f"sqlite:///{DB_FILE}"
 
-engine = create_engine(SQLITE_URL, connect_args={"check_same_thread": False})
+# Параметр соединения, по которому транзакция начинается с BEGIN IMMEDIATE
+IMMEDIATE_OPTION = "sqlite_begin_immediate"
+
+
+def enable_wal(sqlite_engine: Engine) -> None:
+    """
+    Включает журнал WAL и ожидание блокировки для соединений SQLite.
+
+    В режиме WAL читатели не блокируют писателя и видят все транзакции,
+    зафиксированные до начала их чтения.
+
+    :param sqlite_engine: Движок SQLite.
+    """
+    @event.listens_for(sqlite_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+
+def begin_immediate(sqlite_engine: Engine) -> None:
+    """
+    Начинает пишущие транзакции SQLite с BEGIN IMMEDIATE.
+
+    Транзакция, открытая через write_transaction(), берёт блокировку
+    записи в начале, а не при первой записи, поэтому проверка лимитов и
+    вставка обращения, поиск и создание лида выполняются атомарно
+    относительно других писателей. Без этого параллельные запросы могут
+    превысить лимит оператора, назначить обращение уже отключённому
+    оператору или создать лида дважды. Остальные транзакции начинаются
+    обычным BEGIN: чтение после фиксации (refresh, отложенные колонки,
+    сериализация ответа) не держит блокировку записи до закрытия сессии.
+
+    :param sqlite_engine: Движок SQLite.
+    """
+    @event.listens_for(sqlite_engine, "connect")
+    def disable_pysqlite_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sqlite_engine, "begin")
+    def emit_begin(conn):
+        if conn.get_execution_options().get(IMMEDIATE_OPTION):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            conn.exec_driver_sql("BEGIN")
+
+
+def write_transaction(session: Session) -> None:
+    """
+    Открывает в сессии пишущую транзакцию с BEGIN IMMEDIATE.
+
+    Вызывается в начале каждой операции, которая читает данные и пишет
+    по результату чтения. Если сессия уже в пишущей транзакции, ничего не
+    делает; открытая читающая транзакция фиксируется, так как повысить
+    её до пишущей без гонки нельзя.
+
+    :param session: Сессия для работы с базой данных.
+    """
+    if session.in_transaction():
+        options = session.connection().get_execution_options()
+        if options.get(IMMEDIATE_OPTION):
+            return
+        session.commit()
+    session.connection(execution_options={IMMEDIATE_OPTION: True})
+
+
+def create_write_engine(db_file: str, **kwargs) -> Engine:
+    """
+    Создаёт движок основной базы SQLite для записи.
+
+    :param db_file: Путь к файлу базы.
+    :param kwargs: Дополнительные параметры create_engine.
+    :return: Движок с журналом WAL и пишущими транзакциями BEGIN IMMEDIATE.
+    """
+    write_engine = create_engine(
+        f"sqlite:///{db_file}",
+        connect_args={"check_same_thread": False},
+        **kwargs,
+    )
+    enable_wal(write_engine)
+    begin_immediate(write_engine)
+    return write_engine
+
+
+def create_read_engine(
+        db_file: str,
+        replica_url: str | None = None
+) -> Engine:
+    """
+    Создаёт движок только для чтения с собственным пулом соединений.
+
+    Для SQLite файл открывается в режиме mode=ro, для других СУБД
+    используется адрес реплики.
+
+    :param db_file: Путь к файлу основной базы SQLite.
+    :param replica_url: Адрес реплики для чтения.
+    :return: Движок для чтения.
+    """
+    if replica_url:
+        return create_engine(replica_url)
+    read_engine = create_engine(
+        f"sqlite:///file:{db_file}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+    )
+
+    @event.listens_for(read_engine, "connect")
+    def set_busy_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    return read_engine
+
+
+def add_missing_columns(bind: Engine) -> None:
+    """
+    Добавляет в существующие таблицы колонки, появившиеся в моделях позже.
+
+    create_all пропускает уже существующие таблицы, поэтому база,
+    созданная прежней версией, без этого шага падает на первом запросе
+    с no such column. Набор колонок проверяется через PRAGMA table_info,
+    так что повторный запуск ничего не меняет. Добавляемые колонки должны
+    допускать NULL: SQLite не добавляет колонку NOT NULL без значения по
+    умолчанию, а старые строки получают NULL.
+
+    :param bind: Движок базы данных.
+    """
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {
+                row[1]
+                for row in conn.exec_driver_sql(
+                    f'PRAGMA table_info("{table.name}")'
+                )
+            }
+            if not existing:
+                continue
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" '
+                    f'ADD COLUMN "{column.name}" {column_type}'
+                )
+
+
+def create_missing_indexes(bind: Engine) -> None:
+    """
+    Создаёт индексы, добавленные в модели после создания таблиц.
+
+    create_all пропускает уже существующие таблицы вместе с их индексами,
+    поэтому новые индексы в старой базе создаются отдельно. Наличие
+    индекса проверяется по sqlite_master: рефлексия SQLAlchemy не видит
+    индексы по выражениям.
+
+    :param bind: Движок базы данных.
+    """
+    with bind.begin() as conn:
+        existing = set(
+            conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            ).scalars()
+        )
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=conn)
+
+
+engine = create_write_engine(DB_FILE)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
-Base = declarative_base()
\ No newline at end of file
+read_engine = create_read_engine(DB_FILE, config.READ_REPLICA_URL)
+ReadSessionLocal = sessionmaker(
+    bind=read_engine, autoflush=False, autocommit=False
+)
+
+Base = declarative_base()
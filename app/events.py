@@ -0,0 +1,123 @@
+"""Рассылка событий распределения подписчикам внутри процесса."""
+
+import asyncio
+import itertools
+import json
+import threading
+from app import config
+
+
+class Subscriber:
+    """
+    Подписчик с ограниченным буфером событий.
+
+    Если подписчик не успевает читать и буфер переполняется, он
+    отключается: буфер очищается, и в него кладётся None как признак конца
+    потока. Так медленный клиент не замедляет приём обращений.
+
+    :ivar loop: Цикл событий, в котором читает подписчик.
+    :ivar queue: Буфер сообщений.
+    :ivar dropped: Признак отключения из-за переполнения.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        """
+        Инициализация Subscriber.
+
+        :param loop: Цикл событий подписчика.
+        :param maxsize: Размер буфера.
+        """
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def offer(self, message: str) -> None:
+        """
+        Кладёт сообщение в буфер; вызывается в цикле событий подписчика.
+
+        :param message: Готовое SSE-сообщение.
+        """
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventBus:
+    """
+    Рассылка событий всем подписчикам без ожидания их чтения.
+
+    publish() можно вызывать из любого потока: сообщение передаётся в цикл
+    событий подписчика через call_soon_threadsafe, и вызывающий поток не
+    ждёт доставки.
+    """
+
+    def __init__(self, buffer_size: int = config.EVENTS_BUFFER_SIZE):
+        """
+        Инициализация EventBus.
+
+        :param buffer_size: Размер буфера каждого подписчика.
+        """
+        self.buffer_size = buffer_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def subscribe(self, loop: asyncio.AbstractEventLoop) -> Subscriber:
+        """
+        Регистрирует подписчика.
+
+        :param loop: Цикл событий подписчика.
+        :return: Объект Subscriber.
+        """
+        subscriber = Subscriber(loop, self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """
+        Удаляет подписчика.
+
+        :param subscriber: Объект Subscriber.
+        """
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        """Количество подключённых подписчиков."""
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: dict) -> None:
+        """
+        Рассылает событие всем подписчикам.
+
+        :param event_type: Тип события.
+        :param data: Данные события.
+        """
+        if not self._subscribers:
+            return
+        message = (
+            f"id: {next(self._sequence)}\n"
+            f"event: {event_type}\n"
+            f"data: {json.dumps(data, default=str)}\n\n"
+        )
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.dropped:
+                self.unsubscribe(subscriber)
+                continue
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, message)
+            except RuntimeError:
+                self.unsubscribe(subscriber)
+
+
+event_bus = EventBus()
@@ -0,0 +1,83 @@
+"""Кэш ключей идемпотентности регистрации обращений."""
+
+import threading
+import time
+from collections import OrderedDict
+from app import config
+
+
+class IdempotencyCache:
+    """
+    Ограниченный LRU-кэш соответствия ключа идемпотентности и ID контакта.
+
+    Кэш лишь ускоряет повторы: источником истины остаётся таблица
+    idempotency_keys. Записи старше ttl считаются истёкшими, при
+    переполнении вытесняются давно не использованные.
+
+    :ivar max_size: Максимальное количество ключей.
+    :ivar ttl: Время жизни ключа в секундах.
+    """
+
+    def __init__(
+            self,
+            max_size: int = config.IDEMPOTENCY_CACHE_SIZE,
+            ttl: float = config.IDEMPOTENCY_TTL_SECONDS
+    ):
+        """
+        Инициализация IdempotencyCache.
+
+        :param max_size: Максимальное количество ключей.
+        :param ttl: Время жизни ключа в секундах.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> int | None:
+        """
+        Возвращает ID контакта по ключу, если ключ не истёк.
+
+        :param key: Ключ идемпотентности.
+        :return: ID контакта или None.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            contact_id, expires_at = item
+            if time.monotonic() > expires_at:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return contact_id
+
+    def put(
+            self,
+            key: str,
+            contact_id: int,
+            ttl: float | None = None
+    ) -> None:
+        """
+        Запоминает ID контакта для ключа.
+
+        :param key: Ключ идемпотентности.
+        :param contact_id: ID контакта.
+        :param ttl: Оставшееся время жизни ключа в секундах; по умолчанию
+            полное время жизни кэша.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        with self._lock:
+            self._items[key] = (contact_id, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        with self._lock:
+            self._items.clear()
+
+
+idempotency_cache = IdempotencyCache()
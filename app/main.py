@@ -1,36 +1,149 @@
 """Содержит точку входа для работы программы."""
 
-from fastapi import FastAPI, Depends, HTTPException
-from app.database import SessionLocal, engine, Base
+import asyncio
+import base64
+import binascii
+import json
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from fastapi import (
+    FastAPI,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
+from app import config
+from app.backup import backup_database
+from app.database import (
+    DB_FILE,
+    SessionLocal,
+    ReadSessionLocal,
+    engine,
+    Base,
+    add_missing_columns,
+    create_missing_indexes,
+)
 from sqlalchemy.orm import Session
 from app.schemas import (
     OperatorOut,
     SourceOut,
     SourceOperatorAssign,
+    SourceOperatorOut,
     ContactOut,
+    AdmissionSettings,
+    SourceRateLimit,
     LeadOut,
+    ContactHistoryOut,
+    LeadHistoryOut,
+    LeadHistoryRequest,
     OperatorCreate,
     SourceCreate,
     ContactCreate,
 )
 from app.crud import (
     create_operator,
-    get_opers_list,
+    create_operators_bulk,
+    get_opers_rows,
     update_operator,
+    rebalance_operator,
     create_source,
     assign_operator_to_source,
+    replace_source_operators,
     create_contact,
-    get_leads_list,
+    create_contact_idempotent,
+    create_contacts_bulk,
+    close_contact,
+    archive_closed_contacts,
+    get_leads_rows,
+    get_leads_history,
+    get_leads_by_ids,
+    get_leads_contacts,
+    attach_lead_contacts,
+    search_leads,
     get_stats,
+    get_contact_timeseries,
+    get_affinity_stats,
+)
+from app.admission import admission
+from app.events import event_bus
+from app.models import ContactStatus, Source, utcnow
+from app.outbox import OutboxDeliverer
+from app.profiling import ProfilingMiddleware
+from app.routing import routing_cache
+from app.serialization import rows_response
+from app.sharding import (
+    ShardSet,
+    merge_stats,
+    merge_timeseries,
+    shard_index,
 )
-from app.models import Source
 
+SUCCESS_CODE = 200
+BAD_REQUEST = 400
 NOT_FOUND = 404
+TOO_MANY_REQUESTS = 429
+SERVICE_UNAVAILABLE = 503
+OPERATOR_FIELDS = ("id", "name", "active", "limit")
+LEAD_FIELDS = ("id", "external_id", "e_mail")
+SEARCH_PAGE_MAX = 500
+
+shard_set = (
+    ShardSet(config.SHARD_COUNT, config.SHARD_DIR)
+    if config.SHARD_COUNT > 1 else None
+)
 
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    """
+    Создаёт схему базы данных и прогревает кэш маршрутизации при старте.
 
-app = FastAPI(title="Leads Distributor")
+    В режиме шардирования создаёт схему шардов и реплицирует на них
+    конфигурацию. При заданном NOTIFY_URL на время работы запускает
+    доставку outbox из основной базы и каждого шарда.
+
+    :param application: Экземпляр приложения.
+    :yield: Управление приложению на время его работы.
+    """
+    application.state.ready = False
+    application.state.warmup = None
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    create_missing_indexes(engine)
+    session = SessionLocal()
+    try:
+        if shard_set is not None:
+            shard_set.create_all()
+            shard_set.sync_config(session)
+        application.state.warmup = routing_cache.warm_up(session)
+    finally:
+        session.close()
+    deliverers = []
+    if config.NOTIFY_URL:
+        session_factories = [SessionLocal]
+        if shard_set is not None:
+            session_factories += shard_set.session_factories
+        for session_factory in session_factories:
+            deliverer = OutboxDeliverer(session_factory, config.NOTIFY_URL)
+            deliverer.start()
+            deliverers.append(deliverer)
+    application.state.ready = True
+    yield
+    application.state.ready = False
+    for deliverer in deliverers:
+        deliverer.stop()
+
+
+app = FastAPI(title="Leads Distributor", lifespan=lifespan)
+
+if config.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 
 def get_session() -> Session:
@@ -46,7 +159,126 @@ def get_session() -> Session:
         session.close()
 
 
+def get_read_session(
+    x_consistent_read: bool = Header(default=False)
+) -> Session:
+    """
+    Получает сессию только для чтения из отдельного пула соединений.
+
+    На SQLite в режиме WAL читатели видят все зафиксированные записи,
+    поэтому чтение после записи гарантировано. При работе с репликой
+    заголовок X-Consistent-Read: true направляет чтение в основную базу.
+
+    :param x_consistent_read: Требуется ли чтение из основной базы.
+    :yield: Объект сессии для чтения.
+    """
+    session_factory = SessionLocal if x_consistent_read else ReadSessionLocal
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
 db_session = Depends(get_session)
+db_read_session = Depends(get_read_session)
+
+
+def sync_shards(session: Session) -> None:
+    """
+    Реплицирует конфигурацию распределения на шарды, если они включены.
+
+    Вызывается после каждого изменения операторов, источников и весов.
+
+    :param session: Сессия основной базы.
+    """
+    if shard_set is None:
+        return
+    shard_set.sync_config(session)
+    routing_cache.invalidate()
+
+
+async def admit_contact(contact: ContactCreate) -> AsyncIterator[None]:
+    """
+    Проверяет допуск обращения до работы с базой данных.
+
+    Зависимость асинхронная, поэтому проверка идёт в цикле событий и
+    отклонённые обращения не ждут места в пуле потоков синхронных
+    обработчиков. Место в общем пределе освобождается после обработки.
+
+    :param contact: Данные для создания контакта.
+    :yield: Управление обработчику после допуска.
+    :raises HTTPException: Если источник превысил лимит допуска.
+    """
+    retry_after = admission.admit(contact.source_id)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(retry_after)},
+        )
+    try:
+        yield
+    finally:
+        admission.release()
+
+
+def get_contact_session(
+    contact: ContactCreate, session: Session = db_session
+) -> Session:
+    """
+    Получает сессию для регистрации обращения.
+
+    В режиме шардирования это сессия шарда источника обращения,
+    иначе — сессия основной базы.
+
+    :param contact: Данные для создания контакта.
+    :param session: Сессия основной базы.
+    :yield: Объект сессии для записи обращения.
+    """
+    if shard_set is None:
+        yield session
+        return
+    shard_session = shard_set.session_for_source(contact.source_id)
+    try:
+        yield shard_session
+    finally:
+        shard_session.close()
+
+
+def get_contact_owner_session(
+    contact_id: int, session: Session = db_session
+) -> Session:
+    """
+    Получает сессию базы, в которой хранится обращение.
+
+    :param contact_id: ID контакта.
+    :param session: Сессия основной базы.
+    :yield: Сессия шарда, определяемого по ID, или основной базы.
+    """
+    if shard_set is None:
+        yield session
+        return
+    shard_session = shard_set.session_for_id(contact_id)
+    try:
+        yield shard_session
+    finally:
+        shard_session.close()
+
+
+@app.get("/ready")
+def readiness() -> JSONResponse:
+    """
+    Сообщает, завершён ли прогрев приложения после старта.
+
+    :return: Статус готовности и сводка прогрева; 503, пока прогрев не
+        завершён.
+    """
+    ready = getattr(app.state, "ready", False)
+    return JSONResponse(
+        status_code=SUCCESS_CODE if ready else SERVICE_UNAVAILABLE,
+        content={"ready": ready, "warmup": getattr(app.state, "warmup", None)},
+    )
 
 
 @app.post("/operators/", response_model=OperatorOut)
@@ -60,31 +292,57 @@ def create_operator_endpoint(
     :param session: Сессия для работы с базой данных.
     :return: Объект оператора.
     """
-    return create_operator(session=session, oper=oper)
+    oper = create_operator(session=session, oper=oper)
+    sync_shards(session)
+    return oper
+
+
+@app.post("/operators/bulk", response_model=list[OperatorOut])
+def create_operators_bulk_endpoint(
+    opers: list[OperatorCreate], session: Session = db_session
+) -> list:
+    """
+    Создаёт нескольких операторов одной транзакцией.
+
+    :param opers: Список данных для создания операторов.
+    :param session: Сессия для работы с базой данных.
+    :return: Список созданных операторов.
+    """
+    rows = create_operators_bulk(session=session, opers=opers)
+    sync_shards(session)
+    return rows
 
 
 @app.get("/operators/", response_model=list[OperatorOut])
-def list_ops(session: Session = db_session) -> list:
+def list_ops(session: Session = db_read_session) -> Response:
     """
     Получает список всех операторов.
 
+    Строки кодируются в JSON напрямую, минуя ORM-объекты и валидацию
+    OperatorOut; response_model оставлен для документации OpenAPI.
+
     :param session: Сессия для работы с базой данных.
     :return: Список операторов.
     """
-    return get_opers_list(session=session)
+    return rows_response(get_opers_rows(session=session), OPERATOR_FIELDS)
 
 
 @app.patch("/operators/{operator_id}", response_model=OperatorOut)
 def patch_operator(
     operator_id: int,
         oper: OperatorCreate,
+        rebalance: bool = False,
         session: Session = db_session
 ) -> OperatorOut:
     """
     Обновляет параметры оператора.
 
+    При rebalance=true после обновления лишние открытые обращения
+    оператора переносятся на других операторов его источников.
+
     :param operator_id: ID оператора.
     :param oper: Модель данных оператора.
+    :param rebalance: Перераспределить ли лишние обращения.
     :param session: Сессия для работы с базой данных.
     :return: Объект оператора.
     :raises HTTPException: Если оператор с указанным ID не найден.
@@ -97,9 +355,77 @@ def patch_operator(
     )
     if not update:
         raise HTTPException(status_code=NOT_FOUND, detail="Operator not found")
+    sync_shards(session)
+    if rebalance:
+        rebalance_on_shards(session, operator_id)
     return update
 
 
+def rebalance_on_shards(
+        session: Session,
+        operator_id: int,
+        batch_size: int = 1000,
+        max_batches: int | None = None
+) -> dict | None:
+    """
+    Перераспределяет лишние обращения оператора в основной базе или шардах.
+
+    :param session: Сессия основной базы.
+    :param operator_id: ID оператора.
+    :param batch_size: Размер пачки.
+    :param max_batches: Максимум пачек за вызов на каждой базе.
+    :return: Итог перераспределения или None, если оператор не найден.
+    """
+    sessions = [session]
+    if shard_set is not None:
+        sessions = [factory() for factory in shard_set.session_factories]
+    result = None
+    for rebalance_session in sessions:
+        part = rebalance_operator(
+            session=rebalance_session,
+            operator_id=operator_id,
+            batch_size=batch_size,
+            max_batches=max_batches,
+        )
+        if rebalance_session is not session:
+            rebalance_session.close()
+        if part is None:
+            return None
+        if result is not None:
+            part["moved"] += result["moved"]
+        result = part
+    return result
+
+
+@app.post("/operators/{operator_id}/rebalance")
+def rebalance_operator_endpoint(
+    operator_id: int,
+        batch_size: int = 1000,
+        max_batches: int | None = None,
+        session: Session = db_session
+) -> dict:
+    """
+    Переносит лишние открытые обращения оператора на других операторов.
+
+    Лишними считаются обращения сверх лимита, а у неактивного оператора —
+    все открытые. Получатели выбираются среди операторов тех же
+    источников с учётом весов и свободной ёмкости.
+
+    :param operator_id: ID оператора.
+    :param batch_size: Размер пачки переноса.
+    :param max_batches: Максимум пачек за вызов.
+    :param session: Сессия для работы с базой данных.
+    :return: Количество перенесённых и оставшихся лишних обращений.
+    :raises HTTPException: Если оператор с указанным ID не найден.
+    """
+    result = rebalance_on_shards(
+        session, operator_id, batch_size=batch_size, max_batches=max_batches
+    )
+    if result is None:
+        raise HTTPException(status_code=NOT_FOUND, detail="Operator not found")
+    return result
+
+
 @app.post("/sources/", response_model=SourceOut)
 def create_source_endpoint(
     source: SourceCreate, session: Session = db_session
@@ -112,7 +438,9 @@ def create_source_endpoint(
     :return: Объект источника.
     :raises sqlalchemy.exc.SQLAlchemyError: При ошибках взаимодействия с базой.
     """
-    return create_source(session=session, source_create=source)
+    source = create_source(session=session, source_create=source)
+    sync_shards(session)
+    return source
 
 
 @app.post("/sources/{source_id}/operators/")
@@ -140,6 +468,7 @@ def assign_operator(
             status_code=NOT_FOUND,
             detail="Operator or Source not found"
         )
+    sync_shards(session)
     return {
         "id": source_oper.id,
         "source_id": source_oper.source_id,
@@ -148,44 +477,545 @@ def assign_operator(
     }
 
 
-@app.post("/contacts/", response_model=ContactOut)
+@app.put(
+    "/sources/{source_id}/operators",
+    response_model=list[SourceOperatorOut]
+)
+def replace_operators(
+    source_id: int,
+        assigns: list[SourceOperatorAssign],
+        session: Session = db_session
+) -> list:
+    """
+    Заменяет весь набор операторов источника и их нагрузки.
+
+    :param source_id: ID источника.
+    :param assigns: Новый набор операторов с нагрузками.
+    :param session: Сессия для работы с базой данных.
+    :return: Итоговый список связей источник–оператор.
+    :raises HTTPException: Если источник или один из операторов не найден.
+    """
+    source_opers = replace_source_operators(
+        session=session,
+        source_id=source_id,
+        assigns=assigns
+    )
+    if source_opers is None:
+        raise HTTPException(
+            status_code=NOT_FOUND,
+            detail="Operator or Source not found"
+        )
+    sync_shards(session)
+    return source_opers
+
+
+@app.post(
+    "/contacts/",
+    response_model=ContactOut,
+    dependencies=[Depends(admit_contact)],
+)
 def register_contact(
-    contact: ContactCreate, session: Session = db_session
+    contact: ContactCreate,
+        idempotency_key: str | None = Header(default=None),
+        session: Session = Depends(get_contact_session),
+        lead_session: Session = db_session
 ) -> ContactOut:
     """
     Регистрирует новый контакт от лида.
 
+    Повтор запроса с тем же заголовком Idempotency-Key возвращает ранее
+    созданный контакт. В режиме шардирования обращение записывается
+    в шард своего источника, а лид ищется и создаётся в основной базе.
+
     :param contact: Данные для создания контакта.
-    :param session: Сессия для работы с базой данных.
+    :param idempotency_key: Ключ идемпотентности запроса.
+    :param session: Сессия базы, в которую записывается обращение.
+    :param lead_session: Сессия основной базы для поиска лида.
     :return: Созданный контакт.
-    :raises HTTPException: Если указанный источник не существует.
+    :raises HTTPException: Если источник не существует; превышение лимита
+        допуска отклоняется раньше, в admit_contact.
     """
     source = (session.query(Source).
               filter(Source.id == contact.source_id).
               first())
     if not source:
+        raise HTTPException(
+            status_code=NOT_FOUND,
+            detail="Source not found"
+        )
+    if idempotency_key:
+        return create_contact_idempotent(
+            session=session,
+            contact=contact,
+            key=idempotency_key,
+            lead_session=lead_session,
+        )
+    return create_contact(
+        session=session, contact=contact, lead_session=lead_session
+    )
+
+
+@app.post("/contacts/bulk")
+def register_contacts_bulk(
+        contacts: list[ContactCreate], session: Session = db_session
+) -> dict:
+    """
+    Регистрирует пачку обращений, например при импорте из CRM.
+
+    Обращения распределяются по операторам группами по источникам одним
+    векторизованным розыгрышем и записываются одной транзакцией. В режиме
+    шардирования каждая группа записывается в шард своего источника, а
+    лиды — в основную базу.
+
+    :param contacts: Данные для создания контактов.
+    :param session: Сессия для работы с базой данных.
+    :return: Количество созданных и нераспределённых обращений и число
+        назначенных каждому оператору.
+    :raises HTTPException: Если какой-либо источник не существует.
+    """
+    source_ids = {contact.source_id for contact in contacts}
+    known = {
+        source_id
+        for source_id, in session.query(Source.id).filter(
+            Source.id.in_(source_ids)
+        )
+    }
+    if known != source_ids:
         raise HTTPException(status_code=NOT_FOUND, detail="Source not found")
-    res_contact = create_contact(session=session, contact=contact)
-    return res_contact
+    if shard_set is None:
+        return create_contacts_bulk(session=session, contacts=contacts)
+    by_shard = {}
+    for contact in contacts:
+        by_shard.setdefault(
+            shard_index(contact.source_id, shard_set.count), []
+        ).append(contact)
+    result = {"created": 0, "unassigned": 0, "operators": []}
+    assigned = {}
+    for index, shard_contacts in by_shard.items():
+        with shard_set.session_factories[index]() as shard_session:
+            part = create_contacts_bulk(
+                session=shard_session,
+                contacts=shard_contacts,
+                lead_session=session,
+            )
+        result["created"] += part["created"]
+        result["unassigned"] += part["unassigned"]
+        for row in part["operators"]:
+            assigned[row["operator_id"]] = (
+                assigned.get(row["operator_id"], 0) + row["assigned"]
+            )
+    result["operators"] = [
+        {"operator_id": oper_id, "assigned": assigned[oper_id]}
+        for oper_id in sorted(assigned)
+    ]
+    return result
+
+
+@app.post("/contacts/{contact_id}/close", response_model=ContactOut)
+def close_contact_endpoint(
+    contact_id: int, session: Session = Depends(get_contact_owner_session)
+) -> ContactOut:
+    """
+    Закрывает обращение.
+
+    :param contact_id: ID контакта.
+    :param session: Сессия для работы с базой данных.
+    :return: Закрытый контакт.
+    :raises HTTPException: Если контакт не найден.
+    """
+    contact = close_contact(session=session, contact_id=contact_id)
+    if not contact:
+        raise HTTPException(status_code=NOT_FOUND, detail="Contact not found")
+    return contact
 
 
 @app.get("/leads/", response_model=list[LeadOut])
-def list_leads(session: Session = db_session) -> list:
+def list_leads(session: Session = db_read_session) -> Response:
     """
     Возвращает список всех лидов.
 
+    Строки кодируются в JSON напрямую, минуя ORM-объекты и валидацию
+    LeadOut; response_model оставлен для документации OpenAPI.
+    Лиды всегда хранятся в основной базе, в том числе при шардировании.
+
     :param session: Сессия для работы с базой данных.
     :return: Список лидов.
     """
-    return get_leads_list(session=session)
+    return rows_response(get_leads_rows(session=session), LEAD_FIELDS)
+
+
+def read_leads_history(
+        session: Session,
+        lead_ids: list,
+        include_archived: bool = False
+) -> list:
+    """
+    Загружает историю лидов из основной базы или с шардов.
+
+    В режиме шардирования лиды читаются из основной базы, а их обращения
+    собираются со всех шардов одним запросом на шард (и ещё одним к
+    архиву) и подставляются в Lead.contacts.
+
+    :param session: Сессия чтения основной базы.
+    :param lead_ids: Список ID лидов.
+    :param include_archived: Добавлять ли обращения из архива.
+    :return: Список объектов Lead с загруженными обращениями.
+    """
+    if shard_set is None:
+        return get_leads_history(
+            session=session,
+            lead_ids=lead_ids,
+            include_archived=include_archived,
+        )
+    leads = get_leads_by_ids(session=session, lead_ids=lead_ids)
+    attach_lead_contacts(
+        leads,
+        [
+            contact
+            for part in shard_set.fan_out(
+                get_leads_contacts,
+                lead_ids=lead_ids,
+                include_archived=include_archived,
+            )
+            for contact in part
+        ],
+    )
+    return leads
+
+
+@app.get("/leads/{lead_id}/contacts", response_model=list[ContactHistoryOut])
+def get_lead_contacts_endpoint(
+        lead_id: int,
+        include_archived: bool = False,
+        session: Session = db_read_session
+) -> list:
+    """
+    Возвращает обращения лида с источниками и операторами.
+
+    :param lead_id: ID лида.
+    :param include_archived: Добавлять ли обращения из архива.
+    :param session: Сессия для работы с базой данных.
+    :return: Список обращений лида по возрастанию ID.
+    :raises HTTPException: Если лид не найден.
+    """
+    leads = read_leads_history(session, [lead_id], include_archived)
+    if not leads:
+        raise HTTPException(status_code=NOT_FOUND, detail="Lead not found")
+    return leads[0].contacts
+
+
+@app.post("/leads/history", response_model=list[LeadHistoryOut])
+def get_leads_history_endpoint(
+        request: LeadHistoryRequest,
+        include_archived: bool = False,
+        session: Session = db_read_session
+) -> list:
+    """
+    Возвращает нескольких лидов с историей обращений.
+
+    Несуществующие ID пропускаются.
+
+    :param request: Список ID лидов.
+    :param include_archived: Добавлять ли обращения из архива.
+    :param session: Сессия для работы с базой данных.
+    :return: Список лидов по возрастанию ID.
+    """
+    return read_leads_history(
+        session, list(dict.fromkeys(request.lead_ids)), include_archived
+    )
+
+
+def encode_cursor(key: str, lead_id: int) -> str:
+    """
+    Кодирует позицию последней строки страницы поиска в курсор.
+
+    :param key: Ключ поиска строки.
+    :param lead_id: ID лида.
+    :return: Курсор для следующей страницы.
+    """
+    return base64.urlsafe_b64encode(
+        json.dumps([key, lead_id]).encode()
+    ).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Раскодирует курсор страницы поиска.
+
+    :param cursor: Курсор из ответа предыдущей страницы.
+    :return: Пара (ключ, ID лида).
+    :raises HTTPException: Если курсор повреждён или не является парой
+        [строка, целое число].
+    """
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, ValueError):
+        value = None
+    if not (
+        isinstance(value, list)
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and type(value[1]) is int
+    ):
+        raise HTTPException(status_code=BAD_REQUEST, detail="Invalid cursor")
+    return value[0], value[1]
+
+
+@app.get("/leads/search")
+def search_leads_endpoint(
+        e_mail: str | None = Query(default=None, min_length=1),
+        domain: str | None = Query(default=None, min_length=1),
+        external_id: str | None = Query(default=None, min_length=1),
+        limit: int = Query(default=50, ge=1, le=SEARCH_PAGE_MAX),
+        cursor: str | None = None,
+        session: Session = db_read_session
+) -> dict:
+    """
+    Ищет лидов по префиксу e-mail, домену или префиксу внешнего ID.
+
+    Должен быть задан ровно один критерий. Следующая страница
+    запрашивается с курсором next_cursor из ответа.
+
+    :param e_mail: Префикс e-mail, без учёта регистра.
+    :param domain: Домен e-mail, без учёта регистра.
+    :param external_id: Префикс внешнего ID.
+    :param limit: Размер страницы.
+    :param cursor: Курсор следующей страницы.
+    :param session: Сессия для работы с базой данных.
+    :return: Найденные лиды и курсор следующей страницы.
+    :raises HTTPException: Если задано не ровно одно условие или курсор
+        повреждён.
+    """
+    criteria = {"e_mail": e_mail, "domain": domain, "external_id": external_id}
+    if sum(value is not None for value in criteria.values()) != 1:
+        raise HTTPException(
+            status_code=BAD_REQUEST,
+            detail="Exactly one of e_mail, domain, external_id is required",
+        )
+    after = decode_cursor(cursor) if cursor else None
+    rows = search_leads(session=session, limit=limit, after=after, **criteria)
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+    return {
+        "items": [dict(zip(LEAD_FIELDS, row[1:])) for row in rows],
+        "next_cursor": next_cursor,
+    }
 
 
 @app.get("/stats/")
-def get_stats_endpoint(session: Session = db_session) -> dict:
+def get_stats_endpoint(
+    include_archived: bool = False, session: Session = db_read_session
+) -> dict:
     """
     Возвращает статистику по лидам, обращениям и операторам.
 
+    :param include_archived: Учитывать ли архивные контакты.
     :param session: Сессия для работы с базой данных.
     :return: Словарь со статистическими данными.
     """
-    return get_stats(session=session)
+    if shard_set is not None:
+        return merge_stats(
+            shard_set.fan_out(get_stats, include_archived=include_archived)
+        )
+    return get_stats(session=session, include_archived=include_archived)
+
+
+def as_utc(moment: datetime) -> datetime:
+    """
+    Приводит время из запроса к UTC без информации о часовом поясе.
+
+    Время без смещения считается заданным в UTC.
+
+    :param moment: Время из параметров запроса.
+    :return: Объект datetime в UTC без часового пояса.
+    """
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@app.get("/stats/timeseries")
+def get_timeseries_endpoint(
+        start: datetime,
+        end: datetime | None = None,
+        step: str = Query(default="hour", pattern="^(hour|day)$"),
+        source_id: int | None = None,
+        operator_id: int | None = None,
+        status: ContactStatus | None = None,
+        session: Session = db_read_session
+) -> list:
+    """
+    Возвращает количество открытых и закрытых обращений по часам или дням.
+
+    Ответ строится по почасовым счётчикам, а не по таблице обращений.
+
+    :param start: Начало диапазона; без смещения — UTC.
+    :param end: Конец диапазона; без смещения — UTC. По умолчанию текущее
+        время.
+    :param step: Шаг: hour или day.
+    :param source_id: Фильтр по источнику.
+    :param operator_id: Фильтр по оператору; 0 — нераспределённые.
+    :param status: Фильтр по событию: open — открытие, closed — закрытие.
+    :param session: Сессия для работы с базой данных.
+    :return: Список точек ряда.
+    """
+    criteria = {
+        "start": as_utc(start),
+        "end": as_utc(end) if end else utcnow(),
+        "step": step,
+        "source_id": source_id,
+        "operator_id": operator_id,
+        "status": status,
+    }
+    if shard_set is not None:
+        return merge_timeseries(
+            shard_set.fan_out(get_contact_timeseries, **criteria)
+        )
+    return get_contact_timeseries(session=session, **criteria)
+
+
+@app.get("/stats/affinity")
+def get_affinity_stats_endpoint() -> dict:
+    """
+    Возвращает статистику закрепления лидов за операторами.
+
+    :return: Словарь с попаданиями, промахами и долей попаданий.
+    """
+    return get_affinity_stats()
+
+
+@app.get("/events")
+async def stream_events(request: Request) -> StreamingResponse:
+    """
+    Передаёт события распределения в формате Server-Sent Events.
+
+    События contact_assigned, contact_closed, contacts_imported,
+    operator_updated и operator_rebalanced приходят после фиксации
+    транзакции. Клиент, не успевающий читать, отключается при
+    переполнении своего буфера.
+
+    :param request: Входящий запрос.
+    :return: Бесконечный поток событий.
+    """
+    subscriber = event_bus.subscribe(asyncio.get_running_loop())
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(
+                        subscriber.queue.get(),
+                        timeout=config.EVENTS_HEARTBEAT_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/admin/archive")
+def archive_contacts_endpoint(
+    older_than_days: int = 30,
+        batch_size: int = 1000,
+        max_batches: int | None = None,
+        session: Session = db_session
+) -> dict:
+    """
+    Переносит давно закрытые контакты в архивную таблицу.
+
+    В режиме шардирования перенос выполняется на каждом шарде.
+
+    :param older_than_days: Минимальный возраст закрытия в днях.
+    :param batch_size: Размер пачки переноса.
+    :param max_batches: Максимум пачек за вызов.
+    :param session: Сессия для работы с базой данных.
+    :return: Количество перенесённых контактов.
+    """
+    sessions = [session]
+    if shard_set is not None:
+        sessions = [factory() for factory in shard_set.session_factories]
+    cutoff = utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    for archive_session in sessions:
+        archived += archive_closed_contacts(
+            session=archive_session,
+            cutoff=cutoff,
+            batch_size=batch_size,
+            max_batches=max_batches,
+        )
+        if archive_session is not session:
+            archive_session.close()
+    return {"archived": archived}
+
+
+@app.post("/admin/backup")
+def backup_endpoint() -> dict:
+    """
+    Снимает онлайн-копию базы, не останавливая приём обращений.
+
+    Копия каждого файла (основной базы и шардов) снимается пошагово
+    через backup API SQLite в каталог BACKUP_DIR/<время UTC>.
+
+    :return: Каталог копии и отчёт по каждому файлу: размер, время,
+        пропускная способность и самый долгий шаг.
+    """
+    directory = os.path.join(
+        config.BACKUP_DIR, utcnow().strftime("%Y%m%dT%H%M%S%f")
+    )
+    files = [DB_FILE] + (shard_set.paths if shard_set is not None else [])
+    return {
+        "directory": directory,
+        "files": [
+            backup_database(
+                db_file, os.path.join(directory, os.path.basename(db_file))
+            )
+            for db_file in files
+        ],
+    }
+
+
+@app.get("/admin/admission")
+def get_admission_endpoint() -> dict:
+    """
+    Возвращает настройки и счётчики контроля допуска обращений.
+
+    :return: Словарь с настройками и счётчиками по источникам.
+    """
+    return admission.stats()
+
+
+@app.put("/admin/admission")
+def configure_admission_endpoint(settings: AdmissionSettings) -> dict:
+    """
+    Меняет общие настройки контроля допуска.
+
+    :param settings: Новые настройки; незаданные поля не меняются.
+    :return: Итоговые настройки и счётчики.
+    """
+    admission.configure(
+        default_rate=settings.default_rate,
+        default_burst=settings.default_burst,
+        max_in_flight=settings.max_in_flight,
+    )
+    return admission.stats()
+
+
+@app.put("/admin/admission/sources/{source_id}")
+def set_source_rate_endpoint(source_id: int, limit: SourceRateLimit) -> dict:
+    """
+    Задаёт лимит частоты обращений для источника.
+
+    :param source_id: ID источника.
+    :param limit: Скорость и ёмкость ведра токенов.
+    :return: Итоговые настройки и счётчики.
+    """
+    admission.set_source_limit(source_id, limit.rate, limit.burst)
+    return admission.stats()
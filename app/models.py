@@ -5,17 +5,70 @@ from sqlalchemy import (
     Integer,
     String,
     Boolean,
+    DateTime,
     ForeignKey,
+    Index,
+    LargeBinary,
     Text,
     Enum,
     UniqueConstraint,
+    func,
+    literal,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.types import TypeDecorator
+from app import config
 from app.database import Base
+from datetime import datetime, timezone
 import enum
+import zlib
 
 
 CONTACTS_RELATION = "contacts"
+PLAIN_MARK = b"t"
+COMPRESSED_MARK = b"z"
+
+
+def utcnow() -> datetime:
+    """
+    Возвращает текущее время UTC без информации о часовом поясе.
+
+    :return: Объект datetime.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class CompressedText(TypeDecorator):
+    """
+    Текст, который хранится в BLOB и сжимается zlib выше порога.
+
+    Первый байт значения помечает формат: t — текст UTF-8 как есть,
+    z — сжатый текст. Значения, записанные раньше в колонку Text,
+    возвращаются без изменений.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        """Кодирует и при необходимости сжимает текст перед записью."""
+        if value is None:
+            return None
+        raw = value.encode("utf-8")
+        if len(raw) > config.PAYLOAD_COMPRESS_THRESHOLD:
+            compressed = zlib.compress(raw)
+            if len(compressed) < len(raw):
+                return COMPRESSED_MARK + compressed
+        return PLAIN_MARK + raw
+
+    def process_result_value(self, value, dialect):
+        """Распаковывает значение, прочитанное из базы."""
+        if value is None or isinstance(value, str):
+            return value
+        mark, data = value[:1], value[1:]
+        if mark == COMPRESSED_MARK:
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
 
 
 class ContactStatus(str, enum.Enum):
@@ -115,7 +168,22 @@ class Lead(Base):
     external_id = Column(String, nullable=True, index=True)
     e_mail = Column(String, nullable=True, index=True)
 
-    contacts = relationship("Contact", back_populates="lead")
+    contacts = relationship(
+        "Contact", back_populates="lead", order_by="Contact.id"
+    )
+
+
+# Ключи поиска лидов: e-mail и домен в нижнем регистре. Индексы строятся
+# по выражениям, поэтому SQLite поддерживает их сам при любой вставке, а
+# запрос использует индекс, только если выражение в нём совпадает дословно.
+LEAD_EMAIL_KEY = func.lower(Lead.e_mail)
+LEAD_DOMAIN_KEY = func.substr(
+    LEAD_EMAIL_KEY,
+    func.instr(LEAD_EMAIL_KEY, literal("@", literal_execute=True))
+    + literal(1, literal_execute=True),
+)
+Index("ix_leads_e_mail_key", LEAD_EMAIL_KEY)
+Index("ix_leads_domain_key", LEAD_DOMAIN_KEY)
 
 
 class Contact(Base):
@@ -127,7 +195,10 @@ class Contact(Base):
     :ivar source_id: ID источника.
     :ivar operator_id: ID оператора.
     :ivar status: Статус обращения.
-    :ivar payload: Дополнительные данные контакта.
+    :ivar payload: Дополнительные данные контакта; загружаются отложенно
+        и хранятся сжатыми выше PAYLOAD_COMPRESS_THRESHOLD байт.
+    :ivar created_at: Время создания обращения (UTC).
+    :ivar closed_at: Время закрытия обращения (UTC).
     :ivar lead: Связь с объектом Lead.
     :ivar source: Связь с объектом Source.
     :ivar operator: Связь с объектом Operator.
@@ -135,12 +206,131 @@ class Contact(Base):
 
     __tablename__ = "contacts"
     id = Column(Integer, primary_key=True)
-    lead_id = Column(Integer, ForeignKey("leads.id"))
+    lead_id = Column(Integer, ForeignKey("leads.id"), index=True)
     source_id = Column(Integer, ForeignKey("sources.id"))
     operator_id = Column(Integer, ForeignKey("operators.id"), nullable=True)
     status = Column(Enum(ContactStatus), default=ContactStatus.open)
-    payload = Column(Text, nullable=True)
+    payload = deferred(Column(CompressedText, nullable=True))
+    created_at = Column(DateTime, default=utcnow, nullable=True)
+    closed_at = Column(DateTime, nullable=True)
 
     lead = relationship("Lead", back_populates=CONTACTS_RELATION)
     source = relationship("Source", back_populates=CONTACTS_RELATION)
     operator = relationship("Operator", back_populates=CONTACTS_RELATION)
+
+
+class ArchivedContact(Base):
+    """
+    Модель закрытого контакта, перенесённого в архив.
+
+    Повторяет колонки Contact и хранит время переноса. ID контакта
+    сохраняется, поэтому архивные записи можно объединять с активными.
+
+    :ivar archived_at: Время переноса в архив (UTC).
+    :ivar source: Связь с объектом Source.
+    :ivar operator: Связь с объектом Operator.
+    """
+
+    __tablename__ = "contacts_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    lead_id = Column(Integer, ForeignKey("leads.id"), index=True)
+    source_id = Column(Integer, ForeignKey("sources.id"))
+    operator_id = Column(Integer, ForeignKey("operators.id"), nullable=True)
+    status = Column(Enum(ContactStatus), default=ContactStatus.closed)
+    payload = deferred(Column(CompressedText, nullable=True))
+    created_at = Column(DateTime, nullable=True)
+    closed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=utcnow)
+
+    source = relationship("Source")
+    operator = relationship("Operator")
+
+
+class ContactRollup(Base):
+    """
+    Модель почасового счётчика обращений.
+
+    Строка считает обращения, открытые (status=open) или закрытые
+    (status=closed) за час bucket через источник и оператора. Счётчики
+    увеличиваются в тех же транзакциях, что создают и закрывают обращения,
+    и не меняются при архивации. Нераспределённым обращениям соответствует
+    operator_id = 0.
+
+    :ivar bucket: Начало часа (UTC).
+    :ivar source_id: ID источника.
+    :ivar operator_id: ID оператора или 0.
+    :ivar status: Событие: открытие или закрытие обращения.
+    :ivar count: Количество обращений.
+    """
+
+    __tablename__ = "contact_rollups"
+    bucket = Column(DateTime, primary_key=True)
+    source_id = Column(Integer, primary_key=True)
+    operator_id = Column(Integer, primary_key=True)
+    status = Column(Enum(ContactStatus), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ConfigVersion(Base):
+    """
+    Модель версии конфигурации распределения.
+
+    Единственная строка, версия которой увеличивается в одной транзакции
+    с каждым изменением операторов и весов. Воркеры сравнивают её со
+    своей, чтобы понять, что кэш в памяти устарел.
+
+    :ivar id: ID строки, всегда 1.
+    :ivar version: Номер версии.
+    """
+
+    __tablename__ = "config_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """
+    Модель ключа идемпотентности регистрации обращения.
+
+    :ivar key: Значение заголовка Idempotency-Key.
+    :ivar contact_id: ID созданного по ключу контакта.
+    :ivar created_at: Время создания ключа (UTC).
+    """
+
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=utcnow, index=True)
+
+
+class OutboxMessage(Base):
+    """
+    Модель исходящего уведомления, ожидающего доставки.
+
+    Пишется в той же транзакции, что и контакт, и удаляется после
+    успешной доставки.
+
+    :ivar id: ID сообщения.
+    :ivar event_type: Тип события.
+    :ivar contact_id: ID контакта.
+    :ivar payload: Данные события в JSON.
+    :ivar created_at: Время создания (UTC).
+    :ivar attempts: Количество неудачных попыток доставки.
+    :ivar next_attempt_at: Время следующей попытки (UTC).
+    :ivar contact: Связь с объектом Contact.
+    """
+
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)
+    contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=True)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=utcnow)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=utcnow)
+
+    contact = relationship("Contact")
+
+    __table_args__ = (
+        Index("ix_outbox_pending", "attempts", "next_attempt_at"),
+    )
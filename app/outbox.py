@@ -0,0 +1,168 @@
+"""Фоновая доставка уведомлений из outbox."""
+
+import json
+import logging
+import threading
+from datetime import timedelta
+import httpx
+from sqlalchemy.orm import Session, sessionmaker
+from app import config
+from app.database import write_transaction
+from app.models import OutboxMessage, utcnow
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_SECONDS = 3600
+
+
+def claim_batch(session: Session, batch_size: int, lease: float) -> list:
+    """
+    Забирает пачку сообщений, готовых к отправке.
+
+    Время следующей попытки сдвигается на lease секунд, чтобы другие
+    процессы не взяли ту же пачку, пока она отправляется.
+
+    :param session: Сессия для работы с базой данных.
+    :param batch_size: Размер пачки.
+    :param lease: Время аренды пачки в секундах.
+    :return: Список объектов OutboxMessage.
+    """
+    write_transaction(session)
+    now = utcnow()
+    messages = (
+        session.query(OutboxMessage)
+        .filter(
+            OutboxMessage.attempts < config.OUTBOX_MAX_ATTEMPTS,
+            OutboxMessage.next_attempt_at <= now,
+        )
+        .order_by(OutboxMessage.id)
+        .limit(batch_size)
+        .all()
+    )
+    for message in messages:
+        message.next_attempt_at = now + timedelta(seconds=lease)
+    session.commit()
+    return messages
+
+
+def message_body(message: OutboxMessage) -> dict:
+    """
+    Формирует тело уведомления.
+
+    :param message: Объект OutboxMessage.
+    :return: Словарь для отправки в JSON.
+    """
+    return {
+        "id": message.id,
+        "type": message.event_type,
+        "contact_id": message.contact_id,
+        "created_at": message.created_at.isoformat(),
+        "data": json.loads(message.payload),
+    }
+
+
+class OutboxDeliverer:
+    """
+    Отправляет уведомления из outbox пачками в фоновом потоке.
+
+    Одна пачка — один POST с JSON {"events": [...]} через общий пул
+    соединений httpx. При успехе сообщения удаляются, при ошибке их
+    попытка откладывается с экспоненциальной задержкой, пока не исчерпан
+    OUTBOX_MAX_ATTEMPTS. Доставка «как минимум один раз»: получатель
+    должен различать повторы по id.
+
+    :ivar url: Адрес получателя уведомлений.
+    :ivar batch_size: Размер пачки.
+    :ivar poll_interval: Пауза между опросами пустого outbox, в секундах.
+    """
+
+    def __init__(
+            self,
+            session_factory: sessionmaker,
+            url: str,
+            batch_size: int = config.OUTBOX_BATCH_SIZE,
+            poll_interval: float = config.OUTBOX_POLL_SECONDS,
+            client: httpx.Client | None = None
+    ):
+        """
+        Инициализация OutboxDeliverer.
+
+        :param session_factory: Фабрика сессий базы данных.
+        :param url: Адрес получателя уведомлений.
+        :param batch_size: Размер пачки.
+        :param poll_interval: Пауза между опросами пустого outbox.
+        :param client: HTTP-клиент; по умолчанию создаётся свой пул.
+        """
+        self.session_factory = session_factory
+        self.url = url
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.client = client or httpx.Client(
+            timeout=config.OUTBOX_TIMEOUT_SECONDS
+        )
+        self._stop = threading.Event()
+        self._thread = None
+
+    def deliver_once(self) -> int:
+        """
+        Отправляет одну пачку сообщений.
+
+        :return: Количество доставленных сообщений.
+        """
+        with self.session_factory() as session:
+            session.expire_on_commit = False
+            messages = claim_batch(
+                session, self.batch_size, config.OUTBOX_LEASE_SECONDS
+            )
+            if not messages:
+                return 0
+            try:
+                response = self.client.post(
+                    self.url,
+                    json={"events": [message_body(msg) for msg in messages]},
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as exc:
+                logger.warning("Outbox delivery failed: %s", exc)
+                now = utcnow()
+                for message in messages:
+                    message.attempts += 1
+                    delay = min(
+                        config.OUTBOX_RETRY_SECONDS * 2 ** message.attempts,
+                        MAX_RETRY_SECONDS,
+                    )
+                    message.next_attempt_at = now + timedelta(seconds=delay)
+                session.commit()
+                return 0
+            (
+                session.query(OutboxMessage)
+                .filter(OutboxMessage.id.in_([msg.id for msg in messages]))
+                .delete(synchronize_session=False)
+            )
+            session.commit()
+            return len(messages)
+
+    def run(self) -> None:
+        """Отправляет пачки до вызова stop(), делая паузы на пустом outbox."""
+        while not self._stop.is_set():
+            try:
+                delivered = self.deliver_once()
+            except Exception:
+                logger.exception("Outbox deliverer error")
+                delivered = 0
+            if not delivered:
+                self._stop.wait(self.poll_interval)
+
+    def start(self) -> None:
+        """Запускает фоновый поток доставки."""
+        self._thread = threading.Thread(
+            target=self.run, name="outbox-deliverer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает фоновый поток и закрывает пул соединений."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.client.close()
@@ -0,0 +1,173 @@
+"""Выборочное профилирование отдельных HTTP-запросов."""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from app import config
+
+SAFE_NAME = re.compile(r"[^A-Za-z0-9_-]+")
+# Функции, в которых поток ждёт работы: свободные воркеры пула потоков,
+# цикл событий без готовых задач, ожидание результата и join
+IDLE_FRAMES = frozenset({
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+})
+
+
+class SamplingProfiler:
+    """
+    Семплирующий профилировщик стеков всех потоков процесса.
+
+    Раз в interval секунд снимает стеки через sys._current_frames() и
+    накапливает их в формате folded stacks, который читают flamegraph.pl,
+    speedscope и inferno. Синхронные эндпоинты FastAPI выполняются в пуле
+    потоков, и заранее неизвестно, в каком, поэтому снимаются стеки всех
+    потоков, кроме самого семплера. Стеки простаивающих потоков (самый
+    внутренний кадр из IDLE_FRAMES) отбрасываются, чтобы свободные воркеры
+    и ожидающий цикл событий не заслоняли работу запроса.
+
+    :ivar interval: Интервал между снимками в секундах.
+    :ivar samples: Счётчик свёрнутых стеков.
+    """
+
+    def __init__(self, interval: float = config.PROFILING_INTERVAL):
+        """
+        Инициализация SamplingProfiler.
+
+        :param interval: Интервал между снимками в секундах.
+        """
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Запускает поток семплирования."""
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Останавливает поток семплирования и дожидается его завершения."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        """Цикл снятия стеков до вызова stop()."""
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or self.is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} "
+                        f"({os.path.basename(code.co_filename)}:"
+                        f"{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    @staticmethod
+    def is_idle(frame) -> bool:
+        """
+        Проверяет, ждёт ли поток работы.
+
+        :param frame: Самый внутренний кадр стека потока.
+        :return: True, если кадр относится к IDLE_FRAMES.
+        """
+        code = frame.f_code
+        return (
+            os.path.basename(code.co_filename), code.co_name
+        ) in IDLE_FRAMES
+
+    def dump(self, path: str) -> None:
+        """
+        Записывает накопленные стеки в файл формата folded stacks.
+
+        :param path: Путь к файлу.
+        """
+        with open(path, "w", encoding="utf-8") as out:
+            for stack, count in self.samples.most_common():
+                out.write(f"{stack} {count}\n")
+
+
+class ProfilingMiddleware:
+    """
+    ASGI-middleware, профилирующее выбранные запросы.
+
+    Запрос профилируется, если в нём передан заголовок X-Profile: 1 либо он
+    попал в случайную выборку с долей sample_rate. Результат сохраняется в
+    output_dir. Middleware подключается только при PROFILING_ENABLED, поэтому
+    в выключенном состоянии накладных расходов нет.
+    """
+
+    def __init__(
+            self,
+            app,
+            output_dir: str = config.PROFILING_DIR,
+            sample_rate: float = config.PROFILING_SAMPLE_RATE,
+            interval: float = config.PROFILING_INTERVAL
+    ):
+        """
+        Инициализация ProfilingMiddleware.
+
+        :param app: Оборачиваемое ASGI-приложение.
+        :param output_dir: Каталог для файлов профилей.
+        :param sample_rate: Доля запросов, профилируемых без заголовка.
+        :param interval: Интервал семплирования в секундах.
+        """
+        self.app = app
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    def should_profile(self, scope: dict) -> bool:
+        """
+        Определяет, нужно ли профилировать запрос.
+
+        :param scope: ASGI scope запроса.
+        :return: True, если запрос нужно профилировать.
+        """
+        for name, value in scope.get("headers", ()):
+            if name == config.PROFILING_HEADER.encode():
+                return value.decode().lower() in config.TRUE_VALUES
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profile_path(self, scope: dict) -> str:
+        """
+        Формирует путь к файлу профиля запроса.
+
+        :param scope: ASGI scope запроса.
+        :return: Путь к файлу.
+        """
+        route = SAFE_NAME.sub("_", scope["path"]).strip("_") or "root"
+        name = f"{time.time_ns()}-{scope['method']}-{route}.folded"
+        return os.path.join(self.output_dir, name)
+
+    async def __call__(self, scope, receive, send):
+        """Обрабатывает ASGI-вызов, при необходимости профилируя его."""
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        profiler = SamplingProfiler(self.interval)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            os.makedirs(self.output_dir, exist_ok=True)
+            profiler.dump(self.profile_path(scope))
@@ -0,0 +1,120 @@
+"""Кэш маршрутизации: веса операторов по источникам."""
+
+import threading
+import time
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models import ConfigVersion, SourceOperator
+
+CONFIG_VERSION_ID = 1
+
+
+def get_config_version(session: Session) -> int:
+    """
+    Читает текущую версию конфигурации распределения.
+
+    :param session: Сессия для работы с базой данных.
+    :return: Номер версии или 0, если конфигурация ещё не менялась.
+    """
+    return session.execute(
+        select(ConfigVersion.version)
+        .where(ConfigVersion.id == CONFIG_VERSION_ID)
+    ).scalar() or 0
+
+
+class RoutingCache:
+    """
+    Кэш таблиц весов SourceOperator в памяти процесса.
+
+    Хранит для каждого источника список пар (ID оператора, вес) отдельно
+    для каждой базы данных вместе с версией конфигурации, при которой
+    таблица загружена. При каждом обращении версия сверяется с базой одним
+    чтением по первичному ключу, поэтому изменения весов, сделанные другим
+    воркером, видны без внешнего брокера. Активность, лимит и текущая
+    нагрузка оператора не кэшируются и читаются в транзакции распределения.
+
+    :ivar warmup_seconds: Длительность последнего прогрева.
+    """
+
+    def __init__(self):
+        """Инициализация RoutingCache."""
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.warmup_seconds = None
+
+    @staticmethod
+    def _load_table(session: Session) -> dict:
+        """
+        Загружает таблицы весов всех источников одним запросом.
+
+        :param session: Сессия для работы с базой данных.
+        :return: Словарь {ID источника: [(ID оператора, вес), ...]}.
+        """
+        table = {}
+        rows = (
+            session.query(
+                SourceOperator.source_id,
+                SourceOperator.operator_id,
+                SourceOperator.weight,
+            )
+            .order_by(SourceOperator.source_id, SourceOperator.operator_id)
+            .all()
+        )
+        for source_id, operator_id, weight in rows:
+            table.setdefault(source_id, []).append((operator_id, weight))
+        return table
+
+    def source_weights(self, session: Session, source_id: int) -> list:
+        """
+        Возвращает веса операторов источника, загружая таблицу при промахе.
+
+        :param session: Сессия для работы с базой данных.
+        :param source_id: ID источника.
+        :return: Список пар (ID оператора, вес).
+        """
+        bind = session.get_bind()
+        version = get_config_version(session)
+        cached = self._tables.get(bind)
+        if cached is None or cached[0] != version:
+            cached = (version, self._load_table(session))
+            with self._lock:
+                self._tables[bind] = cached
+        return cached[1].get(source_id, [])
+
+    def warm_up(self, session: Session) -> dict:
+        """
+        Предзагружает веса всех источников, чтобы первое распределение
+        не читало таблицу весов.
+
+        Нагрузки операторов не прогреваются: они не кэшируются и читаются
+        в транзакции распределения.
+
+        :param session: Сессия для работы с базой данных.
+        :return: Сводка прогрева.
+        """
+        start = time.perf_counter()
+        version = get_config_version(session)
+        table = self._load_table(session)
+        with self._lock:
+            self._tables[session.get_bind()] = (version, table)
+        self.warmup_seconds = time.perf_counter() - start
+        return {
+            "sources": len(table),
+            "operators": len(
+                {oper_id for pairs in table.values() for oper_id, _ in pairs}
+            ),
+            "warmup_seconds": self.warmup_seconds,
+        }
+
+    def invalidate(self) -> None:
+        """
+        Сбрасывает кэш процесса; таблицы будут перечитаны при следующем
+        обращении.
+
+        Другие воркеры узнают об изменении по версии конфигурации.
+        """
+        with self._lock:
+            self._tables.clear()
+
+
+routing_cache = RoutingCache()
@@ -1,8 +1,12 @@
 """Pydantic-схемы."""
 
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, Field
 from typing import Optional
 
+# Максимум лидов в одном запросе истории
+LEAD_HISTORY_MAX = 1000
+
 
 class OperatorCreate(BaseModel):
     """
@@ -78,6 +82,27 @@ class SourceOperatorAssign(BaseModel):
     weight: int = 1
 
 
+class SourceOperatorOut(BaseModel):
+    """
+    Схема для вывода связи источника с оператором.
+
+    :ivar id: ID связи.
+    :ivar source_id: ID источника.
+    :ivar operator_id: ID оператора.
+    :ivar weight: Нагрузка оператора для распределения по источнику.
+    """
+
+    id: int
+    source_id: int
+    operator_id: int
+    weight: int
+
+    class Config:
+        """Конфигурация Pydantic."""
+
+        orm_mode = True
+
+
 class ContactCreate(BaseModel):
     """
     Схема для создания нового контакта.
@@ -104,6 +129,8 @@ class ContactOut(BaseModel):
     :ivar operator_id: ID оператора.
     :ivar status: Статус обращения.
     :ivar payload: Дополнительные данные контакта.
+    :ivar created_at: Время регистрации обращения (UTC).
+    :ivar closed_at: Время закрытия обращения (UTC).
     """
 
     id: int
@@ -112,6 +139,8 @@ class ContactOut(BaseModel):
     operator_id: Optional[int] = None
     status: str
     payload: Optional[str] = None
+    created_at: Optional[datetime] = None
+    closed_at: Optional[datetime] = None
 
     class Config:
         """Конфигурация Pydantic."""
@@ -136,3 +165,81 @@ class LeadOut(BaseModel):
         """Конфигурация Pydantic."""
 
         orm_mode = True
+
+
+class ContactHistoryOut(BaseModel):
+    """
+    Схема обращения в истории лида.
+
+    Данные контакта (payload) не выводятся: колонка загружается отложенно,
+    и её чтение стоило бы отдельного запроса на каждое обращение.
+
+    :ivar id: ID контакта.
+    :ivar source_id: ID источника.
+    :ivar operator_id: ID оператора.
+    :ivar status: Статус обращения.
+    :ivar created_at: Время регистрации обращения (UTC).
+    :ivar closed_at: Время закрытия обращения (UTC).
+    :ivar source: Источник обращения.
+    :ivar operator: Оператор обращения.
+    """
+
+    id: int
+    source_id: int
+    operator_id: Optional[int] = None
+    status: str
+    created_at: Optional[datetime] = None
+    closed_at: Optional[datetime] = None
+    source: SourceOut
+    operator: Optional[OperatorOut] = None
+
+    class Config:
+        """Конфигурация Pydantic."""
+
+        orm_mode = True
+
+
+class LeadHistoryOut(LeadOut):
+    """
+    Схема лида вместе с историей обращений.
+
+    :ivar contacts: Обращения лида по возрастанию ID.
+    """
+
+    contacts: list[ContactHistoryOut] = []
+
+
+class LeadHistoryRequest(BaseModel):
+    """
+    Схема запроса истории нескольких лидов.
+
+    :ivar lead_ids: ID лидов, не больше LEAD_HISTORY_MAX.
+    """
+
+    lead_ids: list[int] = Field(min_length=1, max_length=LEAD_HISTORY_MAX)
+
+
+class AdmissionSettings(BaseModel):
+    """
+    Общие настройки контроля допуска обращений.
+
+    :ivar default_rate: Скорость по умолчанию для источников, в секунду.
+    :ivar default_burst: Ёмкость ведра токенов по умолчанию.
+    :ivar max_in_flight: Общий предел одновременных обращений.
+    """
+
+    default_rate: Optional[float] = None
+    default_burst: Optional[float] = None
+    max_in_flight: Optional[int] = None
+
+
+class SourceRateLimit(BaseModel):
+    """
+    Лимит частоты обращений источника.
+
+    :ivar rate: Скорость, запросов в секунду; 0 — без ограничения.
+    :ivar burst: Ёмкость ведра токенов.
+    """
+
+    rate: float
+    burst: Optional[float] = None
@@ -0,0 +1,37 @@
+"""Быстрая сериализация больших списков в JSON."""
+
+import json
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data) -> bytes:
+    """
+    Кодирует данные в JSON, используя orjson, если он установлен.
+
+    :param data: Данные для кодирования.
+    :return: JSON в виде байтов.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def rows_response(rows: list, fields: tuple) -> Response:
+    """
+    Формирует JSON-ответ из кортежей колонок без ORM-объектов и Pydantic.
+
+    :param rows: Строки результата запроса.
+    :param fields: Имена полей в порядке колонок.
+    :return: Готовый HTTP-ответ.
+    """
+    return Response(
+        content=dumps([dict(zip(fields, row)) for row in rows]),
+        media_type="application/json",
+    )
@@ -0,0 +1,294 @@
+"""Распределение источников по нескольким файлам SQLite (экспериментально)."""
+
+import logging
+import os
+import zlib
+from sqlalchemy import bindparam, event, func, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+from app.database import (
+    Base,
+    add_missing_columns,
+    create_missing_indexes,
+    create_read_engine,
+    create_write_engine,
+    write_transaction,
+)
+from app.models import (
+    ConfigVersion,
+    Operator,
+    Source,
+    SourceOperator,
+    Contact,
+    ContactStatus,
+    ArchivedContact,
+)
+
+logger = logging.getLogger(__name__)
+
+CONFIG_MODELS = (ConfigVersion, Operator, Source)
+STRIDED_MODELS = ((Contact, (Contact, ArchivedContact)),)
+OPEN_LOADS = (
+    select(Contact.operator_id, func.count(Contact.id))
+    .where(
+        Contact.operator_id.in_(bindparam("operator_ids", expanding=True)),
+        Contact.status == ContactStatus.open,
+    )
+    .group_by(Contact.operator_id)
+)
+
+
+def shard_index(source_id: int, count: int) -> int:
+    """
+    Возвращает номер шарда источника.
+
+    :param source_id: ID источника.
+    :param count: Количество шардов.
+    :return: Номер шарда от 0 до count - 1.
+    """
+    return zlib.crc32(str(source_id).encode()) % count
+
+
+def strided_ids(session: Session, model, amount: int) -> list | None:
+    """
+    Выдаёт новым контактам шарда ID вида k * count + index.
+
+    Так ID не пересекаются между шардами, а шард контакта определяется по
+    его ID. Запись в шард идёт в транзакции write_transaction() с BEGIN
+    IMMEDIATE, поэтому чтение максимального ID и вставка атомарны.
+
+    :param session: Сессия шарда.
+    :param model: Contact.
+    :param amount: Количество ID.
+    :return: Список ID или None, если сессия не относится к шарду.
+    """
+    shard = session.info.get("shard")
+    if shard is None:
+        return None
+    index, count = shard
+    connection = session.connection()
+    current = max(
+        connection.execute(select(func.max(table.id))).scalar() or 0
+        for table in dict(STRIDED_MODELS)[model]
+    )
+    next_id = current - current % count + index
+    if next_id <= current:
+        next_id += count
+    return list(range(next_id, next_id + amount * count, count))
+
+
+@event.listens_for(Session, "before_flush")
+def assign_strided_ids(session, flush_context, instances) -> None:
+    """Выдаёт ID новым контактам сессии шарда через strided_ids()."""
+    if session.info.get("shard") is None:
+        return
+    for model, _ in STRIDED_MODELS:
+        new = [
+            obj for obj in session.new
+            if isinstance(obj, model) and obj.id is None
+        ]
+        if not new:
+            continue
+        for obj, obj_id in zip(new, strided_ids(session, model, len(new))):
+            obj.id = obj_id
+
+
+class ShardSet:
+    """
+    Набор шардов SQLite, между которыми распределены источники.
+
+    Каждый шард — отдельный файл с полной схемой и своей блокировкой
+    записи. Операторы, источники и веса реплицируются на все шарды из
+    основной базы через sync_config(), обращения хранятся на шарде своего
+    источника, а лиды — только в основной базе, чтобы у лида был один ID
+    и одна история на всех шардах. Лимиты операторов учитывают открытые
+    обращения на всех шардах, но без общей блокировки, поэтому могут быть
+    превышены на величину до count - 1. Режим экспериментальный: прироста
+    пропускной способности от шардов пока не получено.
+
+    :ivar count: Количество шардов.
+    :ivar paths: Пути к файлам шардов.
+    """
+
+    def __init__(self, count: int, data_dir: str):
+        """
+        Инициализация ShardSet.
+
+        :param count: Количество шардов.
+        :param data_dir: Каталог для файлов шардов.
+        """
+        self.count = count
+        logger.warning(
+            "Sharding is experimental: operator limits may be exceeded "
+            "by up to %d contacts",
+            count - 1,
+        )
+        os.makedirs(data_dir, exist_ok=True)
+        self.paths = [
+            os.path.join(data_dir, f"shard_{index}.sqlite")
+            for index in range(count)
+        ]
+        self.engines = [create_write_engine(path) for path in self.paths]
+        self.read_engines = [create_read_engine(path) for path in self.paths]
+        self.session_factories = [
+            sessionmaker(
+                bind=shard_engine,
+                autoflush=False,
+                autocommit=False,
+                info={
+                    "shard": (index, count),
+                    "remote_loads": self._remote_loads_for(index),
+                },
+            )
+            for index, shard_engine in enumerate(self.engines)
+        ]
+        self.read_session_factories = [
+            sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+            for read_engine in self.read_engines
+        ]
+
+    def create_all(self) -> None:
+        """Создаёт схему во всех шардах."""
+        for shard_engine in self.engines:
+            Base.metadata.create_all(bind=shard_engine)
+            add_missing_columns(shard_engine)
+            create_missing_indexes(shard_engine)
+
+    def _remote_loads_for(self, index: int):
+        """
+        Создаёт функцию подсчёта нагрузок на шардах, кроме данного.
+
+        :param index: Номер шарда.
+        :return: Функция, принимающая список ID операторов.
+        """
+        def remote_loads(operator_ids: list) -> dict:
+            loads = {}
+            for other, read_engine in enumerate(self.read_engines):
+                if other == index:
+                    continue
+                with read_engine.connect() as conn:
+                    rows = conn.execute(
+                        OPEN_LOADS, {"operator_ids": operator_ids}
+                    )
+                    for oper_id, count in rows:
+                        loads[oper_id] = loads.get(oper_id, 0) + count
+            return loads
+
+        return remote_loads
+
+    def session_for_source(self, source_id: int) -> Session:
+        """
+        Открывает сессию записи шарда источника.
+
+        :param source_id: ID источника.
+        :return: Сессия шарда.
+        """
+        return self.session_factories[shard_index(source_id, self.count)]()
+
+    def session_for_id(self, contact_id: int) -> Session:
+        """
+        Открывает сессию записи шарда, которому принадлежит ID контакта.
+
+        :param contact_id: ID контакта.
+        :return: Сессия шарда.
+        """
+        return self.session_factories[contact_id % self.count]()
+
+    def fan_out(self, func_, *args, **kwargs) -> list:
+        """
+        Выполняет функцию чтения на каждом шарде.
+
+        :param func_: Функция, первым аргументом принимающая сессию.
+        :param args: Позиционные аргументы функции.
+        :param kwargs: Именованные аргументы функции.
+        :return: Список результатов по шардам.
+        """
+        results = []
+        for factory in self.read_session_factories:
+            with factory() as session:
+                results.append(func_(session, *args, **kwargs))
+        return results
+
+    def sync_config(self, primary: Session) -> None:
+        """
+        Реплицирует операторов, источники и веса из основной базы на шарды.
+
+        Таблицы конфигурации небольшие, поэтому каждый шард целиком
+        приводится к состоянию основной базы одной транзакцией.
+
+        :param primary: Сессия основной базы.
+        """
+        snapshot = {
+            model: [
+                {
+                    column.key: getattr(row, column.key)
+                    for column in model.__table__.columns
+                }
+                for row in primary.query(model)
+            ]
+            for model in CONFIG_MODELS + (SourceOperator,)
+        }
+        for factory in self.session_factories:
+            with factory() as session:
+                write_transaction(session)
+                for model in CONFIG_MODELS:
+                    for row in snapshot[model]:
+                        session.merge(model(**row))
+                session.query(SourceOperator).delete(synchronize_session=False)
+                if snapshot[SourceOperator]:
+                    session.execute(
+                        insert(SourceOperator), snapshot[SourceOperator]
+                    )
+                session.commit()
+
+    def dispose(self) -> None:
+        """Закрывает соединения всех шардов."""
+        for shard_engine in self.engines + self.read_engines:
+            shard_engine.dispose()
+
+
+def merge_stats(parts: list) -> dict:
+    """
+    Складывает статистику get_stats с нескольких шардов.
+
+    :param parts: Результаты get_stats по шардам.
+    :return: Объединённая статистика.
+    """
+    merged = {}
+    for key, id_key, counters in (
+        ("operators", "operator_id", ("total", "open")),
+        ("sources", "source_id", ("total",)),
+    ):
+        rows = {}
+        for part in parts:
+            for row in part[key]:
+                current = rows.get(row[id_key])
+                if current is None:
+                    rows[row[id_key]] = dict(row)
+                    continue
+                for counter in counters:
+                    current[counter] += row[counter]
+        merged[key] = [rows[row_id] for row_id in sorted(rows)]
+    return merged
+
+
+def merge_timeseries(parts: list) -> list:
+    """
+    Складывает ряды get_contact_timeseries с нескольких шардов.
+
+    :param parts: Результаты get_contact_timeseries по шардам.
+    :return: Объединённый ряд.
+    """
+    points = {}
+    for part in parts:
+        for point in part:
+            key = (
+                point["bucket"],
+                point["source_id"],
+                point["operator_id"] or 0,
+                point["status"],
+            )
+            if key in points:
+                points[key]["count"] += point["count"]
+            else:
+                points[key] = dict(point)
+    return [points[key] for key in sorted(points)]
@@ -0,0 +1,390 @@
+"""
+Векторизованный офлайн-симулятор распределения обращений.
+
+Читает текущую конфигурацию Operator и SourceOperator из базы и
+моделирует поток обращений и закрытий с той же семантикой, что и
+choose_operator_by_weight вместе с проверкой лимита в
+available_operators_for_source: обращение источника получает активный
+оператор источника с нагрузкой ниже лимита с вероятностью, пропорциональной
+весу, а при отсутствии кандидатов остаётся нераспределённым.
+
+Запуск: python -m app.simulator --arrivals 1000000 --ticks 1000
+"""
+
+import argparse
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import Operator, SourceOperator, Contact, ContactStatus
+
+UNLIMITED = np.iinfo(np.int64).max // 2
+
+
+def assign_batch(
+        rng: np.random.Generator,
+        count: int,
+        weights: np.ndarray,
+        capacity: np.ndarray
+) -> tuple:
+    """
+    Распределяет пачку обращений по весам с учётом оставшейся ёмкости.
+
+    Обращения разыгрываются мультиномиально по весам операторов с ненулевой
+    ёмкостью; превысившие ёмкость разыгрываются заново между оставшимися.
+    Каждый повтор насыщает хотя бы одного оператора, поэтому повторов не
+    больше числа операторов. Если у всех доступных операторов нулевой вес,
+    обращения получает первый из них, как в choose_operator_by_weight.
+
+    :param rng: Генератор случайных чисел.
+    :param count: Количество обращений в пачке.
+    :param weights: Веса операторов.
+    :param capacity: Оставшаяся ёмкость операторов (0 для неактивных и не
+        назначенных на источник).
+    :return: Массив назначенных обращений по операторам и число
+        нераспределённых обращений.
+    """
+    assigned = np.zeros(len(weights), dtype=np.int64)
+    capacity = capacity.copy()
+    remaining = count
+    while remaining > 0:
+        eligible = capacity > 0
+        if not eligible.any():
+            break
+        eligible_weights = np.where(eligible, weights, 0).astype(np.float64)
+        total = eligible_weights.sum()
+        if total <= 0:
+            first = np.flatnonzero(eligible)[0]
+            take = min(remaining, capacity[first])
+            assigned[first] += take
+            capacity[first] -= take
+            remaining -= take
+            continue
+        draw = rng.multinomial(remaining, eligible_weights / total)
+        take = np.minimum(draw, capacity)
+        assigned += take
+        capacity -= take
+        remaining -= int(take.sum())
+    return assigned, remaining
+
+
+class DistributionModel:
+    """
+    Конфигурация распределения в виде массивов NumPy.
+
+    :ivar operator_ids: ID операторов.
+    :ivar names: Имена операторов.
+    :ivar active: Флаги активности.
+    :ivar limits: Лимиты нагрузки (UNLIMITED, если лимит не задан).
+    :ivar loads: Начальные нагрузки (открытые обращения).
+    :ivar source_ids: ID источников.
+    :ivar weights: Матрица весов источник × оператор.
+    :ivar members: Матрица назначения операторов на источники.
+    """
+
+    def __init__(
+            self,
+            operator_ids: list,
+            names: list,
+            active: list,
+            limits: list,
+            loads: list,
+            source_ids: list,
+            weights: np.ndarray,
+            members: np.ndarray | None = None
+    ):
+        """
+        Инициализация DistributionModel.
+
+        :param operator_ids: ID операторов.
+        :param names: Имена операторов.
+        :param active: Флаги активности.
+        :param limits: Лимиты нагрузки; None — без лимита.
+        :param loads: Начальные нагрузки.
+        :param source_ids: ID источников.
+        :param weights: Матрица весов источник × оператор.
+        :param members: Матрица назначения; по умолчанию — ненулевые веса.
+        """
+        self.operator_ids = np.asarray(operator_ids, dtype=np.int64)
+        self.names = list(names)
+        self.active = np.asarray(active, dtype=bool)
+        self.limits = np.asarray(
+            [UNLIMITED if limit is None else limit for limit in limits],
+            dtype=np.int64,
+        )
+        self.loads = np.asarray(loads, dtype=np.int64)
+        self.source_ids = np.asarray(source_ids, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.int64)
+        if members is None:
+            members = self.weights > 0
+        self.members = np.asarray(members, dtype=bool)
+
+    @classmethod
+    def from_db(cls, session: Session, with_current_loads: bool = True):
+        """
+        Строит модель по текущему состоянию базы.
+
+        :param session: Сессия для работы с базой данных.
+        :param with_current_loads: Начинать ли с текущих открытых обращений.
+        :return: Объект DistributionModel.
+        """
+        opers = session.query(Operator).order_by(Operator.id).all()
+        column = {oper.id: idx for idx, oper in enumerate(opers)}
+        links = (
+            session.query(
+                SourceOperator.source_id,
+                SourceOperator.operator_id,
+                SourceOperator.weight,
+            )
+            .order_by(SourceOperator.source_id)
+            .all()
+        )
+        source_ids = sorted({source_id for source_id, _, _ in links})
+        row = {source_id: idx for idx, source_id in enumerate(source_ids)}
+        weights = np.zeros((len(source_ids), len(opers)), dtype=np.int64)
+        members = np.zeros(weights.shape, dtype=bool)
+        for source_id, operator_id, weight in links:
+            if operator_id in column:
+                weights[row[source_id], column[operator_id]] = weight
+                members[row[source_id], column[operator_id]] = True
+        loads = {}
+        if with_current_loads:
+            loads = dict(
+                session.query(Contact.operator_id, func.count(Contact.id))
+                .filter(Contact.status == ContactStatus.open)
+                .group_by(Contact.operator_id)
+                .all()
+            )
+        return cls(
+            operator_ids=[oper.id for oper in opers],
+            names=[oper.name for oper in opers],
+            active=[bool(oper.active) for oper in opers],
+            limits=[oper.limit for oper in opers],
+            loads=[loads.get(oper.id, 0) for oper in opers],
+            source_ids=source_ids,
+            weights=weights,
+            members=members,
+        )
+
+    def set_weight(
+            self,
+            source_id: int,
+            operator_id: int,
+            weight: int
+    ) -> None:
+        """
+        Переопределяет вес оператора на источнике для сценария «что если».
+
+        :param source_id: ID источника.
+        :param operator_id: ID оператора.
+        :param weight: Новый вес.
+        """
+        row = np.flatnonzero(self.source_ids == source_id)
+        column = np.flatnonzero(self.operator_ids == operator_id)
+        if not len(row) or not len(column):
+            raise ValueError(
+                f"Unknown source {source_id} or operator {operator_id}"
+            )
+        self.weights[row[0], column[0]] = weight
+        self.members[row[0], column[0]] = True
+
+    def set_limit(self, operator_id: int, limit: int) -> None:
+        """
+        Переопределяет лимит оператора для сценария «что если».
+
+        :param operator_id: ID оператора.
+        :param limit: Новый лимит.
+        """
+        column = np.flatnonzero(self.operator_ids == operator_id)
+        if not len(column):
+            raise ValueError(f"Unknown operator {operator_id}")
+        self.limits[column[0]] = limit
+
+
+class SimulationReport:
+    """
+    Результаты симуляции.
+
+    :ivar load_curves: Нагрузка операторов по тактам (такт × оператор).
+    :ivar arrivals: Поступившие обращения по источникам.
+    :ivar unassigned: Нераспределённые обращения по источникам.
+    :ivar first_saturation: Первый такт, когда оператор упёрся в лимит (-1 —
+        не упирался).
+    :ivar saturated_share: Доля тактов, в конце которых оператор был на лимите.
+    """
+
+    def __init__(
+            self,
+            model: DistributionModel,
+            load_curves: np.ndarray,
+            arrivals: np.ndarray,
+            unassigned: np.ndarray
+    ):
+        """
+        Инициализация SimulationReport.
+
+        :param model: Модель, по которой проводилась симуляция.
+        :param load_curves: Нагрузка операторов по тактам.
+        :param arrivals: Поступившие обращения по источникам.
+        :param unassigned: Нераспределённые обращения по источникам.
+        """
+        self.model = model
+        self.load_curves = load_curves
+        self.arrivals = arrivals
+        self.unassigned = unassigned
+        at_limit = load_curves >= model.limits
+        self.saturated_share = at_limit.mean(axis=0)
+        self.first_saturation = np.where(
+            at_limit.any(axis=0), at_limit.argmax(axis=0), -1
+        )
+
+    @property
+    def unassigned_rate(self) -> np.ndarray:
+        """Доля нераспределённых обращений по источникам."""
+        return np.divide(
+            self.unassigned,
+            self.arrivals,
+            out=np.zeros(len(self.arrivals)),
+            where=self.arrivals > 0,
+        )
+
+    def format(self) -> str:
+        """
+        Формирует текстовый отчёт.
+
+        :return: Отчёт по источникам и операторам.
+        """
+        lines = ["source   arrivals   unassigned   rate"]
+        for idx, source_id in enumerate(self.model.source_ids):
+            lines.append(
+                f"{source_id:<8} {self.arrivals[idx]:<10} "
+                f"{self.unassigned[idx]:<12} {self.unassigned_rate[idx]:.4f}"
+            )
+        lines.append("")
+        lines.append(
+            "operator  name             limit   mean_load  max_load  "
+            "saturated  first_saturation"
+        )
+        for idx, oper_id in enumerate(self.model.operator_ids):
+            limit = self.model.limits[idx]
+            lines.append(
+                f"{oper_id:<9} {self.model.names[idx][:16]:<16} "
+                f"{'-' if limit == UNLIMITED else limit:<7} "
+                f"{self.load_curves[:, idx].mean():<10.2f} "
+                f"{self.load_curves[:, idx].max():<9} "
+                f"{self.saturated_share[idx]:<10.3f} "
+                f"{self.first_saturation[idx]}"
+            )
+        return "\n".join(lines)
+
+
+def simulate(
+        model: DistributionModel,
+        arrivals: int,
+        ticks: int = 1000,
+        close_rate: float = 0.05,
+        source_shares: np.ndarray | None = None,
+        seed: int | None = None
+) -> SimulationReport:
+    """
+    Моделирует поступление и закрытие обращений по тактам.
+
+    На каждом такте каждое открытое обращение закрывается с вероятностью
+    close_rate, после чего источники в случайном порядке получают пуассоновское
+    число обращений и распределяют их через assign_batch.
+
+    :param model: Модель распределения.
+    :param arrivals: Ожидаемое общее число обращений.
+    :param ticks: Число тактов.
+    :param close_rate: Вероятность закрытия открытого обращения за такт.
+    :param source_shares: Доли источников в потоке; по умолчанию поровну.
+    :param seed: Зерно генератора случайных чисел.
+    :return: Отчёт SimulationReport.
+    """
+    rng = np.random.default_rng(seed)
+    n_sources = len(model.source_ids)
+    if source_shares is None:
+        source_shares = np.full(n_sources, 1 / max(n_sources, 1))
+    rates = arrivals * np.asarray(source_shares, dtype=np.float64) / ticks
+    limits = np.where(model.active, model.limits, 0)
+    loads = model.loads.copy()
+    load_curves = np.empty((ticks, len(loads)), dtype=np.int64)
+    total_arrivals = np.zeros(n_sources, dtype=np.int64)
+    unassigned = np.zeros(n_sources, dtype=np.int64)
+    for tick in range(ticks):
+        loads -= rng.binomial(loads, close_rate)
+        counts = rng.poisson(rates)
+        total_arrivals += counts
+        for source in rng.permutation(n_sources):
+            if not counts[source]:
+                continue
+            weights = model.weights[source]
+            capacity = np.where(
+                model.members[source], np.maximum(limits - loads, 0), 0
+            )
+            assigned, left = assign_batch(
+                rng, int(counts[source]), weights, capacity
+            )
+            loads += assigned
+            unassigned[source] += left
+        load_curves[tick] = loads
+    return SimulationReport(model, load_curves, total_arrivals, unassigned)
+
+
+def parse_pairs(values: list, separator: str) -> list:
+    """
+    Разбирает аргументы вида A:B=C или A=C.
+
+    :param values: Строки аргументов.
+    :param separator: Разделитель ключа.
+    :return: Список кортежей целых чисел.
+    """
+    pairs = []
+    for value in values:
+        key, number = value.split("=")
+        pairs.append((*map(int, key.split(separator)), int(number)))
+    return pairs
+
+
+def main() -> None:
+    """Точка входа симулятора."""
+    from app.database import ReadSessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--arrivals", type=int, default=1_000_000)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--close-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--empty", action="store_true",
+        help="начинать с нулевых нагрузок вместо текущих открытых обращений",
+    )
+    parser.add_argument(
+        "--weight", action="append", default=[],
+        help="переопределить вес: SOURCE:OPERATOR=WEIGHT",
+    )
+    parser.add_argument(
+        "--limit", action="append", default=[],
+        help="переопределить лимит: OPERATOR=LIMIT",
+    )
+    args = parser.parse_args()
+
+    with ReadSessionLocal() as session:
+        model = DistributionModel.from_db(
+            session, with_current_loads=not args.empty
+        )
+    for source_id, operator_id, weight in parse_pairs(args.weight, ":"):
+        model.set_weight(source_id, operator_id, weight)
+    for operator_id, limit in parse_pairs(args.limit, ":"):
+        model.set_limit(operator_id, limit)
+    report = simulate(
+        model,
+        arrivals=args.arrivals,
+        ticks=args.ticks,
+        close_rate=args.close_rate,
+        seed=args.seed,
+    )
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Пакет benchmarks содержит скрипты замеров производительности."""
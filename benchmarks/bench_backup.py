@@ -0,0 +1,177 @@
+"""
+Замер онлайн-резервного копирования под нагрузкой записи.
+
+Заполняет файловую базу архивом обращений и снимает копию backup_database,
+пока отдельный поток непрерывно регистрирует новые обращения. Выводит
+пропускную способность копирования, самый долгий шаг копирования и
+самую долгую задержку писателя во время копии и без неё, а также время
+восстановления копии restore_database.
+
+Запуск: python -m benchmarks.bench_backup [--contacts 1000000] [--pages 256]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from app import crud, schemas
+from app.backup import backup_database, restore_database
+from app.database import Base, create_write_engine
+from app.models import ArchivedContact, ContactStatus, Lead, utcnow
+
+CHUNK = 100_000
+BASELINE_SECONDS = 1.0
+
+
+def fill(session_factory: sessionmaker, contacts: int) -> int:
+    """
+    Заполняет базу лидами и архивными обращениями.
+
+    Основная таблица обращений остаётся небольшой, чтобы задержки
+    писателя отражали копирование, а не рост горячих таблиц.
+
+    :param session_factory: Фабрика сессий базы.
+    :param contacts: Количество архивных обращений.
+    :return: ID источника для регистрации обращений писателем.
+    """
+    with session_factory() as session:
+        oper = crud.create_operator(
+            session, schemas.OperatorCreate(name="oper", limit=None)
+        )
+        source = crud.create_source(
+            session, schemas.SourceCreate(name="source")
+        )
+        crud.assign_operator_to_source(
+            session,
+            source.id,
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=1),
+        )
+        for start in range(0, contacts, CHUNK):
+            size = min(CHUNK, contacts - start)
+            session.execute(
+                insert(Lead),
+                [
+                    {"external_id": f"lead_{start + idx}"}
+                    for idx in range(size)
+                ],
+            )
+            session.execute(
+                insert(ArchivedContact),
+                [
+                    {
+                        "id": start + idx + 1,
+                        "lead_id": start + idx + 1,
+                        "source_id": source.id,
+                        "status": ContactStatus.closed,
+                        "payload": "x" * 200,
+                        "closed_at": utcnow(),
+                    }
+                    for idx in range(size)
+                ],
+            )
+            session.commit()
+        return source.id
+
+
+def write_until(session_factory, source_id: int, stop, latencies) -> None:
+    """
+    Регистрирует обращения, пока не выставлен флаг остановки.
+
+    :param session_factory: Фабрика сессий базы.
+    :param source_id: ID источника.
+    :param stop: Событие остановки.
+    :param latencies: Список для времени каждой регистрации.
+    """
+    idx = 0
+    with session_factory() as session:
+        while not stop.is_set():
+            start = time.perf_counter()
+            crud.create_contact(
+                session,
+                schemas.ContactCreate(
+                    external_id=f"writer_{idx}", source_id=source_id
+                ),
+            )
+            latencies.append(time.perf_counter() - start)
+            idx += 1
+
+
+def run_writer(session_factory, source_id: int, action) -> list:
+    """
+    Выполняет действие, пока писатель регистрирует обращения.
+
+    :param session_factory: Фабрика сессий базы.
+    :param source_id: ID источника.
+    :param action: Функция без аргументов.
+    :return: Время каждой регистрации писателя.
+    """
+    stop = threading.Event()
+    latencies = []
+    writer = threading.Thread(
+        target=write_until, args=(session_factory, source_id, stop, latencies)
+    )
+    writer.start()
+    try:
+        action()
+    finally:
+        stop.set()
+        writer.join()
+    return latencies
+
+
+def main() -> None:
+    """Точка входа замера."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=1_000_000)
+    parser.add_argument("--pages", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, "db.sqlite")
+        engine = create_write_engine(db_file)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        source_id = fill(session_factory, args.contacts)
+
+        baseline = run_writer(
+            session_factory, source_id, lambda: time.sleep(BASELINE_SECONDS)
+        )
+        report = {}
+        during = run_writer(
+            session_factory,
+            source_id,
+            lambda: report.update(
+                backup_database(
+                    db_file,
+                    os.path.join(tmp_dir, "backup.sqlite"),
+                    pages=args.pages,
+                )
+            ),
+        )
+        restored = restore_database(
+            report["target"], os.path.join(tmp_dir, "restored.sqlite")
+        )
+        engine.dispose()
+
+    print(f"database:             {report['bytes'] / 2 ** 20:.1f} MB")
+    print(
+        f"backup:               {report['seconds']:.2f} s, "
+        f"{report['mb_per_second']:.0f} MB/s, {report['steps']} steps"
+    )
+    print(f"longest backup step:  {report['longest_step_ms']:.1f} ms")
+    print(
+        f"longest writer stall: {max(during) * 1000:.1f} ms during backup, "
+        f"{max(baseline) * 1000:.1f} ms without"
+    )
+    print(
+        f"writes:               {len(during) / report['seconds']:.0f}/s "
+        f"during backup, {len(baseline) / BASELINE_SECONDS:.0f}/s without"
+    )
+    print(f"restore:              {restored['seconds']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
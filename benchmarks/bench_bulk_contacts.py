@@ -0,0 +1,107 @@
+"""
+Замер массовой регистрации обращений.
+
+Сравнивает регистрацию по одному обращению через create_contact с
+create_contacts_bulk, который распределяет обращения каждого источника
+одним векторизованным розыгрышем и пишет их одним INSERT.
+
+Запуск: python -m benchmarks.bench_bulk_contacts [--contacts 100000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy.orm import sessionmaker
+from app import crud, schemas
+from app.database import Base, create_write_engine
+
+SOURCES = 16
+OPERATORS = 64
+SINGLE = 2000
+
+
+def prepare(db_file: str) -> sessionmaker:
+    """
+    Создаёт базу с операторами и источниками.
+
+    :param db_file: Путь к файлу базы.
+    :return: Фабрика сессий базы.
+    """
+    engine = create_write_engine(db_file)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    rng = random.Random(0)
+    with session_factory() as session:
+        crud.create_operators_bulk(
+            session,
+            [
+                schemas.OperatorCreate(name=f"oper_{idx}", limit=10_000)
+                for idx in range(OPERATORS)
+            ],
+        )
+        for idx in range(SOURCES):
+            source = crud.create_source(
+                session, schemas.SourceCreate(name=f"source_{idx}")
+            )
+            crud.replace_source_operators(
+                session,
+                source.id,
+                [
+                    schemas.SourceOperatorAssign(
+                        operator_id=oper_id, weight=rng.randint(1, 20)
+                    )
+                    for oper_id in rng.sample(range(1, OPERATORS + 1), 8)
+                ],
+            )
+    return session_factory
+
+
+def make_contacts(count: int, prefix: str) -> list:
+    """
+    Генерирует обращения от случайных источников.
+
+    :param count: Количество обращений.
+    :param prefix: Префикс внешних ID лидов.
+    :return: Список объектов ContactCreate.
+    """
+    rng = random.Random(1)
+    return [
+        schemas.ContactCreate(
+            external_id=f"{prefix}_{rng.randrange(count)}",
+            source_id=rng.randint(1, SOURCES),
+        )
+        for _ in range(count)
+    ]
+
+
+def main() -> None:
+    """Точка входа замера."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        session_factory = prepare(os.path.join(tmp_dir, "bench.sqlite"))
+        with session_factory() as session:
+            contacts = make_contacts(SINGLE, "single")
+            start = time.perf_counter()
+            for contact in contacts:
+                crud.create_contact(session, contact)
+            single = SINGLE / (time.perf_counter() - start)
+
+            contacts = make_contacts(args.contacts, "bulk")
+            start = time.perf_counter()
+            result = crud.create_contacts_bulk(session, contacts, seed=0)
+            elapsed = time.perf_counter() - start
+        session_factory.kw["bind"].dispose()
+    print(f"create_contact:       {single:10.0f} contacts/s")
+    print(
+        f"create_contacts_bulk: {args.contacts / elapsed:10.0f} contacts/s "
+        f"({elapsed:.2f} s, unassigned: {result['unassigned']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Замер размера таблицы contacts и скорости её сканирования.
+
+Сравнивает прежнее хранение payload (Text, загружается с каждой строкой)
+с отложенной загрузкой и сжатием больших значений. Обе модели совпадают
+во всём, кроме колонки payload, поэтому разница в замерах относится
+только к ней. Для каждой модели выводятся время подсчёта по таблице и
+время загрузки всех контактов через ORM (лучшее из REPEATS прогонов).
+
+Запуск: python -m benchmarks.bench_contact_payloads [--rows 50000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Enum,
+    Integer,
+    Text,
+    create_engine,
+    insert,
+    text,
+)
+from sqlalchemy.orm import sessionmaker, declarative_base
+from app.database import Base
+from app.models import Contact, ContactStatus
+
+LegacyBase = declarative_base()
+PAYLOAD_SHARE = 0.3
+PAYLOAD_FIELDS = 150
+REPEATS = 3
+
+
+class LegacyContact(LegacyBase):
+    """
+    Контакт с прежним хранением payload в колонке Text.
+
+    Остальные колонки и индексы повторяют Contact.
+    """
+
+    __tablename__ = "contacts"
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, index=True)
+    source_id = Column(Integer)
+    operator_id = Column(Integer, nullable=True)
+    status = Column(Enum(ContactStatus), default=ContactStatus.open)
+    payload = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    closed_at = Column(DateTime, nullable=True)
+
+
+def make_rows(count: int) -> list:
+    """
+    Генерирует строки контактов, часть из которых с большим payload.
+
+    :param count: Количество строк.
+    :return: Список словарей со значениями колонок.
+    """
+    rng = random.Random(0)
+    created_at = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        payload = None
+        if rng.random() < PAYLOAD_SHARE:
+            payload = "&".join(
+                f"field_{j}={rng.choice(('yes', 'no', 'maybe'))}"
+                for j in range(PAYLOAD_FIELDS)
+            )
+        rows.append(
+            {
+                "lead_id": i,
+                "source_id": i % 10,
+                "operator_id": i % 50,
+                "status": ContactStatus.open,
+                "payload": payload,
+                "created_at": created_at,
+            }
+        )
+    return rows
+
+
+def run(tmp_dir: str, name: str, metadata, model, rows: list) -> tuple:
+    """
+    Заполняет базу и замеряет её размер и время сканирования контактов.
+
+    :param tmp_dir: Каталог для файла базы.
+    :param name: Имя файла базы.
+    :param metadata: Метаданные с описанием таблиц.
+    :param model: Модель контакта.
+    :param rows: Строки для вставки.
+    :return: Размер файла в байтах, время подсчёта по таблице и время
+        загрузки всех контактов через ORM в секундах (лучшие из REPEATS).
+    """
+    path = os.path.join(tmp_dir, name)
+    engine = create_engine(f"sqlite:///{path}")
+    metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as session:
+        session.execute(insert(model), rows)
+        session.commit()
+    count_time = orm_time = float("inf")
+    for _ in range(REPEATS):
+        with session_factory() as session:
+            start = time.perf_counter()
+            session.execute(
+                text("SELECT count(*) FROM contacts WHERE status = 'open'")
+            ).all()
+            count_time = min(count_time, time.perf_counter() - start)
+            start = time.perf_counter()
+            session.query(model).all()
+            orm_time = min(orm_time, time.perf_counter() - start)
+    engine.dispose()
+    return os.path.getsize(path), count_time, orm_time
+
+
+def main() -> None:
+    """Точка входа замера."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        legacy = run(
+            tmp_dir, "legacy.sqlite", LegacyBase.metadata, LegacyContact, rows
+        )
+        current = run(tmp_dir, "current.sqlite", Base.metadata, Contact, rows)
+    print(f"rows: {args.rows}")
+    for label, (size, count_time, orm_time) in (
+        ("text", legacy),
+        ("deferred+zlib", current),
+    ):
+        print(
+            f"{label:<14} size: {size / 2 ** 20:.1f} MiB  "
+            f"count scan: {count_time:.4f}s  orm scan: {orm_time:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Замер времени поиска лидов на большом числе строк.
+
+Заполняет базу лидами с e-mail на нескольких тысячах доменов и сравнивает
+время search_leads (диапазон по индексу и курсор страницы) с поиском
+через LIKE, которому индекс недоступен и нужен полный просмотр таблицы.
+Отдельно замеряются страницы домена, на который приходится большая часть
+лидов (--skew): страница не должна дорожать с размером домена.
+
+Запуск: python -m benchmarks.bench_lead_search [--rows 1000000]
+    [--skew 0.5]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import sessionmaker, Session
+from app.crud import search_leads
+from app.database import Base, create_missing_indexes, create_write_engine
+from app.models import Lead
+
+DOMAINS = 5000
+HOT_DOMAIN = "hot.example"
+PAGE = 50
+REPEATS = 20
+CHUNK = 100_000
+
+
+def pick_domain(rng: random.Random, skew: float) -> str:
+    """
+    Выбирает домен лида.
+
+    :param rng: Генератор случайных чисел.
+    :param skew: Доля лидов на домене HOT_DOMAIN.
+    :return: Домен.
+    """
+    if rng.random() < skew:
+        return HOT_DOMAIN
+    return f"domain{rng.randrange(DOMAINS)}.example"
+
+
+def fill_leads(session: Session, rows: int, skew: float) -> None:
+    """
+    Заполняет базу лидами.
+
+    :param session: Сессия для работы с базой данных.
+    :param rows: Количество лидов.
+    :param skew: Доля лидов на домене HOT_DOMAIN.
+    """
+    rng = random.Random(0)
+    for start in range(0, rows, CHUNK):
+        session.execute(
+            insert(Lead),
+            [
+                {
+                    "external_id": f"crm-{idx}",
+                    "e_mail": (
+                        f"user{rng.randrange(rows)}"
+                        f"@{pick_domain(rng, skew)}"
+                    ),
+                }
+                for idx in range(start, min(start + CHUNK, rows))
+            ],
+        )
+    session.commit()
+
+
+def measure(func_, *args, **kwargs) -> float:
+    """
+    Возвращает среднее время вызова в миллисекундах.
+
+    :param func_: Измеряемая функция.
+    :param args: Позиционные аргументы функции.
+    :param kwargs: Именованные аргументы функции.
+    :return: Среднее время вызова, мс.
+    """
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        func_(*args, **kwargs)
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def like_scan(session: Session, pattern: str) -> list:
+    """
+    Ищет лидов через LIKE, как внешний скрипт поверх полного списка.
+
+    :param session: Сессия для работы с базой данных.
+    :param pattern: Шаблон LIKE.
+    :return: Первая страница результатов.
+    """
+    return session.execute(
+        select(Lead.id, Lead.external_id, Lead.e_mail)
+        .where(func.lower(Lead.e_mail).like(pattern))
+        .order_by(Lead.id)
+        .limit(PAGE)
+    ).all()
+
+
+def main() -> None:
+    """Точка входа замера."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skew", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_write_engine(os.path.join(tmp_dir, "bench.sqlite"))
+        Base.metadata.create_all(bind=engine)
+        create_missing_indexes(engine)
+        session = sessionmaker(bind=engine)()
+        fill_leads(session, args.rows, args.skew)
+
+        first = search_leads(session, domain="domain42.example", limit=PAGE)
+        after = (first[-1][0], first[-1][1])
+        cases = (
+            ("e_mail prefix", {"e_mail": "user4242"}, "user4242%"),
+            ("domain", {"domain": "domain42.example"}, "%@domain42.example"),
+            ("external_id", {"external_id": "crm-99"}, None),
+        )
+        print(f"rows: {args.rows}, hot domain share: {args.skew}")
+        for name, criteria, pattern in cases:
+            indexed = measure(search_leads, session, limit=PAGE, **criteria)
+            line = f"{name:<14} index: {indexed:8.2f} ms"
+            if pattern:
+                scan = measure(like_scan, session, pattern)
+                line += f"  LIKE scan: {scan:8.2f} ms"
+            print(line)
+        next_page = measure(
+            search_leads,
+            session,
+            domain="domain42.example",
+            limit=PAGE,
+            after=after,
+        )
+        print(f"{'next page':<14} index: {next_page:8.2f} ms")
+
+        hot = search_leads(session, domain=HOT_DOMAIN, limit=PAGE)
+        for name, page_after in (
+            ("hot domain", None),
+            ("hot next page", (hot[-1][0], hot[-1][1])),
+        ):
+            elapsed = measure(
+                search_leads,
+                session,
+                domain=HOT_DOMAIN,
+                limit=PAGE,
+                after=page_after,
+            )
+            print(f"{name:<14} index: {elapsed:8.2f} ms")
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Замер времени ответа списочных эндпоинтов на большом числе строк.
+
+Сравнивает быстрый путь `/leads/` и `/operators/` (кортежи колонок и прямое
+кодирование JSON) с прежним путём через ORM-объекты и Pydantic orm_mode.
+
+Запуск: python -m benchmarks.bench_list_endpoints [--rows 100000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker, Session
+from app.crud import get_leads_list, get_opers_list
+from app.database import Base
+from app.main import app, get_read_session, get_session
+from app.models import Lead, Operator
+from app.schemas import LeadOut, OperatorOut
+
+REPEATS = 3
+
+
+def fill_database(session: Session, rows: int) -> None:
+    """
+    Заполняет базу лидами и операторами.
+
+    :param session: Сессия для работы с базой данных.
+    :param rows: Количество строк каждого вида.
+    """
+    session.execute(
+        insert(Lead),
+        [
+            {"external_id": f"ext_{i}", "e_mail": f"lead_{i}@example.com"}
+            for i in range(rows)
+        ],
+    )
+    session.execute(
+        insert(Operator),
+        [
+            {"name": f"oper_{i}", "active": True, "limit": 5}
+            for i in range(rows)
+        ],
+    )
+    session.commit()
+
+
+def build_legacy_app(session_dependency) -> FastAPI:
+    """
+    Создаёт приложение с прежней реализацией списочных эндпоинтов.
+
+    :param session_dependency: Зависимость, выдающая сессию.
+    :return: Приложение FastAPI.
+    """
+    legacy = FastAPI()
+
+    @legacy.get("/leads/", response_model=list[LeadOut])
+    def legacy_leads(session: Session = Depends(session_dependency)) -> list:
+        return get_leads_list(session=session)
+
+    @legacy.get("/operators/", response_model=list[OperatorOut])
+    def legacy_opers(session: Session = Depends(session_dependency)) -> list:
+        return get_opers_list(session=session)
+
+    return legacy
+
+
+def measure(client: TestClient, url: str) -> float:
+    """
+    Возвращает лучшее время ответа эндпоинта из нескольких попыток.
+
+    :param client: Тестовый клиент.
+    :param url: Адрес эндпоинта.
+    :return: Время в секундах.
+    """
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        response = client.get(url)
+        response.raise_for_status()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    """Точка входа замера."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(tmp_dir, 'bench.sqlite')}",
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        with session_factory() as session:
+            fill_database(session, args.rows)
+
+        def bench_session():
+            with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_session] = bench_session
+        app.dependency_overrides[get_read_session] = bench_session
+        fast = TestClient(app)
+        legacy = TestClient(build_legacy_app(bench_session))
+        print(f"rows: {args.rows}")
+        for url in ("/leads/", "/operators/"):
+            legacy_time = measure(legacy, url)
+            fast_time = measure(fast, url)
+            print(
+                f"{url:<12} orm+pydantic: {legacy_time:.3f}s  "
+                f"fast path: {fast_time:.3f}s  "
+                f"speedup: {legacy_time / fast_time:.1f}x"
+            )
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
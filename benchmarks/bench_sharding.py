@@ -0,0 +1,184 @@
+"""
+Замер пропускной способности регистрации обращений при шардировании.
+
+Несколько процессов, как воркеры uvicorn, параллельно регистрируют
+обращения от разных источников. Для каждого числа шардов источники
+распределяются по файлам SQLite через ShardSet, так что запись обращений
+в разные шарды не ждёт общей блокировки базы. Лиды ищутся в основной
+базе, и её блокировка записи берётся только для новых лидов, поэтому
+пул внешних ID задаёт долю обращений, которые всё же её ждут.
+
+Замер нужен, чтобы проверить, даёт ли экспериментальный режим шардов
+выигрыш: пока роста пропускной способности с числом шардов он не
+показал.
+
+Запуск: python -m benchmarks.bench_sharding [--shards 1 2 4] [--workers 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app import crud, schemas
+from app.database import Base, create_write_engine
+from app.sharding import ShardSet
+
+SOURCES = 16
+OPERATORS = 32
+
+
+def prepare_primary(db_file: str) -> sessionmaker:
+    """
+    Создаёт основную базу с операторами и источниками.
+
+    :param db_file: Путь к файлу основной базы.
+    :return: Фабрика сессий основной базы.
+    """
+    engine = create_write_engine(db_file)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    rng = random.Random(0)
+    with session_factory() as session:
+        crud.create_operators_bulk(
+            session,
+            [
+                schemas.OperatorCreate(name=f"oper_{idx}", limit=None)
+                for idx in range(OPERATORS)
+            ],
+        )
+        for idx in range(SOURCES):
+            source = crud.create_source(
+                session, schemas.SourceCreate(name=f"source_{idx}")
+            )
+            crud.replace_source_operators(
+                session,
+                source.id,
+                [
+                    schemas.SourceOperatorAssign(
+                        operator_id=oper_id, weight=rng.randint(1, 20)
+                    )
+                    for oper_id in rng.sample(range(1, OPERATORS + 1), 6)
+                ],
+            )
+    return session_factory
+
+
+def worker(
+        data_dir: str,
+        primary_file: str,
+        shards: int,
+        index: int,
+        ops: int,
+        leads: int,
+        barrier,
+        results
+) -> None:
+    """
+    Регистрирует обращения в отдельном процессе, как воркер uvicorn.
+
+    :param data_dir: Каталог файлов шардов.
+    :param primary_file: Путь к файлу основной базы с лидами.
+    :param shards: Количество шардов.
+    :param index: Номер процесса.
+    :param ops: Количество обращений.
+    :param leads: Размер пула внешних ID лидов.
+    :param barrier: Барьер одновременного старта процессов.
+    :param results: Очередь для количества ошибок блокировки.
+    """
+    shard_set = ShardSet(shards, data_dir)
+    primary_engine = create_write_engine(primary_file)
+    primary = sessionmaker(bind=primary_engine, autoflush=False)
+    rng = random.Random(index)
+    errors = 0
+    barrier.wait()
+    for _ in range(ops):
+        source_id = rng.randint(1, SOURCES)
+        with shard_set.session_for_source(source_id) as session, \
+                primary() as lead_session:
+            try:
+                crud.create_contact(
+                    session,
+                    schemas.ContactCreate(
+                        external_id=f"lead_{rng.randrange(leads)}",
+                        source_id=source_id,
+                    ),
+                    lead_session=lead_session,
+                )
+            except OperationalError:
+                session.rollback()
+                errors += 1
+    shard_set.dispose()
+    primary_engine.dispose()
+    results.put(errors)
+
+
+def run_level(shards: int, workers: int, ops: int, leads: int) -> dict:
+    """
+    Регистрирует обращения на наборе из shards шардов.
+
+    :param shards: Количество шардов.
+    :param workers: Количество процессов.
+    :param ops: Количество обращений на процесс.
+    :param leads: Размер пула внешних ID лидов.
+    :return: Пропускная способность и число ошибок блокировки.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        primary_file = os.path.join(tmp_dir, "primary.sqlite")
+        primary = prepare_primary(primary_file)
+        shard_set = ShardSet(shards, tmp_dir)
+        shard_set.create_all()
+        with primary() as session:
+            shard_set.sync_config(session)
+        shard_set.dispose()
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(workers + 1)
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=worker,
+                args=(
+                    tmp_dir, primary_file, shards, idx, ops, leads, barrier,
+                    results,
+                ),
+            )
+            for idx in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        barrier.wait()
+        start = time.perf_counter()
+        errors = sum(results.get() for _ in processes)
+        elapsed = time.perf_counter() - start
+        for process in processes:
+            process.join()
+    return {
+        "shards": shards,
+        "throughput": (workers * ops - errors) / elapsed,
+        "lock_errors": errors,
+    }
+
+
+def main() -> None:
+    """Точка входа замера."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--leads", type=int, default=10000)
+    args = parser.parse_args()
+
+    print("shards  contacts/s  lock_errors")
+    for shards in args.shards:
+        result = run_level(shards, args.workers, args.ops, args.leads)
+        print(
+            f"{shards:<7} {result['throughput']:<11.0f} "
+            f"{result['lock_errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Нагрузочный стенд, проверяющий инварианты распределения.
+
+Параллельно вызывает create_contact, close_contact, update_operator и
+assign_operator_to_source из нескольких потоков против файловой базы
+SQLite и проверяет, что:
+- ни один оператор не получил обращение сверх своего лимита;
+- ни одно обращение не назначено неактивному оператору;
+- ни один лид не создан дважды.
+
+Проверка назначений выполняется триггером в той же транзакции, что и
+вставка обращения, то есть по состоянию базы на момент фиксации.
+Для каждого уровня параллелизма выводятся пропускная способность, доля
+ошибок блокировки и перцентили задержек.
+
+Запуск: python -m benchmarks.stress [--threads 1 2 4 8] [--ops 500]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app import crud, schemas
+from app.database import Base, create_write_engine
+
+CHECK_TRIGGER = """
+CREATE TRIGGER stress_check_assignment AFTER INSERT ON contacts
+WHEN NEW.operator_id IS NOT NULL
+BEGIN
+    INSERT INTO stress_violations (contact_id, operator_id, kind)
+    SELECT NEW.id, NEW.operator_id, 'inactive'
+    FROM operators WHERE id = NEW.operator_id AND NOT active;
+    INSERT INTO stress_violations (contact_id, operator_id, kind)
+    SELECT NEW.id, NEW.operator_id, 'over_limit'
+    FROM operators
+    WHERE id = NEW.operator_id AND "limit" IS NOT NULL
+      AND (
+        SELECT count(*) FROM contacts
+        WHERE operator_id = NEW.operator_id AND status = 'open'
+      ) > "limit";
+END
+"""
+OPERATION_MIX = (
+    ("create_contact", 0.75),
+    ("close_contact", 0.15),
+    ("update_operator", 0.05),
+    ("assign_operator", 0.05),
+)
+
+
+def percentile(values: list, share: float) -> float:
+    """
+    Возвращает перцентиль выборки.
+
+    :param values: Значения.
+    :param share: Доля от 0 до 1.
+    :return: Значение перцентиля или 0 для пустой выборки.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class StressRun:
+    """
+    Один прогон стенда на заданном уровне параллелизма.
+
+    :ivar threads: Количество потоков.
+    :ivar ops: Количество операций на поток.
+    :ivar latencies: Задержки по типам операций.
+    :ivar lock_errors: Количество ошибок блокировки базы.
+    """
+
+    def __init__(
+            self,
+            db_file: str,
+            threads: int,
+            ops: int,
+            sources: int = 4,
+            operators: int = 12,
+            leads: int = 500,
+            seed: int = 0
+    ):
+        """
+        Инициализация StressRun.
+
+        :param db_file: Путь к файлу базы.
+        :param threads: Количество потоков.
+        :param ops: Количество операций на поток.
+        :param sources: Количество источников.
+        :param operators: Количество операторов.
+        :param leads: Размер пула внешних ID лидов.
+        :param seed: Зерно генератора случайных чисел.
+        """
+        self.threads = threads
+        self.ops = ops
+        self.leads = leads
+        self.seed = seed
+        self.engine = create_write_engine(db_file, pool_size=threads + 1)
+        self.session_factory = sessionmaker(
+            bind=self.engine, autoflush=False, autocommit=False
+        )
+        self.latencies = defaultdict(list)
+        self.lock_errors = 0
+        self._lock = threading.Lock()
+        self._prepare(sources, operators)
+
+    def _prepare(self, sources: int, operators: int) -> None:
+        """
+        Создаёт схему, триггер проверки и начальную конфигурацию.
+
+        :param sources: Количество источников.
+        :param operators: Количество операторов.
+        """
+        Base.metadata.create_all(bind=self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "CREATE TABLE stress_violations "
+                    "(contact_id INTEGER, operator_id INTEGER, kind TEXT)"
+                )
+            )
+            conn.execute(text(CHECK_TRIGGER))
+        rng = random.Random(self.seed)
+        with self.session_factory() as session:
+            self.operator_ids = [
+                crud.create_operator(
+                    session,
+                    schemas.OperatorCreate(
+                        name=f"oper_{idx}", limit=rng.randint(2, 8)
+                    ),
+                ).id
+                for idx in range(operators)
+            ]
+            self.source_ids = []
+            for idx in range(sources):
+                source = crud.create_source(
+                    session, schemas.SourceCreate(name=f"source_{idx}")
+                )
+                self.source_ids.append(source.id)
+                for oper_id in rng.sample(self.operator_ids, operators // 2):
+                    crud.assign_operator_to_source(
+                        session,
+                        source.id,
+                        schemas.SourceOperatorAssign(
+                            operator_id=oper_id, weight=rng.randint(1, 20)
+                        ),
+                    )
+
+    def _operation(self, session, name: str, rng: random.Random) -> None:
+        """
+        Выполняет одну операцию стенда.
+
+        :param session: Сессия для работы с базой данных.
+        :param name: Тип операции.
+        :param rng: Генератор случайных чисел потока.
+        """
+        if name == "create_contact":
+            crud.create_contact(
+                session,
+                schemas.ContactCreate(
+                    external_id=f"lead_{rng.randrange(self.leads)}",
+                    source_id=rng.choice(self.source_ids),
+                ),
+            )
+        elif name == "close_contact":
+            contact_id = session.execute(
+                text(
+                    "SELECT id FROM contacts WHERE status = 'open' "
+                    "ORDER BY random() LIMIT 1"
+                )
+            ).scalar()
+            session.rollback()
+            if contact_id is not None:
+                crud.close_contact(session, contact_id)
+        elif name == "update_operator":
+            crud.update_operator(
+                session,
+                rng.choice(self.operator_ids),
+                active=rng.random() < 0.7,
+                limit=rng.randint(1, 8),
+            )
+        else:
+            crud.assign_operator_to_source(
+                session,
+                rng.choice(self.source_ids),
+                schemas.SourceOperatorAssign(
+                    operator_id=rng.choice(self.operator_ids),
+                    weight=rng.randint(0, 20),
+                ),
+            )
+
+    def _worker(self, index: int, barrier: threading.Barrier) -> None:
+        """
+        Выполняет операции одного потока.
+
+        :param index: Номер потока.
+        :param barrier: Барьер одновременного старта потоков.
+        """
+        rng = random.Random(self.seed * 1000 + index)
+        names = [name for name, _ in OPERATION_MIX]
+        weights = [share for _, share in OPERATION_MIX]
+        latencies = defaultdict(list)
+        lock_errors = 0
+        barrier.wait()
+        for _ in range(self.ops):
+            name = rng.choices(names, weights)[0]
+            session = self.session_factory()
+            start = time.perf_counter()
+            try:
+                self._operation(session, name, rng)
+            except OperationalError:
+                session.rollback()
+                lock_errors += 1
+                continue
+            finally:
+                session.close()
+            latencies[name].append(time.perf_counter() - start)
+        with self._lock:
+            for name, values in latencies.items():
+                self.latencies[name].extend(values)
+            self.lock_errors += lock_errors
+
+    def run(self) -> dict:
+        """
+        Запускает потоки и проверяет инварианты.
+
+        :return: Сводка прогона.
+        """
+        barrier = threading.Barrier(self.threads)
+        workers = [
+            threading.Thread(target=self._worker, args=(idx, barrier))
+            for idx in range(self.threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        with self.engine.connect() as conn:
+            violations = dict(
+                conn.execute(
+                    text(
+                        "SELECT kind, count(*) FROM stress_violations "
+                        "GROUP BY kind"
+                    )
+                ).all()
+            )
+            duplicated_leads = conn.execute(
+                text(
+                    "SELECT count(*) FROM (SELECT external_id FROM leads "
+                    "GROUP BY external_id HAVING count(*) > 1)"
+                )
+            ).scalar()
+        self.engine.dispose()
+        completed = sum(len(values) for values in self.latencies.values())
+        attempted = completed + self.lock_errors
+        return {
+            "threads": self.threads,
+            "throughput": completed / elapsed,
+            "lock_error_rate": (
+                self.lock_errors / attempted if attempted else 0
+            ),
+            "latency": {
+                name: {
+                    "p50": percentile(values, 0.5),
+                    "p99": percentile(values, 0.99),
+                    "max": max(values),
+                }
+                for name, values in self.latencies.items()
+            },
+            "over_limit": violations.get("over_limit", 0),
+            "inactive": violations.get("inactive", 0),
+            "duplicated_leads": duplicated_leads,
+        }
+
+
+def run_level(threads: int, ops: int, seed: int = 0) -> dict:
+    """
+    Прогоняет стенд на отдельной временной базе.
+
+    :param threads: Количество потоков.
+    :param ops: Количество операций на поток.
+    :param seed: Зерно генератора случайных чисел.
+    :return: Сводка прогона.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stress = StressRun(
+            os.path.join(tmp_dir, "stress.sqlite"), threads, ops, seed=seed
+        )
+        return stress.run()
+
+
+def main() -> None:
+    """Точка входа стенда."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        "threads  ops/s    lock_err  create_p50  create_p99  "
+        "over_limit  inactive  dup_leads"
+    )
+    for threads in args.threads:
+        result = run_level(threads, args.ops, args.seed)
+        create = result["latency"].get("create_contact", {})
+        print(
+            f"{threads:<8} {result['throughput']:<8.0f} "
+            f"{result['lock_error_rate']:<9.4f} "
+            f"{create.get('p50', 0) * 1000:<11.2f} "
+            f"{create.get('p99', 0) * 1000:<11.2f} "
+            f"{result['over_limit']:<11} {result['inactive']:<9} "
+            f"{result['duplicated_leads']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from app.database import Base
-from app.main import app, get_session
+from app.main import app, get_session, get_read_session
+from app.idempotency import idempotency_cache
+from app.routing import routing_cache
 
 
 # Константы для избежания повторений и магических чисел
@@ -46,10 +48,13 @@ def session():
     """
     Фикстура для создания тестовой сессии базы данных.
 
-    Создаёт все таблицы перед тестом и удаляет их после теста.
+    Создаёт все таблицы перед тестом и удаляет их после теста, сбрасывая
+    кэши в памяти, которые иначе пережили бы пересоздание таблиц.
 
     :yield: Тестовая сессия базы данных.
     """
+    routing_cache.invalidate()
+    idempotency_cache.clear()
     Base.metadata.create_all(bind=engine)
     session = TestingSessionLocal()
     try:
@@ -81,5 +86,9 @@ def client(session):
         override_get_session,
         session
     )
+    app.dependency_overrides[get_read_session] = partial(
+        override_get_session,
+        session
+    )
     with TestClient(app) as test_client:
         yield test_client
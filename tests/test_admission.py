@@ -0,0 +1,75 @@
+"""Содержит тесты для проверки работы admission.py."""
+
+from fastapi.testclient import TestClient
+from app.admission import OTHER_SOURCES, AdmissionController, TokenBucket
+from tests.conftest import SUCCESS_CODE, SOURCES_URL, NAME, ID
+
+TOO_MANY_REQUESTS = 429
+
+
+def test_token_bucket_refill():
+    """Тест расхода и пополнения ведра токенов."""
+    bucket = TokenBucket(rate=2, burst=2, now=0.0)
+    assert bucket.try_acquire(0.0) == 0
+    assert bucket.try_acquire(0.0) == 0
+    assert bucket.try_acquire(0.0) == 0.5
+    assert bucket.try_acquire(0.5) == 0
+
+
+def test_admission_per_source_and_in_flight():
+    """Тест лимитов по источникам и общего предела одновременных обращений."""
+    controller = AdmissionController(
+        default_rate=0, default_burst=1, max_in_flight=2
+    )
+    controller.set_source_limit(1, rate=0.1, burst=1)
+    assert controller.admit(1) is None
+    assert controller.admit(1) == 10
+    assert controller.admit(2) is None
+    assert controller.admit(3) == 1
+    controller.release()
+    assert controller.admit(3) is None
+    stats = controller.stats()
+    assert stats["shed"] == {1: 1, 3: 1}
+    assert stats["admitted"] == {1: 1, 2: 1, 3: 1}
+    assert stats["in_flight"] == 2
+
+
+def test_admission_folds_sources_over_cap():
+    """Тест общего ведра для источников сверх предела учитываемых."""
+    controller = AdmissionController(
+        default_rate=0.1, default_burst=1, max_in_flight=0, max_sources=2
+    )
+    controller.set_source_limit(99, rate=0)
+    assert controller.admit(1) is None
+    assert controller.admit(2) is None
+    assert controller.admit(3) is None
+    assert controller.admit(4) == 10
+    assert controller.admit(99) is None
+    assert controller.admit(1) == 10
+    stats = controller.stats()
+    assert stats["admitted"] == {1: 1, 2: 1, OTHER_SOURCES: 1, 99: 1}
+    assert stats["shed"] == {OTHER_SOURCES: 1, 1: 1}
+
+
+def test_register_contact_rejected_with_retry_after(
+        client: TestClient,
+        monkeypatch
+):
+    """Тест, что лишние обращения источника получают 429 и Retry-After."""
+    controller = AdmissionController(default_rate=0, max_in_flight=0)
+    monkeypatch.setattr("app.main.admission", controller)
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    limit_resp = client.put(
+        f"/admin/admission/sources/{source_id}",
+        json={"rate": 0.5, "burst": 1}
+    )
+    assert limit_resp.status_code == SUCCESS_CODE
+
+    body = {"external_id": "lead", "source_id": source_id}
+    assert client.post("/contacts/", json=body).status_code == SUCCESS_CODE
+    rejected = client.post("/contacts/", json=body)
+    assert rejected.status_code == TOO_MANY_REQUESTS
+    assert rejected.headers["Retry-After"] == "2"
+    stats = client.get("/admin/admission").json()
+    assert stats["shed"] == {str(source_id): 1}
+    assert stats["in_flight"] == 0
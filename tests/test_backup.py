@@ -0,0 +1,103 @@
+"""Содержит тесты для проверки работы backup.py."""
+
+import os
+import sqlite3
+import threading
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from app.backup import backup_database, restore_database
+from app.database import Base, create_write_engine
+from app.models import Lead
+
+LEADS = 2000
+
+
+def make_database(db_file: str) -> sessionmaker:
+    """
+    Создаёт файловую базу с лидами.
+
+    :param db_file: Путь к файлу базы.
+    :return: Фабрика сессий базы.
+    """
+    engine = create_write_engine(db_file)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    with session_factory() as session:
+        session.execute(
+            insert(Lead),
+            [{"external_id": f"lead_{idx}"} for idx in range(LEADS)],
+        )
+        session.commit()
+    return session_factory
+
+
+def count_leads(db_file: str) -> int:
+    """
+    Считает лидов в файле базы.
+
+    :param db_file: Путь к файлу базы.
+    :return: Количество лидов.
+    """
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute("SELECT count(*) FROM leads").fetchone()[0]
+
+
+def test_backup_runs_beside_open_writer(tmp_path):
+    """Тест копии, пока писатель держит блокировку записи."""
+    db_file = str(tmp_path / "db.sqlite")
+    session_factory = make_database(db_file)
+    with session_factory() as writer:
+        writer.add(Lead(external_id="uncommitted"))
+        writer.flush()
+        report = backup_database(
+            db_file, str(tmp_path / "backup" / "db.sqlite"), pages=4
+        )
+        writer.commit()
+    assert report["steps"] > 1
+    assert report["pages"] * 4096 >= report["bytes"] > 0
+    assert count_leads(report["target"]) == LEADS
+    assert not os.path.exists(f"{report['target']}.part")
+    session_factory.kw["bind"].dispose()
+
+
+def test_backup_does_not_restart_on_commits(tmp_path):
+    """Тест, что фиксации во время копии не начинают её заново."""
+    db_file = str(tmp_path / "db.sqlite")
+    session_factory = make_database(db_file)
+    stop = threading.Event()
+
+    def write():
+        with session_factory() as session:
+            while not stop.is_set():
+                session.add(Lead(external_id="during"))
+                session.commit()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        report = backup_database(
+            db_file, str(tmp_path / "db.backup"), pages=1, pause=0.001
+        )
+    finally:
+        stop.set()
+        writer.join()
+    assert report["steps"] == report["pages"]
+    assert count_leads(report["target"]) >= LEADS
+    session_factory.kw["bind"].dispose()
+
+
+def test_restore_replaces_database(tmp_path):
+    """Тест восстановления копии поверх базы с остатками журнала WAL."""
+    db_file = str(tmp_path / "db.sqlite")
+    session_factory = make_database(db_file)
+    snapshot = backup_database(db_file, str(tmp_path / "db.backup"))
+    with session_factory() as session:
+        session.execute(insert(Lead), [{"external_id": "after_backup"}])
+        session.commit()
+    session_factory.kw["bind"].dispose()
+    open(f"{db_file}-wal", "wb").close()
+
+    report = restore_database(snapshot["target"], db_file, verify=True)
+    assert report["bytes"] == snapshot["bytes"]
+    assert not os.path.exists(f"{db_file}-wal")
+    assert count_leads(db_file) == LEADS
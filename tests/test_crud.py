@@ -1,7 +1,17 @@
 """Содержит тесты для проверки работы crud.py."""
 
+from datetime import timedelta
+from sqlalchemy import event, func, insert, text
 from sqlalchemy.orm import Session
 from app import crud, schemas
+from app.models import (
+    Contact,
+    ArchivedContact,
+    ContactRollup,
+    ContactStatus,
+    Lead,
+    utcnow,
+)
 from tests.conftest import OPERATOR_NAME, SOURCE_NAME, WEIGHT, EXTERNAL
 
 
@@ -166,3 +176,517 @@ def test_create_contact_and_stats(session):
     stats = crud.get_stats(session)
     assert stats["operators"][0]["total"] == 1
     assert stats["sources"][0]["total"] == 1
+
+
+def test_create_contact_affinity(session):
+    """Тест, что повторный контакт лида уходит прежнему оператору."""
+    source = crud.create_source(
+        session,
+        schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    opers = []
+    for name in (OPERATOR_NAME, "Вася", "Петя"):
+        oper = crud.create_operator(
+            session,
+            schemas.OperatorCreate(name=name, limit=10)
+        )
+        crud.assign_operator_to_source(
+            session,
+            source.id,
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=10)
+        )
+        opers.append(oper)
+    new_contact = schemas.ContactCreate(
+        external_id=EXTERNAL, source_id=source.id
+    )
+    first = crud.create_contact(session, new_contact, affinity=True)
+    hits_before = crud.get_affinity_stats()["hits"]
+    for _ in range(5):
+        again = crud.create_contact(session, new_contact, affinity=True)
+        assert again.operator_id == first.operator_id
+    assert crud.get_affinity_stats()["hits"] == hits_before + 5
+
+    crud.update_operator(session, first.operator_id, active=False)
+    fallback = crud.create_contact(session, new_contact, affinity=True)
+    assert fallback.operator_id not in (None, first.operator_id)
+
+
+def test_affinity_ignores_other_sources(session):
+    """Тест, что закрепление учитывает только обращения того же источника."""
+    oper = crud.create_operator(
+        session, schemas.OperatorCreate(name=OPERATOR_NAME, limit=10)
+    )
+    first, second = (
+        crud.create_source(session, schemas.SourceCreate(name=name))
+        for name in (SOURCE_NAME, "Сайт")
+    )
+    crud.assign_operator_to_source(
+        session,
+        first.id,
+        schemas.SourceOperatorAssign(operator_id=oper.id, weight=WEIGHT)
+    )
+    contact = crud.create_contact(
+        session,
+        schemas.ContactCreate(external_id=EXTERNAL, source_id=first.id),
+        affinity=True,
+    )
+    crud.assign_operator_to_source(
+        session,
+        second.id,
+        schemas.SourceOperatorAssign(operator_id=oper.id, weight=WEIGHT)
+    )
+    assert crud.find_affinity_operator(
+        session, contact.lead_id, second.id
+    ) is None
+    assert crud.find_affinity_operator(
+        session, contact.lead_id, first.id
+    ).id == oper.id
+
+
+def test_create_operators_bulk(session):
+    """Тест массового создания операторов."""
+    created = crud.create_operators_bulk(
+        session,
+        [
+            schemas.OperatorCreate(name=f"oper_{i}", limit=i)
+            for i in range(1, 4)
+        ]
+    )
+    assert [oper.name for oper in created] == ["oper_1", "oper_2", "oper_3"]
+    assert [oper.limit for oper in created] == [1, 2, 3]
+    assert len(crud.get_opers_list(session)) == 3
+
+
+def test_replace_source_operators(session):
+    """Тест атомарной замены таблицы весов источника."""
+    source = crud.create_source(
+        session,
+        schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    opers = crud.create_operators_bulk(
+        session,
+        [schemas.OperatorCreate(name=f"oper_{i}") for i in range(3)]
+    )
+    crud.assign_operator_to_source(
+        session,
+        source.id,
+        schemas.SourceOperatorAssign(operator_id=opers[0].id, weight=5)
+    )
+    replaced = crud.replace_source_operators(
+        session,
+        source.id,
+        [
+            schemas.SourceOperatorAssign(operator_id=opers[1].id, weight=7),
+            schemas.SourceOperatorAssign(
+                operator_id=opers[2].id, weight=WEIGHT
+            ),
+        ]
+    )
+    assert [(row.operator_id, row.weight) for row in replaced] == [
+        (opers[1].id, 7),
+        (opers[2].id, WEIGHT),
+    ]
+    updated = crud.replace_source_operators(
+        session,
+        source.id,
+        [schemas.SourceOperatorAssign(operator_id=opers[1].id, weight=1)]
+    )
+    assert [(row.operator_id, row.weight) for row in updated] == [
+        (opers[1].id, 1)
+    ]
+    missing = crud.replace_source_operators(
+        session,
+        source.id,
+        [schemas.SourceOperatorAssign(operator_id=999, weight=1)]
+    )
+    assert missing is None
+
+
+def test_contact_payload_deferred_and_compressed(session):
+    """Тест отложенной загрузки и сжатия больших payload."""
+    source = crud.create_source(
+        session,
+        schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    big_payload = "поле=значение;" * 500
+    big = crud.create_contact(
+        session,
+        schemas.ContactCreate(source_id=source.id, payload=big_payload)
+    )
+    small = crud.create_contact(
+        session,
+        schemas.ContactCreate(source_id=source.id, payload="short")
+    )
+    stored = dict(
+        session.execute(text("SELECT id, payload FROM contacts")).all()
+    )
+    assert stored[big.id][:1] == b"z"
+    assert len(stored[big.id]) < len(big_payload.encode("utf-8")) / 10
+    assert stored[small.id] == b"tshort"
+
+    session.expunge_all()
+    contacts = session.query(Contact).order_by(Contact.id).all()
+    assert all("payload" not in contact.__dict__ for contact in contacts)
+    assert contacts[0].payload == big_payload
+    assert contacts[1].payload == "short"
+
+
+def test_archive_closed_contacts(session):
+    """Тест переноса давно закрытых контактов в архив пачками."""
+    oper = crud.create_operator(
+        session,
+        schemas.OperatorCreate(name=OPERATOR_NAME, limit=10)
+    )
+    source = crud.create_source(
+        session,
+        schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    crud.assign_operator_to_source(
+        session,
+        source.id,
+        schemas.SourceOperatorAssign(operator_id=oper.id, weight=WEIGHT)
+    )
+    contacts = [
+        crud.create_contact(
+            session,
+            schemas.ContactCreate(
+                external_id=EXTERNAL, source_id=source.id, payload="p"
+            )
+        )
+        for _ in range(5)
+    ]
+    for contact in contacts[:4]:
+        closed = crud.close_contact(session, contact.id)
+        assert closed.status == ContactStatus.closed
+        assert closed.closed_at is not None
+    old_ids = [contact.id for contact in contacts[:3]]
+    session.query(Contact).filter(Contact.id.in_(old_ids)).update(
+        {Contact.closed_at: utcnow() - timedelta(days=60)},
+        synchronize_session=False,
+    )
+    session.commit()
+
+    cutoff = utcnow() - timedelta(days=30)
+    assert crud.archive_closed_contacts(
+        session, cutoff, batch_size=2, max_batches=1
+    ) == 2
+    assert crud.archive_closed_contacts(session, cutoff, batch_size=2) == 1
+    assert session.query(Contact).count() == 2
+    archived = session.query(ArchivedContact).order_by(ArchivedContact.id)
+    assert [row.id for row in archived] == old_ids
+    assert archived[0].payload == "p"
+
+    hot_stats = crud.get_stats(session)
+    full_stats = crud.get_stats(session, include_archived=True)
+    assert hot_stats["operators"][0]["total"] == 2
+    assert full_stats["operators"][0]["total"] == 5
+    assert full_stats["operators"][0]["open"] == 1
+    assert full_stats["sources"][0]["total"] == 5
+
+
+def test_rebalance_operator(session):
+    """Тест переноса лишних обращений оператора с учётом лимитов."""
+    opers = [
+        crud.create_operator(
+            session, schemas.OperatorCreate(name=name, limit=limit)
+        )
+        for name, limit in ((OPERATOR_NAME, 10), ("Вася", 2), ("Петя", 3))
+    ]
+    source = crud.create_source(
+        session, schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    crud.assign_operator_to_source(
+        session,
+        source.id,
+        schemas.SourceOperatorAssign(operator_id=opers[0].id, weight=WEIGHT)
+    )
+    for idx in range(8):
+        crud.create_contact(
+            session,
+            schemas.ContactCreate(
+                external_id=f"lead_{idx}", source_id=source.id
+            )
+        )
+    for oper in opers[1:]:
+        crud.assign_operator_to_source(
+            session,
+            source.id,
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=WEIGHT)
+        )
+
+    crud.update_operator(session, opers[0].id, limit=6)
+    result = crud.rebalance_operator(session, opers[0].id, seed=1)
+    assert result == {"operator_id": opers[0].id, "moved": 2, "remaining": 0}
+
+    crud.update_operator(session, opers[0].id, active=False)
+    result = crud.rebalance_operator(
+        session, opers[0].id, batch_size=2, seed=1
+    )
+    assert result["moved"] == 3
+    assert result["remaining"] == 3
+    loads = crud.count_open_contacts(session, [oper.id for oper in opers])
+    assert loads == {opers[0].id: 3, opers[1].id: 2, opers[2].id: 3}
+    assert crud.rebalance_operator(session, 999) is None
+
+
+def test_rebalance_operator_skips_unmovable_contacts(session):
+    """Тест: новые обращения без получателя не мешают перенести старые."""
+    opers = [
+        crud.create_operator(
+            session, schemas.OperatorCreate(name=name, limit=10)
+        )
+        for name in (OPERATOR_NAME, "Вася")
+    ]
+    shared, single = (
+        crud.create_source(session, schemas.SourceCreate(name=name))
+        for name in (SOURCE_NAME, "Сайт")
+    )
+    for source in (shared, single):
+        crud.assign_operator_to_source(
+            session,
+            source.id,
+            schemas.SourceOperatorAssign(
+                operator_id=opers[0].id, weight=WEIGHT
+            )
+        )
+    for idx, source in enumerate((shared,) * 2 + (single,) * 3):
+        crud.create_contact(
+            session,
+            schemas.ContactCreate(
+                external_id=f"lead_{idx}", source_id=source.id
+            )
+        )
+    crud.assign_operator_to_source(
+        session,
+        shared.id,
+        schemas.SourceOperatorAssign(operator_id=opers[1].id, weight=WEIGHT)
+    )
+    crud.update_operator(session, opers[0].id, active=False)
+
+    result = crud.rebalance_operator(
+        session, opers[0].id, batch_size=2, seed=1
+    )
+    assert result == {"operator_id": opers[0].id, "moved": 2, "remaining": 3}
+    loads = crud.count_open_contacts(session, [oper.id for oper in opers])
+    assert loads == {opers[0].id: 3, opers[1].id: 2}
+
+
+def test_search_leads(session):
+    """Тест поиска лидов по префиксу e-mail, домену и внешнему ID."""
+    for external_id, e_mail in (
+        ("crm-1", "Anna@Example.com"),
+        ("crm-2", "anton@example.com"),
+        ("web-1", "boris@mail.example.com"),
+        ("crm-10", "ann@other.org"),
+    ):
+        crud.find_or_create_lead(session, external_id, e_mail)
+
+    def emails(rows):
+        return [row.e_mail for row in rows]
+
+    assert emails(crud.search_leads(session, e_mail="ANN")) == [
+        "ann@other.org", "Anna@Example.com"
+    ]
+    assert emails(crud.search_leads(session, domain="@EXAMPLE.com")) == [
+        "Anna@Example.com", "anton@example.com"
+    ]
+    rows = crud.search_leads(session, external_id="crm-1", limit=1)
+    assert [row.external_id for row in rows] == ["crm-1"]
+    rows = crud.search_leads(
+        session, external_id="crm-1", after=(rows[0][0], rows[0].id)
+    )
+    assert [row.external_id for row in rows] == ["crm-10"]
+    rows = crud.search_leads(session, domain="example.com", limit=1)
+    rows = crud.search_leads(
+        session, domain="example.com", after=(rows[0][0], rows[0].id)
+    )
+    assert emails(rows) == ["anton@example.com"]
+    plan = " ".join(
+        str(row) for row in session.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT id FROM leads WHERE "
+                "substr(lower(e_mail), instr(lower(e_mail), '@') + 1) = 'x' "
+                "AND id > 1 ORDER BY id LIMIT 50"
+            )
+        )
+    )
+    assert "ix_leads_domain_key (<expr>=? AND rowid>?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_contact_timeseries(session):
+    """Тест почасовых счётчиков открытых и закрытых обращений."""
+    oper = crud.create_operator(
+        session,
+        schemas.OperatorCreate(name=OPERATOR_NAME, limit=2)
+    )
+    source = crud.create_source(
+        session,
+        schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    crud.assign_operator_to_source(
+        session,
+        source.id,
+        schemas.SourceOperatorAssign(operator_id=oper.id, weight=WEIGHT)
+    )
+    contacts = [
+        crud.create_contact(
+            session,
+            schemas.ContactCreate(external_id=EXTERNAL, source_id=source.id)
+        )
+        for _ in range(3)
+    ]
+    crud.close_contact(session, contacts[0].id)
+    assert contacts[2].operator_id is None
+
+    start = utcnow() - timedelta(hours=1)
+    end = utcnow() + timedelta(hours=1)
+    points = crud.get_contact_timeseries(session, start, end)
+    bucket = crud.rollup_bucket(utcnow()).strftime("%Y-%m-%d %H:00:00")
+    assert points == [
+        {
+            "bucket": bucket,
+            "source_id": source.id,
+            "operator_id": None,
+            "status": "open",
+            "count": 1,
+        },
+        {
+            "bucket": bucket,
+            "source_id": source.id,
+            "operator_id": oper.id,
+            "status": "closed",
+            "count": 1,
+        },
+        {
+            "bucket": bucket,
+            "source_id": source.id,
+            "operator_id": oper.id,
+            "status": "open",
+            "count": 2,
+        },
+    ]
+    daily = crud.get_contact_timeseries(
+        session, start, end, step="day", operator_id=oper.id,
+        status=ContactStatus.open
+    )
+    assert [(point["bucket"][11:], point["count"]) for point in daily] == [
+        ("00:00:00", 2)
+    ]
+    assert crud.get_contact_timeseries(session, end, end) == []
+
+
+def test_leads_history_statement_budget(session):
+    """Тест загрузки истории лидов фиксированным числом запросов."""
+    opers = crud.create_operators_bulk(
+        session,
+        [
+            schemas.OperatorCreate(name=f"oper_{idx}", limit=None)
+            for idx in range(3)
+        ]
+    )
+    source = crud.create_source(
+        session,
+        schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    session.execute(
+        insert(Lead),
+        [{"external_id": f"lead_{idx}"} for idx in range(1000)]
+    )
+    session.execute(
+        insert(Contact),
+        [
+            {
+                "lead_id": lead_id,
+                "source_id": source.id,
+                "operator_id": opers[(lead_id + shift) % 3].id,
+                "status": ContactStatus.open,
+            }
+            for lead_id in range(1, 1001)
+            for shift in range(2)
+        ]
+    )
+    session.commit()
+    session.expunge_all()
+
+    statements = []
+    engine = session.get_bind()
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        leads = crud.get_leads_history(session, list(range(1, 1001)))
+        history = [
+            (contact.source.name, contact.operator.name)
+            for lead in leads
+            for contact in lead.contacts
+        ]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(leads) == 1000
+    assert len(history) == 2000
+    assert history[:2] == [(SOURCE_NAME, "oper_1"), (SOURCE_NAME, "oper_2")]
+    assert len(statements) == 3
+
+
+def test_create_contacts_bulk(session):
+    """Тест массовой регистрации с учётом весов, лимитов и лидов."""
+    opers = crud.create_operators_bulk(
+        session,
+        [
+            schemas.OperatorCreate(name="small", limit=3),
+            schemas.OperatorCreate(name="big", limit=1000),
+            schemas.OperatorCreate(name="off", active=False, limit=1000),
+        ]
+    )
+    sources = [
+        crud.create_source(session, schemas.SourceCreate(name=name))
+        for name in (SOURCE_NAME, "site", "empty")
+    ]
+    crud.replace_source_operators(
+        session,
+        sources[0].id,
+        [
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=WEIGHT)
+            for oper in opers
+        ]
+    )
+    crud.replace_source_operators(
+        session,
+        sources[1].id,
+        [schemas.SourceOperatorAssign(operator_id=opers[0].id, weight=WEIGHT)]
+    )
+    crud.create_contact(
+        session,
+        schemas.ContactCreate(external_id=EXTERNAL, source_id=sources[1].id)
+    )
+    contacts = [
+        schemas.ContactCreate(
+            external_id=EXTERNAL if idx % 2 else f"lead_{idx % 10}",
+            source_id=sources[idx % 3].id,
+        )
+        for idx in range(300)
+    ]
+
+    result = crud.create_contacts_bulk(session, contacts, seed=1)
+    assert result["created"] == 300
+    assigned = {
+        row["operator_id"]: row["assigned"] for row in result["operators"]
+    }
+    assert opers[2].id not in assigned
+    assert assigned[opers[0].id] == 2
+    assert assigned[opers[1].id] == 98
+    assert result["unassigned"] == 200
+    assert crud.count_open_contacts(session, [opers[0].id]) == {
+        opers[0].id: 3
+    }
+    assert session.query(Lead).count() == 6
+    rollups = session.query(
+        ContactRollup.operator_id, func.sum(ContactRollup.count)
+    ).group_by(ContactRollup.operator_id)
+    assert dict(rollups.all()) == {0: 200, opers[0].id: 3, opers[1].id: 98}
+    assert crud.create_contacts_bulk(session, []) == {
+        "created": 0, "unassigned": 0, "operators": []
+    }
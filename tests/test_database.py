@@ -0,0 +1,185 @@
+"""Содержит тесты для проверки работы database.py."""
+
+import sqlite3
+from datetime import timedelta
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app import config, crud, schemas
+from app.database import (
+    Base,
+    add_missing_columns,
+    create_missing_indexes,
+    create_read_engine,
+    create_write_engine,
+    enable_wal,
+)
+from app.models import ArchivedContact, Contact, utcnow
+
+
+def test_read_engine_is_read_only_and_sees_commits(tmp_path):
+    """Тест, что читатель WAL не пишет и видит зафиксированные записи."""
+    db_file = str(tmp_path / "db.sqlite")
+    write_engine = create_engine(f"sqlite:///{db_file}")
+    enable_wal(write_engine)
+    read_engine = create_read_engine(db_file)
+    with write_engine.begin() as conn:
+        mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+        assert mode == "wal"
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+
+    with read_engine.connect() as reader:
+        assert reader.execute(text("SELECT count(*) FROM items")).scalar() == 0
+        with write_engine.begin() as conn:
+            conn.execute(text("INSERT INTO items DEFAULT VALUES"))
+        reader.rollback()
+        assert reader.execute(text("SELECT count(*) FROM items")).scalar() == 1
+        with pytest.raises(OperationalError):
+            reader.execute(text("INSERT INTO items DEFAULT VALUES"))
+    read_engine.dispose()
+    write_engine.dispose()
+
+
+# Схема, которую создавала первая версия приложения
+BASELINE_SCHEMA = (
+    "CREATE TABLE operators (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL"
+    " UNIQUE, active BOOLEAN, \"limit\" INTEGER)",
+    "CREATE TABLE sources (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL"
+    " UNIQUE)",
+    "CREATE TABLE source_operators (id INTEGER PRIMARY KEY, source_id"
+    " INTEGER REFERENCES sources (id), operator_id INTEGER REFERENCES"
+    " operators (id), weight INTEGER NOT NULL)",
+    "CREATE TABLE leads (id INTEGER PRIMARY KEY, external_id VARCHAR,"
+    " e_mail VARCHAR)",
+    "CREATE TABLE contacts (id INTEGER PRIMARY KEY, lead_id INTEGER"
+    " REFERENCES leads (id), source_id INTEGER REFERENCES sources (id),"
+    " operator_id INTEGER REFERENCES operators (id), status VARCHAR(6),"
+    " payload TEXT)",
+    "INSERT INTO operators VALUES (1, 'oper', 1, 5)",
+    "INSERT INTO sources VALUES (1, 'bot')",
+    "INSERT INTO source_operators VALUES (1, 1, 1, 10)",
+    "INSERT INTO leads VALUES (1, 'lead', NULL)",
+    "INSERT INTO contacts VALUES (1, 1, 1, 1, 'open', 'old payload')",
+)
+
+
+def create_baseline_database(db_file: str) -> None:
+    """
+    Создаёт файл базы со схемой и данными первой версии приложения.
+
+    :param db_file: Путь к файлу базы.
+    """
+    with sqlite3.connect(db_file) as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(statement)
+
+
+def upgrade(db_file: str):
+    """
+    Выполняет шаги обновления схемы, как при старте приложения.
+
+    :param db_file: Путь к файлу базы.
+    :return: Движок обновлённой базы.
+    """
+    write_engine = create_write_engine(db_file)
+    Base.metadata.create_all(bind=write_engine)
+    add_missing_columns(write_engine)
+    create_missing_indexes(write_engine)
+    return write_engine
+
+
+def test_upgrade_baseline_database(tmp_path):
+    """Тест работы приложения на базе, созданной первой версией."""
+    db_file = str(tmp_path / "db.sqlite")
+    create_baseline_database(db_file)
+    write_engine = upgrade(db_file)
+    add_missing_columns(write_engine)
+    with write_engine.connect() as conn:
+        columns = {
+            row[1]
+            for row in conn.exec_driver_sql("PRAGMA table_info(contacts)")
+        }
+    assert {"closed_at", "created_at"} <= columns
+
+    with sessionmaker(bind=write_engine, autoflush=False)() as session:
+        assert session.get(Contact, 1).payload == "old payload"
+        contact = crud.create_contact(
+            session, schemas.ContactCreate(external_id="new", source_id=1)
+        )
+        assert contact.operator_id == 1
+        assert crud.close_contact(session, 1).closed_at is not None
+        stats = crud.get_stats(session)
+        assert stats["operators"][0]["total"] == 2
+        assert stats["operators"][0]["open"] == 1
+    write_engine.dispose()
+
+
+def test_upgrade_adds_created_at(tmp_path):
+    """Тест добавления created_at в обращения и архив прежней версии."""
+    db_file = str(tmp_path / "db.sqlite")
+    create_baseline_database(db_file)
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(
+            "ALTER TABLE contacts ADD COLUMN closed_at DATETIME"
+        )
+        conn.execute(
+            "CREATE TABLE contacts_archive (id INTEGER PRIMARY KEY, lead_id"
+            " INTEGER, source_id INTEGER, operator_id INTEGER, status"
+            " VARCHAR(6), payload BLOB, closed_at DATETIME, archived_at"
+            " DATETIME)"
+        )
+    write_engine = upgrade(db_file)
+    with write_engine.connect() as conn:
+        for table in ("contacts", "contacts_archive"):
+            columns = {
+                row[1]
+                for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")
+            }
+            assert "created_at" in columns
+
+    with sessionmaker(bind=write_engine, autoflush=False)() as session:
+        contact = crud.create_contact(
+            session, schemas.ContactCreate(external_id="new", source_id=1)
+        )
+        contact_id, created_at = contact.id, contact.created_at
+        crud.close_contact(session, contact_id)
+        crud.close_contact(session, 1)
+        assert crud.archive_closed_contacts(session, utcnow()) == 2
+        archived = session.get(ArchivedContact, contact_id)
+        assert archived.created_at == created_at
+        assert session.get(ArchivedContact, 1).created_at is None
+        points = crud.get_contact_timeseries(
+            session, utcnow() - timedelta(hours=1), utcnow()
+        )
+        assert {point["status"]: point["count"] for point in points} == {
+            "open": 1, "closed": 2
+        }
+    write_engine.dispose()
+
+
+def test_session_releases_write_lock_after_commit(tmp_path, monkeypatch):
+    """Тест, что чтение после фиксации не держит блокировку записи."""
+    monkeypatch.setattr(config, "SQLITE_BUSY_TIMEOUT_MS", 100)
+    db_file = str(tmp_path / "db.sqlite")
+    write_engine = create_write_engine(db_file)
+    Base.metadata.create_all(bind=write_engine)
+    session_factory = sessionmaker(bind=write_engine, autoflush=False)
+    with session_factory() as session:
+        source = crud.create_source(
+            session, schemas.SourceCreate(name="bot")
+        )
+        contact = crud.create_contact(
+            session,
+            schemas.ContactCreate(
+                external_id="lead", source_id=source.id, payload="p"
+            ),
+        )
+        assert session.in_transaction()
+        assert contact.payload == "p"
+        with session_factory() as other:
+            oper = crud.create_operator(
+                other, schemas.OperatorCreate(name="oper")
+            )
+            assert oper.id == 1
+    write_engine.dispose()
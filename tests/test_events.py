@@ -0,0 +1,79 @@
+"""Содержит тесты для проверки работы events.py."""
+
+import asyncio
+import json
+import threading
+from app import crud, schemas
+from app.events import EventBus, event_bus
+
+
+def test_publish_from_thread_reaches_subscriber():
+    """Тест доставки события, опубликованного из другого потока."""
+    bus = EventBus(buffer_size=10)
+
+    async def scenario():
+        subscriber = bus.subscribe(asyncio.get_running_loop())
+        publisher = threading.Thread(
+            target=bus.publish, args=("contact_assigned", {"contact_id": 1})
+        )
+        publisher.start()
+        publisher.join()
+        return await asyncio.wait_for(subscriber.queue.get(), timeout=1)
+
+    message = asyncio.run(scenario())
+    lines = message.strip().split("\n")
+    assert lines[1] == "event: contact_assigned"
+    assert json.loads(lines[2][len("data: "):]) == {"contact_id": 1}
+
+
+def test_slow_subscriber_is_dropped():
+    """Тест отключения подписчика при переполнении буфера."""
+    bus = EventBus(buffer_size=2)
+
+    async def scenario():
+        slow = bus.subscribe(asyncio.get_running_loop())
+        for idx in range(5):
+            bus.publish("operator_updated", {"operator_id": idx})
+        await asyncio.sleep(0)
+        assert slow.dropped
+        assert await slow.queue.get() is None
+        bus.publish("operator_updated", {"operator_id": 5})
+        return bus.subscriber_count
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_crud_publishes_events(session):
+    """Тест, что операции crud публикуют события после фиксации."""
+    async def scenario():
+        subscriber = event_bus.subscribe(asyncio.get_running_loop())
+        try:
+            oper = crud.create_operator(
+                session, schemas.OperatorCreate(name="Витя")
+            )
+            source = crud.create_source(
+                session, schemas.SourceCreate(name="bot")
+            )
+            crud.assign_operator_to_source(
+                session,
+                source.id,
+                schemas.SourceOperatorAssign(operator_id=oper.id, weight=1)
+            )
+            contact = crud.create_contact(
+                session, schemas.ContactCreate(source_id=source.id)
+            )
+            crud.close_contact(session, contact.id)
+            crud.update_operator(session, oper.id, active=False)
+            await asyncio.sleep(0)
+            events = []
+            while not subscriber.queue.empty():
+                events.append(subscriber.queue.get_nowait().split("\n")[1])
+            return events
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    assert asyncio.run(scenario()) == [
+        "event: contact_assigned",
+        "event: contact_closed",
+        "event: operator_updated",
+    ]
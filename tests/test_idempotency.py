@@ -0,0 +1,117 @@
+"""Содержит тесты для проверки работы idempotency.py."""
+
+import time
+from datetime import timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from app import config, crud, schemas
+from app.database import IMMEDIATE_OPTION
+from app.idempotency import IdempotencyCache, idempotency_cache
+from app.models import Contact, IdempotencyKey, utcnow
+from tests.conftest import SUCCESS_CODE, SOURCES_URL, NAME, ID, EXTERNAL
+
+
+def test_cache_lru_and_ttl():
+    """Тест вытеснения давно не использованных и истёкших ключей."""
+    cache = IdempotencyCache(max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    expired = IdempotencyCache(max_size=2, ttl=-1)
+    expired.put("a", 1)
+    assert expired.get("a") is None
+    cache.put("d", 4, ttl=-1)
+    assert cache.get("d") is None
+
+
+def test_create_contact_idempotent(session):
+    """Тест, что повтор с тем же ключом не создаёт новый контакт."""
+    source = crud.create_source(session, schemas.SourceCreate(name="bot"))
+    new_contact = schemas.ContactCreate(
+        external_id=EXTERNAL, source_id=source.id
+    )
+    first = crud.create_contact_idempotent(session, new_contact, "key-1")
+    again = crud.create_contact_idempotent(session, new_contact, "key-1")
+    assert again.id == first.id
+
+    idempotency_cache.clear()
+    from_db = crud.create_contact_idempotent(session, new_contact, "key-1")
+    assert from_db.id == first.id
+    assert session.query(Contact).count() == 1
+
+    session.query(IdempotencyKey).update(
+        {IdempotencyKey.created_at: utcnow() - timedelta(days=30)}
+    )
+    session.commit()
+    idempotency_cache.clear()
+    renewed = crud.create_contact_idempotent(session, new_contact, "key-1")
+    assert renewed.id != first.id
+    assert session.query(IdempotencyKey).one().contact_id == renewed.id
+
+
+def test_idempotent_retry_without_write_lock(session, monkeypatch):
+    """Тест повтора по ключу без блокировки записи и с остатком TTL."""
+    source = crud.create_source(session, schemas.SourceCreate(name="bot"))
+    new_contact = schemas.ContactCreate(
+        external_id=EXTERNAL, source_id=source.id
+    )
+    first = crud.create_contact_idempotent(session, new_contact, "key-1")
+    session.query(IdempotencyKey).update(
+        {
+            IdempotencyKey.created_at: utcnow() - timedelta(
+                seconds=config.IDEMPOTENCY_TTL_SECONDS - 60
+            )
+        }
+    )
+    session.commit()
+    idempotency_cache.clear()
+
+    immediate = []
+
+    def on_begin(conn):
+        immediate.append(conn.get_execution_options().get(IMMEDIATE_OPTION))
+
+    engine = session.get_bind()
+    event.listen(engine, "begin", on_begin)
+    try:
+        from_db = crud.create_contact_idempotent(session, new_contact, "key-1")
+        session.commit()
+        cached = crud.create_contact_idempotent(session, new_contact, "key-1")
+    finally:
+        event.remove(engine, "begin", on_begin)
+    assert from_db.id == cached.id == first.id
+    assert immediate and not any(immediate)
+
+    later = time.monotonic() + 120
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert idempotency_cache.get("key-1") is None
+
+
+def test_purge_idempotency_keys(session):
+    """Тест удаления истёкших ключей."""
+    session.add_all(
+        [
+            IdempotencyKey(key="old", contact_id=1,
+                           created_at=utcnow() - timedelta(days=30)),
+            IdempotencyKey(key="new", contact_id=2),
+        ]
+    )
+    session.commit()
+    assert crud.purge_idempotency_keys(session) == 1
+    assert [row.key for row in session.query(IdempotencyKey)] == ["new"]
+
+
+def test_register_contact_with_idempotency_key(client: TestClient):
+    """Тест повторной регистрации обращения с заголовком Idempotency-Key."""
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    body = {"external_id": EXTERNAL, "source_id": source_id}
+    headers = {"Idempotency-Key": "retry-1"}
+    first = client.post("/contacts/", json=body, headers=headers)
+    retry = client.post("/contacts/", json=body, headers=headers)
+    other = client.post("/contacts/", json=body)
+    assert first.status_code == retry.status_code == SUCCESS_CODE
+    assert retry.json()[ID] == first.json()[ID]
+    assert other.json()[ID] != first.json()[ID]
@@ -1,6 +1,18 @@
 """Содержит тесты для проверки работы main.py."""
 
+import base64
+import json
+import os
+import sqlite3
+import time
+from datetime import timedelta, timezone
 from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from app import config, crud, schemas
+from app.database import Base, create_write_engine
+from app.main import app
+from app.models import utcnow
+from app.routing import RoutingCache, routing_cache
 
 from tests.conftest import (
     SUCCESS_CODE,
@@ -114,3 +126,326 @@ def test_stats(client: TestClient):
     test_data = response.json()
     assert "operators" in test_data
     assert "sources" in test_data
+
+
+def test_bulk_operators_and_replace_weights(client: TestClient):
+    """Тест массового создания операторов и замены весов источника."""
+    response = client.post(
+        f"{OPER_URL}bulk",
+        json=[{NAME: f"oper_{i}", LIMIT: 3} for i in range(3)]
+    )
+    assert response.status_code == SUCCESS_CODE
+    oper_ids = [oper[ID] for oper in response.json()]
+    assert len(oper_ids) == 3
+
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    put_resp = client.put(
+        f"{SOURCES_URL}{source_id}/operators",
+        json=[{OPER_ID: oper_id, "weight": 2} for oper_id in oper_ids]
+    )
+    assert put_resp.status_code == SUCCESS_CODE
+    assert sorted(row[OPER_ID] for row in put_resp.json()) == oper_ids
+
+    missing_resp = client.put(
+        f"{SOURCES_URL}{source_id}/operators",
+        json=[{OPER_ID: 999, "weight": 2}]
+    )
+    assert missing_resp.status_code == 404
+
+
+def test_list_endpoints_keep_openapi_schema(client: TestClient):
+    """Тест, что быстрые списочные эндпоинты сохраняют схему в OpenAPI."""
+    paths = client.get("/openapi.json").json()["paths"]
+    for url, schema in (("/leads/", "LeadOut"), (OPER_URL, "OperatorOut")):
+        content = paths[url]["get"]["responses"]["200"]["content"]
+        items = content["application/json"]["schema"]["items"]
+        assert items["$ref"].endswith(schema)
+
+
+def test_startup_warmup_and_ready(tmp_path, monkeypatch):
+    """Тест прогрева при старте, готовности и первого распределения."""
+    db_engine = create_write_engine(str(tmp_path / "db.sqlite"))
+    session_factory = sessionmaker(bind=db_engine, autoflush=False)
+    Base.metadata.create_all(bind=db_engine)
+    with session_factory() as session:
+        oper = crud.create_operator(
+            session, schemas.OperatorCreate(name=OPERATOR_NAME)
+        )
+        source = crud.create_source(session, schemas.SourceCreate(name="bot"))
+        crud.assign_operator_to_source(
+            session,
+            source.id,
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=10),
+        )
+        body = {"external_id": EXTERNAL, "source_id": source.id}
+        oper_id = oper.id
+    routing_cache.invalidate()
+    monkeypatch.setattr(app, "dependency_overrides", {})
+    for name in ("engine", "SessionLocal", "ReadSessionLocal"):
+        monkeypatch.setattr(
+            f"app.main.{name}",
+            db_engine if name == "engine" else session_factory,
+        )
+
+    start = time.perf_counter()
+    with TestClient(app) as test_client:
+        startup_time = time.perf_counter() - start
+        ready_resp = test_client.get("/ready")
+        assert ready_resp.status_code == SUCCESS_CODE
+        test_data = ready_resp.json()
+        assert test_data["ready"] is True
+        assert test_data["warmup"]["sources"] == 1
+        assert test_data["warmup"]["operators"] == 1
+
+        table_loads = []
+        monkeypatch.setattr(
+            RoutingCache,
+            "_load_table",
+            staticmethod(lambda session: table_loads.append(1)),
+        )
+        first_start = time.perf_counter()
+        response = test_client.post("/contacts/", json=body)
+        first_request_time = time.perf_counter() - first_start
+        assert response.status_code == SUCCESS_CODE
+        assert response.json()[OPER_ID] == oper_id
+        assert table_loads == []
+    db_engine.dispose()
+    assert startup_time < 5
+    assert first_request_time < 1
+    assert app.state.ready is False
+
+
+def test_close_contact_and_archive(client: TestClient):
+    """Тест закрытия обращения и запуска архивации."""
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    contact_id = client.post(
+        "/contacts/",
+        json={"external_id": EXTERNAL, "source_id": source_id},
+    ).json()[ID]
+    close_resp = client.post(f"/contacts/{contact_id}/close")
+    assert close_resp.status_code == SUCCESS_CODE
+    assert close_resp.json()["status"] == "closed"
+    assert client.post("/contacts/999/close").status_code == 404
+
+    archive_resp = client.post("/admin/archive", params={"older_than_days": 0})
+    assert archive_resp.status_code == SUCCESS_CODE
+    assert archive_resp.json()["archived"] == 1
+    stats = client.get("/stats/", params={"include_archived": True}).json()
+    assert stats["sources"][0]["total"] == 1
+
+    points = client.get(
+        "/stats/timeseries",
+        params={"start": "2000-01-01T00:00:00", "step": "day"},
+    ).json()
+    assert {point["status"]: point["count"] for point in points} == {
+        "open": 1, "closed": 1
+    }
+    assert client.get(
+        "/stats/timeseries",
+        params={"start": "2000-01-01T00:00:00", "step": "week"},
+    ).status_code == 422
+
+    hour = utcnow().replace(minute=0, second=0, microsecond=0)
+    local = timezone(timedelta(hours=5))
+    points = client.get(
+        "/stats/timeseries",
+        params={
+            "start": hour.replace(tzinfo=timezone.utc).astimezone(local)
+            .isoformat(),
+            "end": (hour + timedelta(hours=1)).replace(tzinfo=timezone.utc)
+            .astimezone(local).isoformat(),
+        },
+    ).json()
+    assert sum(point["count"] for point in points) == 2
+
+
+def test_idempotent_retry_after_archive(client: TestClient):
+    """Тест повтора запроса с ключом после архивации его обращения."""
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    body = {"external_id": EXTERNAL, "source_id": source_id}
+    headers = {"Idempotency-Key": "archived-key"}
+    contact_id = client.post(
+        "/contacts/", json=body, headers=headers
+    ).json()[ID]
+    client.post(f"/contacts/{contact_id}/close")
+    client.post("/admin/archive", params={"older_than_days": 0})
+
+    retry = client.post("/contacts/", json=body, headers=headers)
+    assert retry.status_code == SUCCESS_CODE
+    assert retry.json()[ID] == contact_id
+    assert retry.json()["status"] == "closed"
+
+
+def test_patch_operator_with_rebalance(client: TestClient):
+    """Тест перераспределения обращений при отключении оператора."""
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    first = client.post(OPER_URL, json={NAME: OPERATOR_NAME}).json()[ID]
+    second = client.post(OPER_URL, json={NAME: "Вася"}).json()[ID]
+    client.post(
+        f"{SOURCES_URL}{source_id}/operators/",
+        json={OPER_ID: first, "weight": 10},
+    )
+    for idx in range(3):
+        client.post(
+            "/contacts/",
+            json={"external_id": f"lead_{idx}", "source_id": source_id},
+        )
+    client.post(
+        f"{SOURCES_URL}{source_id}/operators/",
+        json={OPER_ID: second, "weight": 10},
+    )
+
+    patch_resp = client.patch(
+        f"{OPER_URL}{first}",
+        params={"rebalance": True},
+        json={NAME: OPERATOR_NAME, ACTIVE: False},
+    )
+    assert patch_resp.status_code == SUCCESS_CODE
+    stats = {
+        row["operator_id"]: row["open"]
+        for row in client.get("/stats/").json()["operators"]
+    }
+    assert stats == {first: 0, second: 3}
+
+    rebalance_resp = client.post(f"{OPER_URL}{first}/rebalance")
+    assert rebalance_resp.json() == {
+        "operator_id": first, "moved": 0, "remaining": 0
+    }
+    assert client.post(f"{OPER_URL}999/rebalance").status_code == 404
+
+
+def test_search_leads_pagination(client: TestClient):
+    """Тест постраничного поиска лидов по домену."""
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    for idx in range(5):
+        client.post(
+            "/contacts/",
+            json={
+                "external_id": f"lead_{idx}",
+                "e_mail": f"user{idx}@example.com",
+                "source_id": source_id,
+            },
+        )
+
+    found = []
+    cursor = None
+    while True:
+        params = {"domain": "example.com", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/leads/search", params=params).json()
+        found += [lead["e_mail"] for lead in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert found == [f"user{idx}@example.com" for idx in range(5)]
+
+    assert client.get("/leads/search").status_code == 400
+    assert client.get(
+        "/leads/search", params={"e_mail": "u", "domain": "example.com"}
+    ).status_code == 400
+    broken = ["broken"] + [
+        base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+        for value in ("ab", [{"a": 1}, 1], ["user", "1"], ["user", True])
+    ]
+    for cursor in broken:
+        assert client.get(
+            "/leads/search", params={"e_mail": "u", "cursor": cursor}
+        ).status_code == 400
+
+
+def test_lead_history(client: TestClient):
+    """Тест истории обращений одного и нескольких лидов."""
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    oper_id = client.post(OPER_URL, json={NAME: OPERATOR_NAME}).json()[ID]
+    client.post(
+        f"{SOURCES_URL}{source_id}/operators/",
+        json={OPER_ID: oper_id, "weight": 10},
+    )
+    lead_ids = []
+    for external_id in (EXTERNAL, EXTERNAL, "other"):
+        contact = client.post(
+            "/contacts/",
+            json={"external_id": external_id, "source_id": source_id},
+        ).json()
+        lead_ids.append(contact["lead_id"])
+
+    response = client.get(f"/leads/{lead_ids[0]}/contacts")
+    assert response.status_code == SUCCESS_CODE
+    contacts = response.json()
+    assert len(contacts) == 2
+    assert contacts[0]["source"]["name"] == "bot"
+    assert contacts[0]["operator"]["name"] == OPERATOR_NAME
+    assert "payload" not in contacts[0]
+    assert client.get("/leads/999/contacts").status_code == 404
+
+    response = client.post(
+        "/leads/history", json={"lead_ids": [lead_ids[2], lead_ids[0], 999]}
+    )
+    assert response.status_code == SUCCESS_CODE
+    assert [
+        (lead[ID], len(lead["contacts"])) for lead in response.json()
+    ] == [(lead_ids[0], 2), (lead_ids[2], 1)]
+    assert client.post(
+        "/leads/history", json={"lead_ids": list(range(1001))}
+    ).status_code == 422
+
+    first_contact = client.get(f"/leads/{lead_ids[0]}/contacts").json()[0]
+    client.post(f"/contacts/{first_contact[ID]}/close")
+    client.post("/admin/archive", params={"older_than_days": 0})
+    url = f"/leads/{lead_ids[0]}/contacts"
+    assert len(client.get(url).json()) == 1
+    archived = client.get(url, params={"include_archived": True}).json()
+    assert archived[0][ID] == first_contact[ID]
+    assert archived[0]["status"] == "closed"
+    assert archived[0]["source"]["name"] == "bot"
+    assert archived[0]["operator"]["name"] == OPERATOR_NAME
+    response = client.post(
+        "/leads/history",
+        params={"include_archived": True},
+        json={"lead_ids": [lead_ids[0]]},
+    )
+    assert len(response.json()[0]["contacts"]) == 2
+
+
+def test_register_contacts_bulk(client: TestClient):
+    """Тест массовой регистрации обращений через API."""
+    source_id = client.post(SOURCES_URL, json={NAME: "bot"}).json()[ID]
+    oper_id = client.post(OPER_URL, json={NAME: OPERATOR_NAME}).json()[ID]
+    client.post(
+        f"{SOURCES_URL}{source_id}/operators/",
+        json={OPER_ID: oper_id, "weight": 10},
+    )
+    contacts = [
+        {"external_id": f"lead_{idx}", "source_id": source_id}
+        for idx in range(8)
+    ]
+    response = client.post("/contacts/bulk", json=contacts)
+    assert response.status_code == SUCCESS_CODE
+    assert response.json() == {
+        "created": 8,
+        "unassigned": 3,
+        "operators": [{OPER_ID: oper_id, "assigned": 5}],
+    }
+    assert len(client.get("/leads/").json()) == 8
+    assert client.post(
+        "/contacts/bulk", json=[{"external_id": "x", "source_id": 999}]
+    ).status_code == 404
+
+
+def test_backup_endpoint(client: TestClient, tmp_path, monkeypatch):
+    """Тест снятия онлайн-копии через API."""
+    db_file = str(tmp_path / "db.sqlite")
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+    monkeypatch.setattr("app.main.DB_FILE", db_file)
+    monkeypatch.setattr(config, "BACKUP_DIR", str(tmp_path / "backups"))
+
+    response = client.post("/admin/backup")
+    assert response.status_code == SUCCESS_CODE
+    report = response.json()
+    assert report["directory"].startswith(str(tmp_path / "backups"))
+    assert [os.path.basename(row["target"]) for row in report["files"]] == [
+        "db.sqlite"
+    ]
+    assert os.path.getsize(report["files"][0]["target"]) > 0
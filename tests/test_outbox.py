@@ -0,0 +1,152 @@
+"""Содержит тесты для проверки работы outbox.py."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app import config, crud, schemas
+from app.models import Contact, OutboxMessage
+from app.outbox import OutboxDeliverer
+from tests.conftest import TestingSessionLocal
+
+
+class StubReceiver(BaseHTTPRequestHandler):
+    """Локальный получатель уведомлений, отвечающий по заданному сценарию."""
+
+    statuses = []
+    received = []
+
+    def do_POST(self):
+        """Запоминает тело запроса и отвечает очередным статусом."""
+        length = int(self.headers["Content-Length"])
+        StubReceiver.received.append(json.loads(self.rfile.read(length)))
+        status = StubReceiver.statuses.pop(0) if StubReceiver.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        """Отключает журнал запросов."""
+
+
+@pytest.fixture
+def receiver_url(monkeypatch):
+    """
+    Фикстура, поднимающая локальный получатель уведомлений.
+
+    :yield: Адрес получателя.
+    """
+    StubReceiver.statuses = []
+    StubReceiver.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubReceiver)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/notify"
+    monkeypatch.setattr(config, "NOTIFY_URL", url)
+    monkeypatch.setattr(config, "OUTBOX_RETRY_SECONDS", 0)
+    yield url
+    server.shutdown()
+
+
+def create_assigned_contacts(session, count: int) -> list:
+    """
+    Создаёт контакты, назначенные одному оператору.
+
+    :param session: Сессия для работы с базой данных.
+    :param count: Количество контактов.
+    :return: Список ID контактов.
+    """
+    oper = crud.create_operator(
+        session, schemas.OperatorCreate(name="Витя", limit=count)
+    )
+    source = crud.create_source(session, schemas.SourceCreate(name="bot"))
+    crud.assign_operator_to_source(
+        session,
+        source.id,
+        schemas.SourceOperatorAssign(operator_id=oper.id, weight=1)
+    )
+    return [
+        crud.create_contact(
+            session, schemas.ContactCreate(source_id=source.id)
+        ).id
+        for _ in range(count)
+    ]
+
+
+def test_outbox_written_with_contact(session, receiver_url):
+    """Тест, что уведомление пишется в одной транзакции с контактом."""
+    contact_ids = create_assigned_contacts(session, 2)
+    messages = session.query(OutboxMessage).order_by(OutboxMessage.id).all()
+    assert [msg.contact_id for msg in messages] == contact_ids
+    assert all(msg.event_type == "contact_assigned" for msg in messages)
+
+
+def test_outbox_batched_delivery_with_retry(session, receiver_url):
+    """Тест пакетной доставки с повтором после ошибки получателя."""
+    contact_ids = create_assigned_contacts(session, 3)
+    StubReceiver.statuses = [500]
+    deliverer = OutboxDeliverer(
+        TestingSessionLocal, receiver_url, batch_size=2
+    )
+    try:
+        assert deliverer.deliver_once() == 0
+        assert session.query(OutboxMessage).filter(
+            OutboxMessage.attempts == 1
+        ).count() == 2
+        assert deliverer.deliver_once() == 2
+        assert deliverer.deliver_once() == 1
+        assert deliverer.deliver_once() == 0
+    finally:
+        deliverer.client.close()
+    assert session.query(OutboxMessage).count() == 0
+    assert [len(body["events"]) for body in StubReceiver.received] == [2, 2, 1]
+    delivered = [
+        event["contact_id"]
+        for body in StubReceiver.received[1:]
+        for event in body["events"]
+    ]
+    assert delivered == contact_ids
+
+
+def test_outbox_disabled_without_url(session, monkeypatch):
+    """Тест, что без NOTIFY_URL outbox не пишется."""
+    monkeypatch.setattr(config, "NOTIFY_URL", None)
+    create_assigned_contacts(session, 1)
+    assert session.query(OutboxMessage).count() == 0
+
+
+def test_outbox_written_on_rebalance(session, receiver_url, monkeypatch):
+    """Тест уведомлений и событий о контактах, перенесённых ребалансом."""
+    contact_ids = create_assigned_contacts(session, 3)
+    source_id, first = session.query(
+        Contact.source_id, Contact.operator_id
+    ).first()
+    second = crud.create_operator(
+        session, schemas.OperatorCreate(name="Вася", limit=5)
+    ).id
+    crud.assign_operator_to_source(
+        session,
+        source_id,
+        schemas.SourceOperatorAssign(operator_id=second, weight=1)
+    )
+    crud.update_operator(session, first, limit=1)
+    published = []
+    monkeypatch.setattr(
+        crud.event_bus, "publish",
+        lambda event, data: published.append((event, data)),
+    )
+
+    result = crud.rebalance_operator(session, first, seed=1)
+    assert result["moved"] == 2
+    moved = session.query(OutboxMessage).filter(
+        OutboxMessage.contact_id.in_(contact_ids),
+        OutboxMessage.id > len(contact_ids),
+    ).all()
+    assert sorted(msg.contact_id for msg in moved) == contact_ids[1:]
+    assert all(
+        json.loads(msg.payload)["operator_id"] == second for msg in moved
+    )
+    assigned = [data for event, data in published
+                if event == "contact_assigned"]
+    assert sorted(data["contact_id"] for data in assigned) == contact_ids[1:]
+    assert {data["operator_id"] for data in assigned} == {second}
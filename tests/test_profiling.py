@@ -0,0 +1,84 @@
+"""Содержит тесты для проверки работы profiling.py."""
+
+import threading
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.profiling import ProfilingMiddleware
+from tests.conftest import SUCCESS_CODE
+
+
+def slow_endpoint_body() -> dict:
+    """Имитирует медленную работу эндпоинта."""
+    time.sleep(0.05)
+    return {"ok": True}
+
+
+def make_client(tmp_path, sample_rate: float = 0) -> TestClient:
+    """
+    Создаёт тестовое приложение с профилирующим middleware.
+
+    :param tmp_path: Каталог для файлов профилей.
+    :param sample_rate: Доля профилируемых запросов.
+    :return: Тестовый клиент.
+    """
+    test_app = FastAPI()
+
+    @test_app.get("/slow/")
+    def slow() -> dict:
+        return slow_endpoint_body()
+
+    test_app.add_middleware(
+        ProfilingMiddleware,
+        output_dir=str(tmp_path),
+        sample_rate=sample_rate,
+    )
+    return TestClient(test_app)
+
+
+def test_profile_written_on_header(tmp_path):
+    """Тест, что запрос с заголовком X-Profile сохраняет folded-профиль."""
+    client = make_client(tmp_path)
+    response = client.get("/slow/", headers={"X-Profile": "1"})
+    assert response.status_code == SUCCESS_CODE
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    assert files[0].suffix == ".folded"
+    lines = files[0].read_text().splitlines()
+    assert any("slow_endpoint_body" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_profile_drops_idle_threads(tmp_path):
+    """Тест, что стеки ожидающих потоков не попадают в профиль."""
+    release = threading.Event()
+    waiter = threading.Thread(
+        target=release.wait, name="idle-waiter", daemon=True
+    )
+    waiter.start()
+    try:
+        client = make_client(tmp_path)
+        client.get("/slow/", headers={"X-Profile": "1"})
+    finally:
+        release.set()
+        waiter.join()
+    lines = next(tmp_path.iterdir()).read_text().splitlines()
+    assert any("slow_endpoint_body" in line for line in lines)
+    assert not any(line.startswith("idle-waiter") for line in lines)
+    assert not any("(selectors.py" in line for line in lines)
+
+
+def test_profile_skipped_without_header(tmp_path):
+    """Тест, что без заголовка и выборки профиль не пишется."""
+    client = make_client(tmp_path)
+    response = client.get("/slow/")
+    assert response.status_code == SUCCESS_CODE
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profile_sample_rate(tmp_path):
+    """Тест профилирования по доле выборки без заголовка."""
+    client = make_client(tmp_path, sample_rate=1.0)
+    client.get("/slow/")
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,138 @@
+"""Содержит тесты для проверки работы routing.py."""
+
+import multiprocessing
+import os
+from sqlalchemy.orm import Session, sessionmaker
+from app import crud, schemas
+from app.database import Base, create_write_engine
+from app.routing import RoutingCache, get_config_version
+from tests.conftest import OPERATOR_NAME, SOURCE_NAME, WEIGHT
+
+TIMEOUT = 30
+
+
+def worker(db_file: str, conn) -> None:
+    """
+    Воркер в отдельном процессе: распределяет обращения по командам.
+
+    :param db_file: Путь к файлу базы.
+    :param conn: Конец канала для обмена командами.
+    """
+    session_factory = sessionmaker(
+        bind=create_write_engine(db_file), autoflush=False
+    )
+    for source_id, external_id in iter(conn.recv, None):
+        with session_factory() as session:
+            contact = crud.create_contact(
+                session,
+                schemas.ContactCreate(
+                    external_id=external_id, source_id=source_id
+                ),
+            )
+            conn.send(contact.operator_id)
+
+
+def test_config_writes_bump_version(session: Session):
+    """Тест увеличения версии конфигурации при изменении весов."""
+    oper = crud.create_operator(
+        session, schemas.OperatorCreate(name=OPERATOR_NAME)
+    )
+    source = crud.create_source(
+        session, schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    assert get_config_version(session) == 0
+
+    assign = schemas.SourceOperatorAssign(operator_id=oper.id, weight=WEIGHT)
+    crud.assign_operator_to_source(session, source.id, assign)
+    crud.replace_source_operators(session, source.id, [assign])
+    crud.update_operator(session, oper.id, limit=1)
+    assert get_config_version(session) == 3
+
+
+def test_cache_reloads_on_foreign_version(session: Session):
+    """Тест перечитывания кэша, если версию увеличил другой процесс."""
+    opers = [
+        crud.create_operator(session, schemas.OperatorCreate(name=name))
+        for name in (OPERATOR_NAME, "Вася")
+    ]
+    source = crud.create_source(
+        session, schemas.SourceCreate(name=SOURCE_NAME)
+    )
+    crud.assign_operator_to_source(
+        session,
+        source.id,
+        schemas.SourceOperatorAssign(operator_id=opers[0].id, weight=WEIGHT),
+    )
+    cache = RoutingCache()
+    assert cache.source_weights(session, source.id) == [(opers[0].id, WEIGHT)]
+
+    crud.assign_operator_to_source(
+        session,
+        source.id,
+        schemas.SourceOperatorAssign(operator_id=opers[1].id, weight=WEIGHT),
+    )
+    assert cache.source_weights(session, source.id) == [
+        (opers[0].id, WEIGHT), (opers[1].id, WEIGHT)
+    ]
+
+
+def replace_weights(session_factory, source_id: int, oper_id: int) -> None:
+    """
+    Назначает на источник единственного оператора и закрывает сессию.
+
+    :param session_factory: Фабрика сессий базы.
+    :param source_id: ID источника.
+    :param oper_id: ID оператора.
+    """
+    with session_factory() as session:
+        crud.replace_source_operators(
+            session,
+            source_id,
+            [schemas.SourceOperatorAssign(operator_id=oper_id, weight=WEIGHT)],
+        )
+
+
+def test_workers_see_weight_changes(tmp_path):
+    """Тест согласованности кэшей нескольких процессов на одной базе."""
+    db_file = os.path.join(tmp_path, "db.sqlite")
+    engine = create_write_engine(db_file)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    with session_factory() as session:
+        oper_ids = [
+            crud.create_operator(
+                session, schemas.OperatorCreate(name=name)
+            ).id
+            for name in (OPERATOR_NAME, "Вася")
+        ]
+        source_id = crud.create_source(
+            session, schemas.SourceCreate(name=SOURCE_NAME)
+        ).id
+    replace_weights(session_factory, source_id, oper_ids[0])
+
+    context = multiprocessing.get_context("spawn")
+    pipes = []
+    processes = []
+    for _ in range(2):
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=worker, args=(db_file, child_conn))
+        process.start()
+        pipes.append(parent_conn)
+        processes.append(process)
+    try:
+        for idx, conn in enumerate(pipes):
+            conn.send((source_id, f"lead_{idx}"))
+            assert conn.poll(TIMEOUT)
+            assert conn.recv() == oper_ids[0]
+
+        replace_weights(session_factory, source_id, oper_ids[1])
+        for idx, conn in enumerate(pipes):
+            conn.send((source_id, f"lead_new_{idx}"))
+            assert conn.poll(TIMEOUT)
+            assert conn.recv() == oper_ids[1]
+    finally:
+        for conn in pipes:
+            conn.send(None)
+        for process in processes:
+            process.join(TIMEOUT)
+        engine.dispose()
@@ -0,0 +1,194 @@
+"""Содержит тесты для проверки работы sharding.py."""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app import crud, schemas
+from app.models import Contact, Lead
+from app.sharding import ShardSet, shard_index
+from tests.conftest import OPER_URL, SOURCES_URL, SUCCESS_CODE
+
+SHARDS = 3
+
+
+@pytest.fixture
+def shard_set(tmp_path):
+    """
+    Фикстура набора шардов во временном каталоге.
+
+    :param tmp_path: Временный каталог pytest.
+    :yield: Объект ShardSet.
+    """
+    shards = ShardSet(SHARDS, str(tmp_path))
+    shards.create_all()
+    yield shards
+    shards.dispose()
+
+
+def sources_on_shards(session: Session, count: int) -> list:
+    """
+    Создаёт источники, пока не наберётся по одному на первые count шардов.
+
+    :param session: Сессия основной базы.
+    :param count: Количество разных шардов.
+    :return: Список ID источников, по одному на шард.
+    """
+    by_shard = {}
+    created = 0
+    while len(by_shard) < count:
+        source = crud.create_source(
+            session, schemas.SourceCreate(name=f"src_{created}")
+        )
+        created += 1
+        by_shard.setdefault(shard_index(source.id, SHARDS), source.id)
+    return list(by_shard.values())
+
+
+def test_shard_index_is_stable():
+    """Тест стабильности номера шарда источника."""
+    indexes = [shard_index(source_id, SHARDS) for source_id in range(100)]
+    assert indexes == [
+        shard_index(source_id, SHARDS) for source_id in range(100)
+    ]
+    assert set(indexes) == set(range(SHARDS))
+
+
+def test_contacts_land_on_source_shard(session: Session, shard_set: ShardSet):
+    """Тест записи обращений в шард источника и лидов в основную базу."""
+    oper = crud.create_operator(
+        session, schemas.OperatorCreate(name="oper", limit=10)
+    )
+    source_ids = sources_on_shards(session, SHARDS)
+    for source_id in source_ids:
+        crud.assign_operator_to_source(
+            session,
+            source_id,
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=10),
+        )
+    shard_set.sync_config(session)
+
+    contact_ids = []
+    for source_id in source_ids * 2:
+        with shard_set.session_for_source(source_id) as shard_session:
+            contact = crud.create_contact(
+                shard_session,
+                schemas.ContactCreate(
+                    external_id=f"lead_{source_id}", source_id=source_id
+                ),
+                lead_session=session,
+            )
+            assert contact.operator_id == oper.id
+            assert contact.id % SHARDS == shard_index(source_id, SHARDS)
+            contact_ids.append(contact.id)
+    assert len(set(contact_ids)) == len(contact_ids)
+
+    for contact_id in contact_ids:
+        with shard_set.session_for_id(contact_id) as shard_session:
+            assert shard_session.get(Contact, contact_id) is not None
+            assert shard_session.query(Lead).count() == 0
+    assert session.query(Lead).count() == len(source_ids)
+
+
+def test_operator_limit_spans_shards(session: Session, shard_set: ShardSet):
+    """Тест учёта нагрузки оператора на всех шардах."""
+    oper = crud.create_operator(
+        session, schemas.OperatorCreate(name="oper", limit=2)
+    )
+    source_ids = sources_on_shards(session, 2)
+    for source_id in source_ids:
+        crud.assign_operator_to_source(
+            session,
+            source_id,
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=10),
+        )
+    shard_set.sync_config(session)
+
+    assigned = []
+    for idx, source_id in enumerate(source_ids * 2):
+        with shard_set.session_for_source(source_id) as shard_session:
+            contact = crud.create_contact(
+                shard_session,
+                schemas.ContactCreate(
+                    external_id=f"lead_{idx}", source_id=source_id
+                ),
+                lead_session=session,
+            )
+            assigned.append(contact.operator_id)
+    assert assigned == [oper.id, oper.id, None, None]
+
+
+def test_sharded_api_fans_out_reads(
+        client: TestClient,
+        shard_set: ShardSet,
+        monkeypatch
+):
+    """Тест регистрации через API и сборки истории и статистики с шардов."""
+    monkeypatch.setattr("app.main.shard_set", shard_set)
+    oper_id = client.post(OPER_URL, json={"name": "oper"}).json()["id"]
+    source_ids = []
+    while len({shard_index(idx, SHARDS) for idx in source_ids}) < 2:
+        source_ids.append(
+            client.post(
+                SOURCES_URL, json={"name": f"src_{len(source_ids)}"}
+            ).json()["id"]
+        )
+    for source_id in source_ids:
+        client.post(
+            f"{SOURCES_URL}{source_id}/operators/",
+            json={"operator_id": oper_id, "weight": 10},
+        )
+
+    contact_ids = []
+    for source_id in source_ids:
+        response = client.post(
+            "/contacts/",
+            json={"external_id": "lead", "source_id": source_id},
+        )
+        assert response.status_code == SUCCESS_CODE
+        assert response.json()["operator_id"] == oper_id
+        contact_ids.append(response.json()["id"])
+
+    leads = client.get("/leads/").json()
+    assert [lead["external_id"] for lead in leads] == ["lead"]
+    history = client.get(f"/leads/{leads[0]['id']}/contacts").json()
+    assert [contact["id"] for contact in history] == sorted(contact_ids)
+    assert {contact["source"]["id"] for contact in history} == set(source_ids)
+    stats = client.get("/stats/").json()
+    assert stats["operators"][0]["open"] == len(source_ids)
+    assert sum(row["total"] for row in stats["sources"]) == len(source_ids)
+
+    response = client.post(
+        "/contacts/bulk",
+        json=[
+            {"external_id": f"bulk_{idx}", "source_id": source_id}
+            for idx, source_id in enumerate(source_ids)
+        ],
+    )
+    assert response.json()["operators"] == [
+        {"operator_id": oper_id, "assigned": len(source_ids)}
+    ]
+    assert len(client.get("/leads/").json()) == 1 + len(source_ids)
+    for source_id in source_ids:
+        with shard_set.session_for_source(source_id) as shard_session:
+            ids = [
+                contact.id
+                for contact in shard_session.query(Contact).filter(
+                    Contact.source_id == source_id
+                )
+            ]
+            assert len(ids) == 2
+            assert {
+                contact_id % SHARDS for contact_id in ids
+            } == {shard_index(source_id, SHARDS)}
+
+    response = client.post(f"/contacts/{contact_ids[0]}/close")
+    assert response.status_code == SUCCESS_CODE
+    assert client.get("/stats/").json()["operators"][0]["open"] == (
+        2 * len(source_ids) - 1
+    )
+
+    client.post("/admin/archive", params={"older_than_days": 0})
+    url = f"/leads/{leads[0]['id']}/contacts"
+    assert len(client.get(url).json()) == len(source_ids) - 1
+    history = client.get(url, params={"include_archived": True}).json()
+    assert [contact["id"] for contact in history] == sorted(contact_ids)
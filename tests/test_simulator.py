@@ -0,0 +1,66 @@
+"""Содержит тесты для проверки работы simulator.py."""
+
+import time
+import numpy as np
+from app import crud, schemas, simulator
+
+
+def test_assign_batch_respects_capacity():
+    """Тест, что пачка не превышает ёмкость и остаток не теряется."""
+    rng = np.random.default_rng(0)
+    weights = np.array([10, 30, 5, 0])
+    capacity = np.array([3, 100, 0, 7])
+    assigned, left = simulator.assign_batch(rng, 50, weights, capacity)
+    assert (assigned <= capacity).all()
+    assert assigned[2] == 0
+    assert assigned.sum() + left == 50
+    assert left == 0
+
+    assigned, left = simulator.assign_batch(rng, 200, weights, capacity)
+    assert (assigned == capacity).all()
+    assert left == 200 - capacity.sum()
+
+
+def test_simulate_from_db(session):
+    """Тест симуляции по конфигурации из базы."""
+    source = crud.create_source(session, schemas.SourceCreate(name="bot"))
+    for name, active in (("Витя", True), ("Вася", False)):
+        oper = crud.create_operator(
+            session,
+            schemas.OperatorCreate(name=name, active=active, limit=5)
+        )
+        crud.assign_operator_to_source(
+            session,
+            source.id,
+            schemas.SourceOperatorAssign(operator_id=oper.id, weight=10)
+        )
+    model = simulator.DistributionModel.from_db(session)
+    report = simulator.simulate(
+        model, arrivals=10_000, ticks=100, close_rate=0.1, seed=1
+    )
+    assert report.load_curves.shape == (100, 2)
+    assert report.load_curves[:, 0].max() == 5
+    assert report.load_curves[:, 1].max() == 0
+    assert report.unassigned_rate[0] > 0.5
+    assert report.first_saturation[1] == -1
+    assert "unassigned" in report.format()
+
+
+def test_simulate_million_arrivals_fast():
+    """Тест, что миллион обращений моделируется за секунды."""
+    n_opers = 100
+    rng = np.random.default_rng(0)
+    model = simulator.DistributionModel(
+        operator_ids=list(range(n_opers)),
+        names=[f"oper_{i}" for i in range(n_opers)],
+        active=[True] * n_opers,
+        limits=[50] * n_opers,
+        loads=[0] * n_opers,
+        source_ids=list(range(10)),
+        weights=rng.integers(1, 30, (10, n_opers)),
+    )
+    start = time.perf_counter()
+    report = simulator.simulate(model, arrivals=1_000_000, ticks=1000, seed=2)
+    assert time.perf_counter() - start < 10
+    assert report.arrivals.sum() > 900_000
+    assert (report.load_curves <= 50).all()
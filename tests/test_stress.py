@@ -0,0 +1,15 @@
+"""Содержит тесты для проверки инвариантов распределения под нагрузкой."""
+
+from benchmarks.stress import StressRun
+
+
+def test_invariants_hold_under_parallel_load(tmp_path):
+    """Тест, что параллельные операции не нарушают инварианты."""
+    result = StressRun(
+        str(tmp_path / "stress.sqlite"), threads=6, ops=60, leads=50
+    ).run()
+    assert result["over_limit"] == 0
+    assert result["inactive"] == 0
+    assert result["duplicated_leads"] == 0
+    assert result["lock_error_rate"] == 0
+    assert result["throughput"] > 0